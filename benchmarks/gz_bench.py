@@ -0,0 +1,308 @@
+"""
+Micro-benchmarks of the scraping, indexing and planning hot paths, and of the CLI startup.
+
+Run them from the repository root with ``python -m benchmarks.gz_bench``: every benchmark is
+timed on the GialloZafferano fixtures of tests/fixtures and compared to the stored baseline, the
+run fails when one of them is slower than the baseline by more than the threshold.
+``--save-baseline`` stores the results of the run as the new baseline.
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT_DIR, 'tests', 'fixtures')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+RECIPE_URL = 'https://ricette.giallozafferano.it/Spaghetti-alla-Carbonara.html'
+
+BENCHMARKS = dict()
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function prepares the data and returns the callable to time.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def read_fixture(filename):
+    with open(os.path.join(FIXTURES_DIR, filename), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _normalized(recipe):
+    # Categories come out of a set, their order changes between runs
+    return {**recipe, 'category': sorted(recipe['category']), 'steps': {str(k): v for k, v in recipe['steps'].items()}}
+
+
+def _recipe_scraper():
+    from src.scraper.gz_scrapers import GZRecipeScraper
+
+    scraper = GZRecipeScraper()
+    scraper.url = RECIPE_URL
+    return scraper
+
+
+def check_parser():
+    """
+    Checks that the recipe parser still extracts the expected record from the fixture page.
+
+    :return: True when the parsed recipe matches recipe.expected.json.
+    """
+    parsed = _recipe_scraper().parse_data(read_fixture('recipe.html')).to_dict()
+    return _normalized(parsed) == json.loads(read_fixture('recipe.expected.json'))
+
+
+# Modules only the scraping, indexing and classification subcommands may import
+HEAVY_MODULES = ('requests', 'bs4', 'lxml', 'tqdm', 'openai', 'elasticsearch')
+# What a run of the plan subcommand on a saved in-memory index imports. numpy is most of its cost,
+# about 70 ms here: the planner and the index are vectorized with it, so it is paid once per run
+# of thousands of profiles rather than deferred
+PLAN_IMPORTS = 'import src.cli, src.pipelines.gz_planning, src.indexer.memory.gz_memory_index'
+
+
+def _python(code, env=None):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=env, check=True,
+                          capture_output=True, text=True).stdout
+
+
+def check_lazy_imports():
+    """
+    Checks that the CLI, the plan subcommand and the classifiers import no heavy module and leave
+    the environment untouched.
+
+    :return: List of the problems found, empty when there is none.
+    """
+    env = {**os.environ, 'OPENAI_API_KEY': 'unchanged'}
+    code = (f"{PLAN_IMPORTS}, src.transformer.gz_transformer, src.transformer.gz_local_classifier\n"
+            f"import json, os, sys\n"
+            f"print(json.dumps([[m for m in {HEAVY_MODULES!r} if m in sys.modules], os.environ['OPENAI_API_KEY']]))")
+    loaded, api_key = json.loads(_python(code, env))
+    problems = [f"{module} is imported at startup" for module in loaded]
+    if api_key != 'unchanged':
+        problems.append("OPENAI_API_KEY is overwritten at import time")
+    return problems
+
+
+@benchmark('cli_startup')
+def bench_cli_startup():
+    return lambda: _python('import src.cli')
+
+
+@benchmark('plan_startup')
+def bench_plan_startup():
+    return lambda: _python(PLAN_IMPORTS)
+
+
+@benchmark('recipe_parse_data')
+def bench_recipe_parse_data():
+    scraper = _recipe_scraper()
+    html = read_fixture('recipe.html')
+    return lambda: scraper.parse_data(html)
+
+
+@benchmark('extract_quantity_unit_enhanced')
+def bench_extract_quantity_unit_enhanced():
+    from src.scraper.gz_scrapers import GZRecipeScraper
+
+    quantities = ['320 g', '150 g', '6 (medi)', 'q.b.', '1 kg', '0.5 l', '(cucchiai)2', '2 tbsp', '1 pizzico', '3']
+    return lambda: [GZRecipeScraper.extract_quantity_unit_enhanced(text) for text in quantities]
+
+
+@benchmark('categories_parse_data')
+def bench_categories_parse_data():
+    from src.scraper.gz_scrapers import GZCategoriesScraper
+
+    scraper = GZCategoriesScraper()
+    html = read_fixture('category.html')
+    return lambda: scraper.parse_data(html)
+
+
+@benchmark('format_for_bulk_indexing')
+def bench_format_for_bulk_indexing():
+    from src.indexer.elastic.gz_indexer import MyElasticsearchIndexer
+
+    # The client does not connect until it sends a request
+    indexer = MyElasticsearchIndexer('http://localhost:9200', 'bench')
+    recipe = _recipe_scraper().parse_data(read_fixture('recipe.html')).to_dict()
+    documents = [{**recipe, 'link': f"{RECIPE_URL}?v={i}"} for i in range(100)]
+    return lambda: list(indexer._format_for_bulk_indexing(documents))
+
+
+@benchmark('extract_links_from_json_dir')
+def bench_extract_links_from_json_dir():
+    from src.pipelines.gz_scraping import extract_links_from_json_dir
+    from src.utilis import save_to_json
+
+    directory = tempfile.mkdtemp(prefix='gz_bench_')
+    atexit.register(shutil.rmtree, directory, True)
+    recipe = _recipe_scraper().parse_data(read_fixture('recipe.html')).to_dict()
+    for chunk in range(20):
+        save_to_json([{**recipe, 'link': f"{RECIPE_URL}?v={chunk}-{i}"} for i in range(100)],
+                     os.path.join(directory, f"recipes_{chunk}.json"))
+    return lambda: extract_links_from_json_dir(directory)
+
+
+@benchmark('generate_plan')
+def bench_generate_plan():
+    from src.template.weekly_menu_template import MealPlanner
+
+    planner = MealPlanner(meat_meals=3, fish_meals=2, free_day='Sunday')
+    return planner.generate_plan
+
+
+@benchmark('generate_plans_10k')
+def bench_generate_plans():
+    from src.template.weekly_menu_template import MealPlanner
+
+    planner = MealPlanner(meat_meals=3, fish_meals=2, free_day='Sunday')
+    return lambda: planner.generate_plans(10000, seed=0)
+
+
+@benchmark('ingredient_top_k')
+def bench_ingredient_top_k():
+    import numpy as np
+    from src.indexer.memory.gz_ingredient_index import IngredientIndex
+
+    # Synthetic corpus of the size of GialloZafferano, with a Zipf-like ingredient popularity
+    rng = np.random.default_rng(0)
+    popularity = 1 / np.arange(1, 3001)
+    popularity /= popularity.sum()
+    recipes = [
+        {'recipe': f"recipe {i}", 'link': f"https://ricette.giallozafferano.it/Ricetta-{i}.html",
+         'ingredients': [{'name': f"ingredient {j}"}
+                         for j in rng.choice(3000, size=rng.integers(3, 15), p=popularity, replace=False)]}
+        for i in range(50000)
+    ]
+    index = IngredientIndex.build(recipes)
+    pantry = [f"ingredient {j}" for j in (0, 1, 2, 5, 7, 8, 9, 40, 100, 1000)]
+    return lambda: index.top_k(pantry, k=10, metric='jaccard')
+
+
+def measure(func, repeat=5, min_time=0.1):
+    """
+    Times a callable, asv style: the number of calls per sample is calibrated to last at least
+    min_time, and the fastest of the samples is kept.
+
+    :param func: The callable to time.
+    :param repeat: Number of samples.
+    :param min_time: Minimum duration of a sample, in seconds.
+    :return: The seconds per call of the fastest sample.
+    """
+    func()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run(names=None, repeat=5, min_time=0.1):
+    """
+    Runs the registered benchmarks.
+
+    :param names: Names of the benchmarks to run, all of them when None.
+    :param repeat: Number of samples of every benchmark.
+    :param min_time: Minimum duration of a sample, in seconds.
+    :return: Dictionary of benchmark name to seconds per call.
+    """
+    results = dict()
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(setup(), repeat=repeat, min_time=min_time)
+    return results
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Compares results to a baseline.
+
+    :param results: Dictionary of benchmark name to seconds per call.
+    :param baseline: Dictionary of benchmark name to the baseline seconds per call.
+    :param threshold: Tolerated slowdown, e.g. 0.25 for 25%.
+    :return: List of (name, seconds, baseline seconds) of the benchmarks slower than tolerated.
+    """
+    return [
+        (name, seconds, baseline[name])
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + threshold)
+    ]
+
+
+def load_baseline(filename=BASELINE_FILE):
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict()
+
+
+def save_baseline(results, filename=BASELINE_FILE):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the scraping, indexing and planning hot paths.")
+    parser.add_argument('names', nargs='*', help="Benchmarks to run, all of them when omitted.")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Baseline results file.")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Tolerated slowdown, e.g. 0.25 for 25%%.")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of samples of every benchmark.")
+    parser.add_argument('--min-time', type=float, default=0.1, help="Minimum duration of a sample, in seconds.")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline.")
+    args = parser.parse_args(argv)
+
+    if not check_parser():
+        print("The recipe parser output does not match tests/fixtures/recipe.expected.json")
+        return 1
+    problems = check_lazy_imports()
+    for problem in problems:
+        print(f"Startup: {problem}")
+    if problems:
+        return 1
+
+    baseline = load_baseline(args.baseline)
+    results = run(args.names, repeat=args.repeat, min_time=args.min_time)
+    for name, seconds in results.items():
+        line = f"{name:<32} {seconds * 1e6:12.1f} us"
+        if name in baseline:
+            line += f"  ({seconds / baseline[name]:.2f}x baseline)"
+        print(line)
+
+    if args.save_baseline:
+        save_baseline({**baseline, **results}, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, seconds, reference in regressions:
+        print(f"Regression: {name} takes {seconds * 1e6:.1f} us, baseline {reference * 1e6:.1f} us "
+              f"(threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+# Makes the src package importable when the tests are run with a bare `pytest` from the repository root
@@ -1,3 +1,5 @@
-from src.pipelines import gz_scraping
+import sys
+from src.cli import main
 
-gz_scraping.run_pipeline('my_data', n_pages=1, delete_cached_files=False)
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Command line entry point of the GialloZafferano pipelines.
+
+Every subcommand imports the modules it needs when it runs, so ``plan`` and ``--help`` do not
+pay for requests, BeautifulSoup, tqdm, openai or the Elasticsearch client.
+"""
+import argparse
+import logging
+import sys
+
+
+def _compression(value):
+    return None if value == 'none' else value
+
+
+def discover(args):
+    from src.pipelines.gz_scraping import extract_urls_recipes
+    from src.utilis import check_and_create_dir
+
+    check_and_create_dir(args.output_dir)
+    recipes_urls = extract_urls_recipes(args.output_dir, args.time_sleep, n_pages=args.n_pages,
+                                        async_mode=args.async_mode, concurrency=args.concurrency,
+                                        requests_per_second=args.requests_per_second,
+                                        incremental=args.incremental, stop_after=args.stop_after)
+    print(f"{len(recipes_urls)} recipes URLs in {args.output_dir}/recipes_urls.json")
+    return 0
+
+
+def scrape(args):
+    from src.pipelines.gz_scraping import run_pipeline
+
+    run_pipeline(args.output_dir, time_sleep=args.time_sleep, n_pages=args.n_pages,
+                 delete_cached_files=args.delete_cached_files, async_mode=args.async_mode,
+                 concurrency=args.concurrency, requests_per_second=args.requests_per_second, refresh=args.refresh,
+                 pipelined=args.pipelined, n_parsers=args.n_parsers, max_retries=args.max_retries,
+                 segment_size=args.segment_size, compression=_compression(args.compression), metrics=args.metrics,
+                 adaptive=args.adaptive, max_requests_per_second=args.max_requests_per_second,
+                 incremental=args.incremental, stop_after=args.stop_after, workers=args.workers)
+    return 0
+
+
+def index(args):
+    if args.ingredients:
+        from src.indexer.memory.gz_ingredient_index import IngredientIndex
+
+        ingredient_index = IngredientIndex.from_corpus(args.output_dir)
+        ingredient_index.save(args.ingredients)
+        print(f"Saved the ingredient index of {len(ingredient_index)} recipes and "
+              f"{len(ingredient_index.vocabulary)} ingredients to {args.ingredients}")
+        return 0
+    if args.memory:
+        from src.indexer.memory.gz_memory_index import InMemoryRecipeIndex
+
+        recipe_index = InMemoryRecipeIndex.from_corpus(args.output_dir)
+        recipe_index.save(args.memory)
+        print(f"Saved the in-memory index of {len(recipe_index.ids)} recipes to {args.memory}")
+        return 0
+
+    from src.indexer.elastic.gz_indexer import MyElasticsearchIndexer
+
+    indexer = MyElasticsearchIndexer(args.es_host, args.index_name)
+    options = {'replicas': args.replicas} if args.rebuild else {}
+    stats = indexer.index_store(f"{args.output_dir}/recipes", delta=args.delta, rebuild=args.rebuild,
+                                chunk_size=args.chunk_size, thread_count=args.threads, **options)
+    return 1 if stats['failed'] else 0
+
+
+def classify(args):
+    from src.indexer.memory.gz_memory_index import iter_corpus
+    from src.transformer.gz_local_classifier import LocalClassifier
+    from src.transformer.gz_transformer import ClassificationCache, OpenAIClassifier, classify_corpus
+    from src.utilis import save_to_json
+
+    cache = ClassificationCache(args.cache or f"{args.output_dir}/classifications.sqlite")
+    try:
+        local = None if args.no_local else LocalClassifier.from_cache(cache)
+        classified = classify_corpus(iter_corpus(args.output_dir), OpenAIClassifier(model=args.model), cache,
+                                     max_workers=args.workers, requests_per_second=args.requests_per_second,
+                                     local=local, retry_unclassified=args.retry_unclassified)
+    finally:
+        cache.close()
+    print(f"{len(classified)} ingredients classified.")
+    if args.output:
+        save_to_json(classified, args.output)
+    return 0
+
+
+def plan(args):
+    from src.pipelines.gz_planning import run_planning
+    from src.populator.gz_populator import CachedMealSearcher, MealSearcher
+    from src.utilis import iter_jsonl
+
+    if args.index:
+        from src.indexer.memory.gz_memory_index import InMemoryRecipeIndex
+
+        searcher = MealSearcher(backend=InMemoryRecipeIndex.load(args.index))
+    else:
+        searcher = MealSearcher(args.es_host, args.index_name)
+    run_planning(iter_jsonl(args.profiles), args.output, CachedMealSearcher(searcher, seed=args.seed),
+                 weeks=args.weeks, seed=args.seed, batch_size=args.batch_size,
+                 compression=_compression(args.compression))
+    return 0
+
+
+def bench(args):
+    try:
+        from benchmarks import gz_bench
+    except ImportError:
+        print("The benchmarks live in the benchmarks directory of the repository, run bench from its root.")
+        return 1
+
+    return gz_bench.main(args.bench_args)
+
+
+def _add_crawl_arguments(parser):
+    parser.add_argument('output_dir', help="Directory where URLs and recipes are saved.")
+    parser.add_argument('--time-sleep', type=float, default=2, help="Seconds between two requests.")
+    parser.add_argument('--n-pages', type=int, default=440, help="Number of category pages to crawl.")
+    parser.add_argument('--async', dest='async_mode', action='store_true', help="Fetch pages concurrently.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Maximum number of requests in flight.")
+    parser.add_argument('--requests-per-second', type=float,
+                        help="Per-host request budget, 1 / time-sleep by default.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Discover only the recipes published since the last run.")
+    parser.add_argument('--stop-after', type=int, default=3,
+                        help="Category pages without new recipes ending an incremental discovery.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='gz', description="GialloZafferano scraping, indexing and meal planning.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_discover = subparsers.add_parser('discover', help="Collect the recipes URLs from the category pages.")
+    _add_crawl_arguments(parser_discover)
+    parser_discover.set_defaults(func=discover)
+
+    parser_scrape = subparsers.add_parser('scrape', help="Run the full scraping pipeline.")
+    _add_crawl_arguments(parser_scrape)
+    parser_scrape.add_argument('--pipelined', action='store_true', help="Parse the pages in a pool of processes.")
+    parser_scrape.add_argument('--n-parsers', type=int, help="Number of parser processes in pipelined mode.")
+    parser_scrape.add_argument('--workers', type=int, default=0,
+                               help="Number of crawler processes sharing a work queue and the request budget.")
+    parser_scrape.add_argument('--refresh', action='store_true', help="Revalidate the already scraped recipes.")
+    parser_scrape.add_argument('--adaptive', action='store_true', help="Adapt the request rate to the site health.")
+    parser_scrape.add_argument('--max-requests-per-second', type=float, default=10.0,
+                               help="Highest request rate of the adaptive mode.")
+    parser_scrape.add_argument('--max-retries', type=int, default=3,
+                               help="Failed attempts after which a recipe is skipped.")
+    parser_scrape.add_argument('--segment-size', type=int, default=100, help="Number of recipes in a store segment.")
+    parser_scrape.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default='gzip')
+    parser_scrape.add_argument('--metrics', action='store_true', help="Write crawl metrics to the output directory.")
+    parser_scrape.add_argument('--delete-cached-files', action='store_true', help="Delete the cached recipes URLs.")
+    parser_scrape.set_defaults(func=scrape)
+
+    parser_index = subparsers.add_parser('index', help="Index the scraped recipes.")
+    parser_index.add_argument('output_dir', help="Directory where URLs and recipes are saved.")
+    parser_index.add_argument('--es-host', default='http://localhost:9200')
+    parser_index.add_argument('--index-name', default='recipes')
+    parser_index.add_argument('--delta', action='store_true', help="Send only the new or changed recipes.")
+    parser_index.add_argument('--rebuild', action='store_true',
+                              help="Build a new index and swap the index name, an alias, to it.")
+    parser_index.add_argument('--replicas', type=int, default=1, help="Replicas of the rebuilt index.")
+    parser_index.add_argument('--chunk-size', type=int, default=500, help="Documents per bulk request.")
+    parser_index.add_argument('--threads', type=int, default=4, help="Bulk requests in flight.")
+    parser_index.add_argument('--memory', metavar='DIR', help="Build and save an in-memory index instead.")
+    parser_index.add_argument('--ingredients', metavar='DIR',
+                              help="Build and save the ingredient index of the pantry queries instead.")
+    parser_index.set_defaults(func=index)
+
+    parser_classify = subparsers.add_parser('classify', help="Classify the ingredients of the scraped recipes.")
+    parser_classify.add_argument('output_dir', help="Directory where URLs and recipes are saved.")
+    parser_classify.add_argument('--cache',
+                                 help="Classification cache, output_dir/classifications.sqlite by default.")
+    parser_classify.add_argument('--model', default='gpt-3.5-turbo', help="OpenAI chat model.")
+    parser_classify.add_argument('--no-local', action='store_true', help="Skip the local keyword classifier.")
+    parser_classify.add_argument('--retry-unclassified', action='store_true',
+                                 help="Send again the ingredients the model left unclassified in a previous run.")
+    parser_classify.add_argument('--workers', type=int, default=4, help="Batches in flight.")
+    parser_classify.add_argument('--requests-per-second', type=float,
+                                 help="Maximum number of model calls per second.")
+    parser_classify.add_argument('--output', help="JSON file receiving the classification of every ingredient.")
+    parser_classify.set_defaults(func=classify)
+
+    parser_plan = subparsers.add_parser('plan', help="Plan the meals of many users.")
+    parser_plan.add_argument('profiles', help="JSONL file of user profiles.")
+    parser_plan.add_argument('output', help="JSONL file receiving the plans.")
+    parser_plan.add_argument('--index', metavar='DIR',
+                             help="Saved in-memory index, Elasticsearch is used otherwise.")
+    parser_plan.add_argument('--es-host', default='http://localhost:9200')
+    parser_plan.add_argument('--index-name', default='recipes')
+    parser_plan.add_argument('--weeks', type=int, default=1)
+    parser_plan.add_argument('--seed', type=int)
+    parser_plan.add_argument('--batch-size', type=int, default=10000, help="Profiles planned together.")
+    parser_plan.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default='gzip')
+    parser_plan.set_defaults(func=plan)
+
+    parser_bench = subparsers.add_parser('bench', help="Run the benchmarks, see python -m benchmarks.gz_bench --help.",
+                                         add_help=False)
+    parser_bench.add_argument('bench_args', nargs='*')
+    parser_bench.set_defaults(func=bench)
+    return parser
+
+
+def main(argv=None):
+    # The pipelines report failures and stage throughput through logging
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = build_parser()
+    # The options of bench belong to the benchmark runner
+    args, unknown = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        args.bench_args += unknown
+    elif unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
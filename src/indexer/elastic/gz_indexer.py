@@ -1,69 +1,304 @@
 from src.interface.elastic import ElasticsearchIndexer
-from dataclasses import dataclass
-from typing import List
-from elasticsearch.helpers import bulk
+from src.store.recipe_store import iter_latest, latest_versions, list_segments, segment_reader
+from src.utilis import open_segment_reader
+from src.transformer.gz_quantity import normalize_ingredients
+# Ingredient, Quantity and Time used to be defined here, they are re-exported for the existing imports
+from src.models.recipe import Recipe, Ingredient, Quantity, Time, as_dict, loads, recipe_id  # noqa: F401
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import bulk, streaming_bulk
+import hashlib
+import itertools
+import json
+import secrets
+import threading
+import time
 
+# Index of the recipes, tuned for the term queries of the search backend: categories and the other
+# filters are lowercased keywords, ingredients are nested so a query matches a single ingredient,
+# their quantities normalized to a base unit can be filtered by range, and the fields only ever read
+# back from _source (steps, scraped quantities, times) are not indexed at all.
+RECIPE_MAPPING = {
+    "settings": {
+        "analysis": {
+            "normalizer": {
+                "lowercase": {"type": "custom", "filter": ["lowercase"]}
+            }
+        }
+    },
+    "mappings": {
+        "dynamic": False,
+        "properties": {
+            "recipe": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+            "ingredients": {
+                "type": "nested",
+                "properties": {
+                    "name": {"type": "keyword", "normalizer": "lowercase"},
+                    "quantity": {"type": "object", "enabled": False},
+                    "normalized_quantity": {
+                        "properties": {
+                            "amount": {"type": "float"},
+                            "unit": {"type": "keyword"},
+                            "descriptor": {"type": "keyword", "index": False}
+                        }
+                    }
+                }
+            },
+            "category": {"type": "keyword", "normalizer": "lowercase"},
+            "difficulty": {"type": "keyword", "normalizer": "lowercase"},
+            "dosage_for": {"type": "keyword", "index": False},
+            "price": {"type": "keyword", "normalizer": "lowercase"},
+            "time": {"type": "object", "enabled": False},
+            "steps": {"type": "object", "enabled": False},
+            "link": {"type": "keyword"},
+            "content_hash": {"type": "keyword", "index": False, "doc_values": False}
+        }
+    }
+}
+
+
+def content_hash(doc):
+    """
+    Hash of the content of a recipe, stable across scrapes of an unchanged page.
 
-@dataclass
-class Quantity:
-    amount: str | None
-    standard_unit: str | None
-    descriptor: str | None
+    :param doc: The Recipe or recipe document, any previous content_hash field is ignored.
+    :return: A hexadecimal SHA-256 digest.
+    """
+    content = dict(as_dict(doc))
+    content.pop('content_hash', None)
+    # Categories come out of a set when scraping, their order carries no meaning
+    if isinstance(content.get('category'), list):
+        content['category'] = sorted(content['category'])
+    # Step numbers are integers on a fresh Recipe and strings once read back from JSON
+    if isinstance(content.get('steps'), dict):
+        content['steps'] = {str(step): text for step, text in content['steps'].items()}
+    serialized = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
 
 
-@dataclass
-class Ingredient:
-    name: str
-    quantity: Quantity
+def timestamped_index_name(alias):
+    """
+    Name of a new index behind an alias: the creation time, down to the microsecond, and a random
+    suffix, so two rebuilds started within the same second never collide.
 
+    :param alias: The alias the index is created for.
+    :return: The index name, e.g. recipes-20240131-235959-123456-1a2b3c.
+    """
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+    return f"{alias}-{stamp}-{int(now % 1 * 1e6):06d}-{secrets.token_hex(3)}"
 
-@dataclass
-class Time:
-    preparation: str
-    cooking: str
 
+def latest_documents(documents):
+    """
+    Keeps the last version of every recipe of a stream of documents, e.g. the versions saved by
+    successive refreshes, in the position of its first version.
 
-@dataclass
-class Recipe:
-    recipe: str
-    ingredients: List[Ingredient]
-    category: list[str]
-    difficulty: str
-    dosage_for: str
-    price: str
-    time: Time
-    steps: dict[str: str]
-    link: str
+    :param documents: Iterable of Recipe objects or document dictionaries.
+    :return: List of document dictionaries, one per recipe ID.
+    """
+    latest = dict()
+    for doc in documents:
+        doc = as_dict(doc)
+        latest[recipe_id(doc['link'])] = doc
+    return list(latest.values())
 
 
 class MyElasticsearchIndexer(ElasticsearchIndexer):
     def _prepare_data(self, data: Recipe):
-        # Implement data preparation logic here
-        return data
+        record = as_dict(data)
+        # The normalized quantities derive from the scraped ones, they are left out of the hash
+        return {**record, 'ingredients': normalize_ingredients(record['ingredients']),
+                'content_hash': content_hash(record)}
 
-    def _format_for_bulk_indexing(self, documents):
+    def _format_for_bulk_indexing(self, documents, index_name=None):
         """
         Formats a list of documents for bulk indexing in Elasticsearch.
 
         :param documents: List of document dictionaries to be indexed.
+        :param index_name: The index receiving the documents, defaults to the index of the indexer.
         :return: A generator that yields properly formatted bulk API actions.
         """
+        index_name = index_name or self.index_name
         for doc in documents:
+            source = self._prepare_data(doc)
             yield {
-                "_index": self.index_name,
-                "_source": doc
+                "_index": index_name,
+                "_id": recipe_id(source['link']),
+                "_source": source
             }
 
     def index_data(self, data: Recipe):
         record = self._prepare_data(data)
-        self.es.index(index=self.index_name, document=record)
+        self.es.index(index=self.index_name, id=recipe_id(record['link']), document=record)
 
     def bulk_data(self, documents):
         # Executing bulk indexing
         success, _ = bulk(self.es, self._format_for_bulk_indexing(documents))
         print(f"Successfully indexed {success} documents.")
 
-    def create_index_if_not_exists(self, mappings):
+    def bulk_data_streaming(self, documents, chunk_size=500, max_chunk_bytes=10 * 1024 * 1024, thread_count=4,
+                            max_retries=5, initial_backoff=2, max_backoff=60, index_name=None, deduplicate=False):
+        """
+        Streams documents to Elasticsearch with bounded batches, parallel workers and retries.
+
+        Batches are cut at chunk_size documents or max_chunk_bytes bytes, whichever comes first.
+        Every worker thread pulls documents from the shared iterator, so memory stays bounded
+        whatever the size of the corpus. Batches rejected with 429 are retried with exponential
+        backoff, other per-document failures are collected and returned.
+
+        Several versions of a recipe would be indexed in an arbitrary order by the workers, so the
+        documents should hold one version per recipe, as index_store and iter_corpus stream them.
+        deduplicate keeps the last version of every recipe of an arbitrary stream instead, at the
+        cost of one document per recipe in memory.
+
+        :param documents: Iterable of document dictionaries to be indexed.
+        :param chunk_size: Maximum number of documents in a bulk request.
+        :param max_chunk_bytes: Maximum size in bytes of a bulk request.
+        :param thread_count: Number of bulk requests in flight.
+        :param max_retries: Number of retries of a batch rejected with 429.
+        :param initial_backoff: Seconds to wait before the first retry, doubled at every retry.
+        :param max_backoff: Maximum number of seconds to wait between two retries.
+        :param index_name: The index receiving the documents, defaults to the index of the indexer.
+        :param deduplicate: Keep only the last version of every recipe ID, buffering the whole stream.
+        :return: A dictionary with the number of indexed documents, the failures and the elapsed seconds.
+        """
+        if deduplicate:
+            documents = latest_documents(documents)
+        actions = iter(self._format_for_bulk_indexing(documents, index_name))
+        actions_lock = threading.Lock()
+        stats_lock = threading.Lock()
+        stats = {'indexed': 0, 'failed': 0, 'failures': list(), 'seconds': 0.0}
+        worker_errors = list()
+
+        def shared_actions():
+            while True:
+                with actions_lock:
+                    action = next(actions, None)
+                if action is None:
+                    return
+                yield action
+
+        def worker():
+            try:
+                for ok, info in streaming_bulk(self.es, shared_actions(), chunk_size=chunk_size,
+                                               max_chunk_bytes=max_chunk_bytes, raise_on_error=False,
+                                               raise_on_exception=False, max_retries=max_retries,
+                                               initial_backoff=initial_backoff, max_backoff=max_backoff):
+                    with stats_lock:
+                        if ok:
+                            stats['indexed'] += 1
+                        else:
+                            stats['failed'] += 1
+                            stats['failures'].append(info)
+            except Exception as e:
+                worker_errors.append(e)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(max(thread_count, 1))]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        if worker_errors:
+            raise worker_errors[0]
+        stats['seconds'] = time.perf_counter() - start
+        return stats
+
+    def changed_documents(self, documents, stats, batch_size=500):
+        """
+        Filters out the documents whose content is already indexed.
+
+        Documents are looked up in batches with a single mget per batch, fetching only the
+        stored content hashes; new documents and documents whose hash changed are yielded.
+
+        :param documents: Iterable of document dictionaries.
+        :param stats: Dictionary whose 'unchanged' counter is incremented for every skipped document.
+        :param batch_size: Number of documents looked up per mget request.
+        :return: A generator of the new or changed documents.
+        """
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                return
+            batch = [as_dict(doc) for doc in batch]
+            ids = [recipe_id(doc['link']) for doc in batch]
+            response = self.es.mget(index=self.index_name, ids=ids, source_includes=['content_hash'])
+            indexed_hashes = {
+                hit['_id']: hit['_source'].get('content_hash')
+                for hit in response['docs'] if hit.get('found')
+            }
+            for doc_id, doc in zip(ids, batch):
+                if indexed_hashes.get(doc_id) == content_hash(doc):
+                    stats['unchanged'] += 1
+                else:
+                    yield doc
+
+    def bulk_data_delta(self, documents, batch_size=500, deduplicate=False, **kwargs):
+        """
+        Indexes only the new or changed documents, unchanged ones are skipped.
+
+        Documents are indexed under their deterministic ID, so a changed recipe replaces
+        its previous version and the index never needs a full rebuild. The documents should hold
+        only the last version of every recipe, an older one would otherwise overwrite it.
+
+        :param documents: Iterable of document dictionaries to be indexed.
+        :param batch_size: Number of documents looked up per mget request.
+        :param deduplicate: Keep only the last version of every recipe ID, buffering the whole stream.
+        :param kwargs: Batching, concurrency and retry options of bulk_data_streaming.
+        :return: The statistics of bulk_data_streaming, with the number of unchanged documents.
+        """
+        if deduplicate:
+            documents = latest_documents(documents)
+        delta_stats = {'unchanged': 0}
+        stats = self.bulk_data_streaming(self.changed_documents(documents, delta_stats, batch_size), **kwargs)
+        stats['unchanged'] = delta_stats['unchanged']
+        return stats
+
+    def index_store(self, store_directory, delta=False, rebuild=False, **kwargs):
+        """
+        Indexes every recipe of a recipe store, streaming the segments from disk. Only the last
+        version of a recipe scraped several times, e.g. by refreshes, is sent.
+
+        :param store_directory: Directory of the RecipeStore segments.
+        :param delta: Send only the recipes that are new or changed since the last indexing.
+        :param rebuild: Build a new index and swap it in with rebuild_index, kwargs may then hold its options.
+        :param kwargs: Batching, concurrency and retry options of bulk_data_streaming.
+        :return: The statistics of bulk_data_streaming, with the number of bytes read.
+        """
+        read_bytes = 0
+        segments = list_segments(store_directory)
+
+        def read_counting(segment):
+            nonlocal read_bytes
+            with open_segment_reader(segment) as f:
+                for line in f:
+                    read_bytes += len(line)
+                    yield loads(line)
+
+        def documents():
+            latest = latest_versions([segment_reader(segment) for segment in segments])
+            sources = [lambda segment=segment: read_counting(segment) for segment in segments]
+            for _, document in iter_latest(sources, latest):
+                yield document
+
+        if rebuild:
+            stats = self.rebuild_index(documents(), **kwargs)
+        elif delta:
+            stats = self.bulk_data_delta(documents(), **kwargs)
+        else:
+            stats = self.bulk_data_streaming(documents(), **kwargs)
+        stats['bytes'] = read_bytes
+        seconds = stats['seconds'] or float('inf')
+        print(f"Indexed {stats['indexed']} documents ({stats['failed']} failed) in {stats['seconds']:.1f}s: "
+              f"{stats['indexed'] / seconds:.0f} docs/s, {read_bytes / seconds / 1024 / 1024:.2f} MB/s.")
+        if delta:
+            print(f"Skipped {stats['unchanged']} unchanged documents.")
+        for failure in stats['failures']:
+            print(f"Failed to index document: {failure}")
+        return stats
+
+    def create_index_if_not_exists(self, mappings=RECIPE_MAPPING):
         """
         Checks if the specified index exists, and creates it with the provided mappings if it does not.
 
@@ -74,3 +309,81 @@ class MyElasticsearchIndexer(ElasticsearchIndexer):
             print(f"Index '{self.index_name}' created.")
         else:
             print(f"Index '{self.index_name}' already exists.")
+
+    def aliased_indices(self):
+        """
+        Returns the indices the index name of the indexer currently points to, as an alias.
+
+        :return: List of index names, empty when the alias does not exist.
+        """
+        try:
+            return sorted(self.es.indices.get_alias(name=self.index_name))
+        except NotFoundError:
+            return list()
+
+    def rebuild_index(self, documents, mappings=RECIPE_MAPPING, replicas=1, refresh_interval='1s', max_num_segments=1,
+                      delete_old=True, health_timeout='5m', **kwargs):
+        """
+        Rebuilds the index from scratch without downtime for the searchers.
+
+        The documents are loaded into a new, timestamped, index created with refresh disabled and no
+        replicas, which is then refreshed and force-merged; the replicas and the refresh interval are
+        restored once the index is compact, and the index name of the indexer, an alias, is atomically
+        swapped from the previous index to the new one. A concrete index holding the name is replaced
+        in the same atomic swap. The new index is deleted, and the alias left on the previous index, if
+        any document is rejected, if its shards are not allocated in time or if anything else fails.
+
+        :param documents: Iterable of document dictionaries to be indexed.
+        :param mappings: The mappings and settings of the new index.
+        :param replicas: Number of replicas of the new index once loaded.
+        :param refresh_interval: Refresh interval of the new index once loaded.
+        :param max_num_segments: Number of segments per shard the new index is force-merged to.
+        :param delete_old: Delete the previous indices once the alias points to the new one.
+        :param health_timeout: How long to wait for the shards of the new index to be allocated before the swap.
+        :param kwargs: Batching, concurrency and retry options of bulk_data_streaming.
+        :return: The statistics of bulk_data_streaming, with the name of the new index.
+        """
+        alias = self.index_name
+        new_index = timestamped_index_name(alias)
+        settings = {
+            **mappings.get("settings", {}),
+            "index": {**mappings.get("settings", {}).get("index", {}), "refresh_interval": "-1",
+                      "number_of_replicas": 0}
+        }
+        self.es.indices.create(index=new_index, settings=settings, mappings=mappings.get("mappings"))
+        try:
+            stats = self.bulk_data_streaming(documents, index_name=new_index, **kwargs)
+            self.es.indices.refresh(index=new_index)
+            self.es.indices.forcemerge(index=new_index, max_num_segments=max_num_segments)
+            self.es.indices.put_settings(index=new_index, settings={
+                "index": {"refresh_interval": refresh_interval, "number_of_replicas": replicas}
+            })
+            health = self.es.cluster.health(index=new_index, wait_for_status='yellow', timeout=health_timeout)
+            # A partial index must never replace the live one
+            if stats['failed']:
+                raise RuntimeError(f"{stats['failed']} documents were rejected while loading '{new_index}', "
+                                   f"the alias '{alias}' is left unchanged: {stats['failures'][:3]}")
+            if health.get('timed_out'):
+                raise RuntimeError(f"The shards of '{new_index}' were not allocated within {health_timeout}, "
+                                   f"the alias '{alias}' is left unchanged")
+
+            old_indices = self.aliased_indices()
+            actions = [{"add": {"index": new_index, "alias": alias}}]
+            actions += [{"remove": {"index": index, "alias": alias}} for index in old_indices]
+            if not old_indices and self.es.indices.exists(index=alias):
+                # An index created before the alias holds the name, it is dropped by the swap itself
+                actions.append({"remove_index": {"index": alias}})
+            self.es.indices.update_aliases(actions=actions)
+        except BaseException:
+            try:
+                self.es.indices.delete(index=new_index)
+            except Exception as e:
+                # The original error matters more than the failed cleanup
+                print(f"Could not delete the index '{new_index}': {e}")
+            raise
+
+        print(f"Alias '{alias}' swapped to '{new_index}' from {old_indices or 'no index'}.")
+        if delete_old and old_indices:
+            self.es.indices.delete(index=old_indices)
+        stats['index'] = new_index
+        return stats
@@ -0,0 +1,268 @@
+from src.indexer.memory.gz_memory_index import SortedStrings, StringTable, iter_corpus
+from src.models.recipe import as_dict, recipe_id
+from src.utilis import check_and_create_dir
+import hashlib
+import json
+import numpy as np
+import os
+
+METRICS = ('coverage', 'jaccard')
+
+
+def normalize_ingredient(name):
+    """
+    Normalizes an ingredient name the way the scraper does: lowercase, single spaces.
+    """
+    return ' '.join(name.split()).lower()
+
+
+class IngredientIndex:
+    """
+    Sparse recipe x ingredient matrix answering "which recipes can I cook with what I have".
+
+    Every distinct ingredient name gets an integer ID, in alphabetical order. The matrix is kept
+    twice, in the postings and offsets layout of InMemoryRecipeIndex: by recipe (the sorted
+    ingredient IDs of every recipe) and by ingredient (the sorted positions of the recipes using
+    it). A pantry query adds up the postings of the pantry ingredients with one bincount, so its
+    cost grows with the number of recipes using them, not with the size of the corpus. The
+    vocabulary and the recipe IDs are SortedStrings looked up by binary search, the recipe names a
+    StringTable; all the arrays are saved as .npy files and memory-mapped on load.
+    """
+
+    def __init__(self, ids, id_positions, names, vocabulary, recipe_offsets, recipe_ingredients, offsets, postings,
+                 version):
+        """
+        :param ids: StringTable of the recipe IDs, by position.
+        :param id_positions: SortedStrings mapping the recipe IDs to their positions.
+        :param names: StringTable of the recipe names, by position.
+        :param vocabulary: SortedStrings of the ingredient names, numbered by ID.
+        :param recipe_offsets: Array of n_recipes + 1 offsets delimiting the ingredients of every recipe.
+        :param recipe_ingredients: Array of the ingredient IDs of all the recipes.
+        :param offsets: Array of n_ingredients + 1 offsets delimiting the recipes of every ingredient.
+        :param postings: Array of the recipe positions of all the ingredients.
+        :param version: Fingerprint of the indexed data.
+        """
+        self.ids = ids
+        self.id_positions = id_positions
+        self.names = names
+        self.vocabulary = vocabulary
+        self.recipe_offsets = recipe_offsets
+        self.recipe_ingredients = recipe_ingredients
+        self.offsets = offsets
+        self.postings = postings
+        self.sizes = np.diff(recipe_offsets).astype(np.int32)
+        self.version = version
+
+    @classmethod
+    def build(cls, recipes):
+        """
+        Builds the index from an iterable of recipes.
+
+        :param recipes: Iterable of Recipe objects or recipe dictionaries.
+        :return: The IngredientIndex.
+        """
+        ids, names, ingredients_per_recipe = list(), list(), list()
+        positions = dict()
+        for recipe in recipes:
+            recipe = as_dict(recipe)
+            ingredients = {normalize_ingredient(ingredient['name']) for ingredient in recipe.get('ingredients') or ()}
+            ingredients.discard('')
+
+            doc_id = recipe_id(recipe['link'])
+            if doc_id in positions:
+                # A recipe scraped again replaces its older version
+                position = positions[doc_id]
+                names[position] = recipe['recipe']
+                ingredients_per_recipe[position] = ingredients
+            else:
+                positions[doc_id] = len(ids)
+                ids.append(doc_id)
+                names.append(recipe['recipe'])
+                ingredients_per_recipe.append(ingredients)
+
+        vocabulary = sorted(set().union(*ingredients_per_recipe))
+        ingredient_ids = {name: number for number, name in enumerate(vocabulary)}
+        sizes = np.fromiter((len(ingredients) for ingredients in ingredients_per_recipe), dtype=np.int64,
+                            count=len(ingredients_per_recipe))
+        recipe_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=recipe_offsets[1:])
+        recipe_ingredients = np.fromiter(
+            (number for ingredients in ingredients_per_recipe
+             for number in sorted(map(ingredient_ids.get, ingredients))),
+            dtype=np.int32, count=int(recipe_offsets[-1]))
+
+        # Transposing: a stable sort by ingredient keeps the recipe positions of every ingredient sorted
+        recipe_positions = np.repeat(np.arange(len(ids), dtype=np.int32), sizes)
+        postings = recipe_positions[np.argsort(recipe_ingredients, kind='stable')]
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(recipe_ingredients, minlength=len(vocabulary)), out=offsets[1:])
+
+        fingerprint = hashlib.sha1()
+        fingerprint.update('\n'.join(ids).encode('utf-8'))
+        fingerprint.update('\n'.join(vocabulary).encode('utf-8'))
+        fingerprint.update(recipe_ingredients.tobytes())
+        return cls(StringTable.from_strings(ids), SortedStrings.from_strings(ids, numbered=True),
+                   StringTable.from_strings(names), SortedStrings.from_strings(vocabulary), recipe_offsets,
+                   recipe_ingredients, offsets, postings, fingerprint.hexdigest())
+
+    @classmethod
+    def from_corpus(cls, output_dir):
+        """
+        Builds the index from the recipes scraped in an output directory.
+
+        :param output_dir: Directory where URLs and recipes are saved.
+        :return: The IngredientIndex.
+        """
+        return cls.build(iter_corpus(output_dir))
+
+    def save(self, directory):
+        """
+        Persists the index to a directory.
+
+        :param directory: The directory where the index files are written.
+        """
+        check_and_create_dir(directory)
+        np.save(os.path.join(directory, 'recipe_offsets.npy'), self.recipe_offsets)
+        np.save(os.path.join(directory, 'recipe_ingredients.npy'), self.recipe_ingredients)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, 'postings.npy'), self.postings)
+        self.ids.save(directory, 'ids')
+        self.id_positions.save(directory, 'sorted_ids')
+        self.names.save(directory, 'names')
+        self.vocabulary.save(directory, 'vocabulary')
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'version': self.version}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Loads an index saved with save.
+
+        :param directory: The directory holding the index files.
+        :param mmap: Memory-map the arrays instead of reading them in memory.
+        :return: The IngredientIndex.
+        """
+        mmap_mode = 'r' if mmap else None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ('recipe_offsets', 'recipe_ingredients', 'offsets', 'postings')
+        }
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        return cls(StringTable.load(directory, 'ids', mmap_mode),
+                   SortedStrings.load(directory, 'sorted_ids', mmap_mode),
+                   StringTable.load(directory, 'names', mmap_mode),
+                   SortedStrings.load(directory, 'vocabulary', mmap_mode),
+                   version=meta['version'], **arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def pantry_ids(self, pantry):
+        """
+        Returns the IDs of the known ingredients of a pantry.
+
+        :param pantry: Iterable of ingredient names.
+        :return: A sorted array of ingredient IDs, the unknown names are left out.
+        """
+        numbers = self.vocabulary.get_many({normalize_ingredient(name) for name in pantry})
+        return np.unique(numbers).astype(np.int32)
+
+    def matched_counts(self, pantry):
+        """
+        Counts the pantry ingredients used by every recipe.
+
+        :param pantry: Iterable of ingredient names.
+        :return: An int32 array with the number of pantry ingredients of every recipe, by position.
+        """
+        numbers = self.pantry_ids(pantry)
+        if not len(numbers):
+            return np.zeros(len(self.ids), dtype=np.int32)
+        postings = np.concatenate([self.postings[self.offsets[number]:self.offsets[number + 1]]
+                                   for number in numbers.tolist()])
+        # The same width as the recipe sizes keeps the scores in 32-bit arithmetic
+        return np.bincount(postings, minlength=len(self.ids)).astype(np.int32)
+
+    def _scores(self, matched, positions, pantry_size, metric):
+        sizes = self.sizes[positions]
+        if metric == 'coverage':
+            # Share of the ingredients of the recipe that are in the pantry
+            return matched / np.maximum(sizes, 1)
+        if metric == 'jaccard':
+            return matched / (sizes + pantry_size - matched)
+        raise ValueError(f"Unknown metric '{metric}', use one of {list(METRICS)}")
+
+    def scores(self, pantry, metric='coverage'):
+        """
+        Scores every recipe against a pantry.
+
+        :param pantry: Iterable of ingredient names.
+        :param metric: 'coverage', the share of the ingredients of the recipe found in the pantry, or
+                       'jaccard', the overlap of the ingredients of the recipe and the pantry.
+        :return: A float64 array with the score of every recipe, by position.
+        """
+        pantry = {normalize_ingredient(name) for name in pantry}
+        return self._scores(self.matched_counts(pantry), slice(None), len(pantry), metric)
+
+    def top_k(self, pantry, k=10, metric='coverage', min_matched=1):
+        """
+        Returns the recipes that best match a pantry.
+
+        :param pantry: Iterable of ingredient names.
+        :param k: Number of recipes to return.
+        :param metric: 'coverage' or 'jaccard', see scores.
+        :param min_matched: Minimum number of pantry ingredients a recipe has to use.
+        :return: A list of at most k dictionaries with 'recipe_id', 'recipe', 'score', 'matched' and
+                 'missing', the number of ingredients of the recipe not in the pantry, best first.
+                 Equal scores are ordered by the number of matched ingredients.
+        """
+        if k <= 0:
+            return list()
+        pantry = {normalize_ingredient(name) for name in pantry}
+        counts = self.matched_counts(pantry)
+        # Scoring every recipe is cheaper than gathering the sizes of the candidates first
+        scores = self._scores(counts, slice(None), len(pantry), metric)
+        eligible = counts >= max(min_matched, 1)
+        if np.count_nonzero(eligible) > k:
+            # Keep every recipe tied with the k-th score, so the ties are broken by the matched count
+            scores[~eligible] = -1.0
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.flatnonzero(eligible)
+        matched, scores = counts[candidates], scores[candidates]
+        order = np.lexsort((candidates, -matched, -scores))[:k]
+        positions = candidates[order]
+        return [
+            {
+                'recipe_id': doc_id,
+                'recipe': name,
+                'score': score,
+                'matched': n_matched,
+                'missing': int(self.sizes[position]) - n_matched,
+            }
+            for position, doc_id, name, score, n_matched in zip(positions.tolist(), self.ids.take(positions),
+                                                                self.names.take(positions), scores[order].tolist(),
+                                                                matched[order].tolist())
+        ]
+
+    def ingredients_of(self, position):
+        """
+        Returns the ingredient names of the recipe at a position.
+        """
+        start, end = self.recipe_offsets[position], self.recipe_offsets[position + 1]
+        return [self.vocabulary[number] for number in self.recipe_ingredients[start:end].tolist()]
+
+    def missing_ingredients(self, recipe, pantry):
+        """
+        Returns the ingredients of a recipe that are not in a pantry, i.e. the shopping list.
+
+        :param recipe: The ID of the recipe.
+        :param pantry: Iterable of ingredient names.
+        :return: The sorted names of the missing ingredients.
+        """
+        position = self.id_positions.get(recipe)
+        if position is None:
+            raise ValueError(f"Unknown recipe '{recipe}'")
+        pantry = {normalize_ingredient(name) for name in pantry}
+        return [name for name in self.ingredients_of(position) if name not in pantry]
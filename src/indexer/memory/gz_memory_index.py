@@ -0,0 +1,347 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+import numpy as np
+from src.interface.search import SearchBackend
+from src.models.recipe import as_dict, recipe_id
+from src.store.recipe_store import by_sequence, iter_latest, list_segments, segment_reader
+from src.utilis import check_and_create_dir, find_json_files, load_from_json
+
+
+def iter_corpus(output_dir):
+    """
+    Streams the recipes scraped in an output directory, from the legacy JSON chunks and the store segments.
+
+    A recipe saved several times, e.g. by refreshes, is only streamed in its last version.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :return: A generator of recipe dictionaries.
+    """
+    sources = [lambda filename=filename: load_from_json(filename)
+               for filename in by_sequence(find_json_files(f"{output_dir}/recipes_json"))]
+    sources += [segment_reader(segment) for segment in list_segments(f"{output_dir}/recipes")]
+    for _, record in iter_latest(sources):
+        yield record
+
+
+class StringTable:
+    """
+    Read-only sequence of strings stored as one UTF-8 buffer delimited by an offsets array, the
+    layout of the postings, so it can be saved as .npy files and memory-mapped.
+    """
+
+    def __init__(self, data, offsets):
+        """
+        :param data: uint8 array of the concatenated UTF-8 strings.
+        :param offsets: Array of n_strings + 1 offsets delimiting every string.
+        """
+        self.data = data
+        self.offsets = offsets
+        self._view = memoryview(data)
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def save(self, directory, name):
+        np.save(os.path.join(directory, f"{name}.npy"), self.data)
+        np.save(os.path.join(directory, f"{name}_offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, directory, name, mmap_mode='r'):
+        return cls(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(directory, f"{name}_offsets.npy"), mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, number):
+        return str(self._view[self.offsets[number]:self.offsets[number + 1]], 'utf-8')
+
+    def __iter__(self):
+        return iter(self.take(np.arange(len(self))))
+
+    def take(self, numbers):
+        """
+        Returns the strings at an array of numbers, reading their offsets in one go.
+        """
+        numbers = np.asarray(numbers, dtype=np.int64)
+        return [str(self._view[start:end], 'utf-8')
+                for start, end in zip(self.offsets[numbers].tolist(), self.offsets[numbers + 1].tolist())]
+
+
+class SortedStrings:
+    """
+    Set of strings stored as a sorted array of fixed-width UTF-8 byte strings, looked up by binary
+    search, so it can be saved as a .npy file and memory-mapped. The byte order of UTF-8 strings is
+    the code point order of Python, so a string is numbered by its rank in sorted().
+
+    Strings may also be mapped to arbitrary numbers, e.g. the IDs of the recipes to their positions,
+    with a positions array parallel to the sorted strings.
+    """
+
+    def __init__(self, keys, positions=None):
+        """
+        :param keys: Sorted array of fixed-width byte strings.
+        :param positions: Array of the number of every key, the rank of the key when None.
+        """
+        self.keys = keys
+        self.positions = positions
+
+    @classmethod
+    def from_strings(cls, strings, numbered=False):
+        """
+        :param strings: Sequence of distinct strings, sorted unless numbered is set.
+        :param numbered: Map every string to its position in strings instead of its rank.
+        """
+        encoded = [string.encode('utf-8') for string in strings]
+        keys = np.asarray(encoded, dtype=f"S{max(map(len, encoded), default=0) or 1}")
+        if not numbered:
+            return cls(keys)
+        order = np.argsort(keys, kind='stable')
+        return cls(keys[order], order.astype(np.int32))
+
+    def save(self, directory, name):
+        np.save(os.path.join(directory, f"{name}.npy"), self.keys)
+        if self.positions is not None:
+            np.save(os.path.join(directory, f"{name}_positions.npy"), self.positions)
+
+    @classmethod
+    def load(cls, directory, name, mmap_mode='r'):
+        positions_file = os.path.join(directory, f"{name}_positions.npy")
+        return cls(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode),
+                   np.load(positions_file, mmap_mode=mmap_mode) if os.path.exists(positions_file) else None)
+
+    def get(self, string, default=None):
+        """
+        Returns the number of a string, or default when it is not in the set.
+        """
+        encoded = string.encode('utf-8')
+        if len(encoded) > self.keys.itemsize:
+            return default
+        rank = int(np.searchsorted(self.keys, encoded))
+        if rank == len(self.keys) or self.keys[rank] != encoded:
+            return default
+        return rank if self.positions is None else int(self.positions[rank])
+
+    def get_many(self, strings):
+        """
+        Returns the numbers of the strings in the set with one binary search, leaving out the others.
+
+        :param strings: Iterable of strings.
+        :return: An array of the numbers of the strings found, in the order of strings.
+        """
+        encoded = [string.encode('utf-8') for string in strings]
+        encoded = np.asarray([key for key in encoded if len(key) <= self.keys.itemsize], dtype=self.keys.dtype)
+        ranks = np.searchsorted(self.keys, encoded)
+        found = ranks < len(self.keys)
+        ranks = ranks[found]
+        ranks = ranks[self.keys[ranks] == encoded[found]]
+        return ranks if self.positions is None else np.asarray(self.positions[ranks])
+
+    def __contains__(self, string):
+        return self.get(string) is not None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, rank):
+        return self.keys[rank].decode('utf-8')
+
+    def __iter__(self):
+        return (key.decode('utf-8') for key in self.keys)
+
+
+class InMemoryRecipeIndex(SearchBackend):
+    """
+    In-process inverted index over the category, ingredient names and difficulty of the recipes.
+
+    Every term maps to the sorted array of the positions of the recipes containing it; all the
+    arrays are stored back to back in one postings array, delimited by an offsets array. The terms
+    are numbered in sorted order and looked up by binary search in a SortedStrings, the recipe IDs
+    and names are StringTables. All of them are saved as .npy files and memory-mapped on load, so
+    an index opens instantly and only the pages of the queried terms and results are ever read.
+    """
+
+    FIELDS = ('category', 'ingredient', 'difficulty')
+
+    def __init__(self, ids, names, terms, offsets, postings, version):
+        """
+        :param ids: StringTable of the recipe IDs, by position.
+        :param names: StringTable of the recipe names, by position.
+        :param terms: SortedStrings of the 'field:value' terms.
+        :param offsets: Array of n_terms + 1 offsets delimiting the postings of every term.
+        :param postings: Array of the recipe positions of all the terms.
+        :param version: Fingerprint of the indexed data.
+        """
+        self.ids = ids
+        self.names = names
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.version = version
+
+    @staticmethod
+    def _key(field, value):
+        return f"{field}:{value.lower()}"
+
+    @classmethod
+    def build(cls, recipes):
+        """
+        Builds the index from an iterable of recipes.
+
+        :param recipes: Iterable of Recipe objects or recipe dictionaries.
+        :return: The InMemoryRecipeIndex.
+        """
+        ids, names, keys_per_recipe = list(), list(), list()
+        positions = dict()
+        for recipe in recipes:
+            recipe = as_dict(recipe)
+            keys = {cls._key('category', category) for category in recipe.get('category') or ()}
+            keys.update(cls._key('ingredient', ingredient['name']) for ingredient in recipe.get('ingredients') or ())
+            if recipe.get('difficulty'):
+                keys.add(cls._key('difficulty', recipe['difficulty']))
+
+            doc_id = recipe_id(recipe['link'])
+            if doc_id in positions:
+                # A recipe scraped again replaces its older version
+                position = positions[doc_id]
+                names[position] = recipe['recipe']
+                keys_per_recipe[position] = keys
+            else:
+                positions[doc_id] = len(ids)
+                ids.append(doc_id)
+                names.append(recipe['recipe'])
+                keys_per_recipe.append(keys)
+
+        postings_per_term = defaultdict(list)
+        for position, keys in enumerate(keys_per_recipe):
+            for key in keys:
+                postings_per_term[key].append(position)
+
+        keys = sorted(postings_per_term)
+        offsets = [0]
+        chunks = list()
+        for key in keys:
+            chunk = np.asarray(postings_per_term[key], dtype=np.int32)
+            chunks.append(chunk)
+            offsets.append(offsets[-1] + len(chunk))
+        postings = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+        offsets = np.asarray(offsets, dtype=np.int64)
+
+        fingerprint = hashlib.sha1()
+        fingerprint.update('\n'.join(ids).encode('utf-8'))
+        fingerprint.update(postings.tobytes())
+        return cls(StringTable.from_strings(ids), StringTable.from_strings(names), SortedStrings.from_strings(keys),
+                   offsets, postings, fingerprint.hexdigest())
+
+    @classmethod
+    def from_corpus(cls, output_dir):
+        """
+        Builds the index from the recipes scraped in an output directory.
+
+        :param output_dir: Directory where URLs and recipes are saved.
+        :return: The InMemoryRecipeIndex.
+        """
+        return cls.build(iter_corpus(output_dir))
+
+    def save(self, directory):
+        """
+        Persists the index to a directory.
+
+        :param directory: The directory where the index files are written.
+        """
+        check_and_create_dir(directory)
+        np.save(os.path.join(directory, 'postings.npy'), self.postings)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        self.ids.save(directory, 'ids')
+        self.names.save(directory, 'names')
+        self.terms.save(directory, 'terms')
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'version': self.version}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Loads an index saved with save.
+
+        :param directory: The directory holding the index files.
+        :param mmap: Memory-map the arrays instead of reading them in memory.
+        :return: The InMemoryRecipeIndex.
+        """
+        mmap_mode = 'r' if mmap else None
+        postings = np.load(os.path.join(directory, 'postings.npy'), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode=mmap_mode)
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        return cls(StringTable.load(directory, 'ids', mmap_mode), StringTable.load(directory, 'names', mmap_mode),
+                   SortedStrings.load(directory, 'terms', mmap_mode), offsets, postings, meta['version'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def postings_of(self, field, value):
+        """
+        Returns the sorted positions of the recipes matching a term clause.
+
+        :param field: One of 'category', 'ingredient' or 'difficulty'.
+        :param value: The value of the field.
+        :return: An array of recipe positions, empty when the term is unknown.
+        """
+        if field not in self.FIELDS:
+            raise ValueError(f"Unknown field '{field}', use one of {list(self.FIELDS)}")
+        number = self.terms.get(self._key(field, value))
+        if number is None:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[number]:self.offsets[number + 1]]
+
+    def match(self, must=None, should=None, must_not=None):
+        """
+        Returns the sorted positions of the recipes matching a boolean query.
+
+        :param must: Clauses every result has to match.
+        :param should: Clauses of which every result has to match at least one, ignored when empty.
+        :param must_not: Clauses no result may match.
+        :return: An array of recipe positions.
+        """
+        matches = None
+        # The rarest terms first keep the intersections small
+        for postings in sorted((self.postings_of(field, value) for field, value in must or ()), key=len):
+            matches = postings if matches is None else np.intersect1d(matches, postings, assume_unique=True)
+        if should:
+            union = np.unique(np.concatenate([self.postings_of(field, value) for field, value in should]))
+            matches = union if matches is None else np.intersect1d(matches, union, assume_unique=True)
+        if matches is None:
+            matches = np.arange(len(self.ids), dtype=np.int32)
+        for field, value in must_not or ():
+            matches = np.setdiff1d(matches, self.postings_of(field, value), assume_unique=True)
+        return matches
+
+    def _pairs(self, positions):
+        return list(zip(self.ids.take(positions), self.names.take(positions)))
+
+    def search(self, must=None, should=None, must_not=None, size=10, seed=None):
+        matches = self.match(must, should, must_not)
+        if seed is not None and len(matches) > size:
+            matches = np.random.default_rng(seed).choice(matches, size=size, replace=False)
+        return self._pairs(matches[:size])
+
+    def sample_by_category(self, slots_per_category, seed=None):
+        rng = np.random.default_rng(seed)
+        samples = dict()
+        for category, n_slots in slots_per_category.items():
+            postings = self.postings_of('category', category)
+            n_slots = min(n_slots, len(postings))
+            samples[category] = self._pairs(rng.choice(postings, size=n_slots, replace=False))
+        return samples
+
+    def category_pool(self, category, max_size):
+        positions = self.postings_of('category', category)[:max_size]
+        return tuple(self.ids.take(positions)), tuple(self.names.take(positions))
+
+    def index_version(self):
+        return self.version
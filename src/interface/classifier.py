@@ -0,0 +1,21 @@
+from abc import ABC, abstractmethod
+
+
+class IngredientClassifier(ABC):
+    """
+    Abstract class for the ingredient classification backends.
+
+    Concrete implementations map ingredient names to one of the categories of
+    INGREDIENTS_CATEGORY, e.g. by asking a remote language model.
+    """
+
+    @abstractmethod
+    def classify(self, names):
+        """
+        Classify a batch of ingredient names.
+
+        :param names: List of ingredient names.
+        :return: Dictionary mapping the classified names to their category, names that
+                 could not be classified are left out.
+        """
+        pass
@@ -0,0 +1,100 @@
+class ScrapeHooks:
+    """
+    Receives the measurements of every stage of the scraping of a URL.
+
+    Every method is a no-op, implementations override the ones they need. Scrapers without
+    hooks skip the measurements entirely.
+    """
+
+    def on_fetch(self, url, seconds, size=None, status=None, error=None):
+        """
+        Called after a page is fetched.
+
+        :param url: The fetched URL.
+        :param seconds: Duration of the fetch.
+        :param size: Number of bytes of the response body, None when unknown.
+        :param status: HTTP status of the response, None when unknown.
+        :param error: The exception raised by the fetch, None on success.
+        """
+        pass
+
+    def on_parse(self, url, seconds, error=None):
+        """
+        Called after a page is parsed.
+
+        :param url: The URL of the page.
+        :param seconds: Duration of the parsing.
+        :param error: The exception raised by the parser, or its description, None on success.
+        """
+        pass
+
+    def on_store(self, url, seconds, error=None):
+        """
+        Called after the parsed data of a page is stored.
+
+        :param url: The URL of the page.
+        :param seconds: Duration of the storing.
+        :param error: The exception raised while storing, None on success.
+        """
+        pass
+
+    def close(self):
+        """
+        Flushes whatever the hooks buffered.
+        """
+        pass
+
+
+class CompositeHooks(ScrapeHooks):
+    """
+    Forwards the measurements to several hooks.
+    """
+
+    def __init__(self, *hooks):
+        self.hooks = hooks
+
+    def on_fetch(self, url, seconds, size=None, status=None, error=None):
+        for hooks in self.hooks:
+            hooks.on_fetch(url, seconds, size, status, error)
+
+    def on_parse(self, url, seconds, error=None):
+        for hooks in self.hooks:
+            hooks.on_parse(url, seconds, error)
+
+    def on_store(self, url, seconds, error=None):
+        for hooks in self.hooks:
+            hooks.on_store(url, seconds, error)
+
+    def close(self):
+        for hooks in self.hooks:
+            hooks.close()
+
+
+def combine_hooks(*hooks):
+    """
+    Combines optional hooks.
+
+    :param hooks: ScrapeHooks or None.
+    :return: None when all the hooks are None, the only hooks given, or their CompositeHooks.
+    """
+    hooks = [h for h in hooks if h is not None]
+    if not hooks:
+        return None
+    return hooks[0] if len(hooks) == 1 else CompositeHooks(*hooks)
+
+
+def response_size(response):
+    """
+    Returns the number of bytes of the body of an HTTP response, None without a response.
+    """
+    return None if response is None else len(response.content)
+
+
+def response_status(response, error=None):
+    """
+    Returns the HTTP status of a fetch: the status of the response, or of the response of the
+    error raised by the fetch, None when there is none.
+    """
+    if error is not None:
+        response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
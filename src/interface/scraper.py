@@ -1,10 +1,16 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
 
+from src.interface.instrumentation import ScrapeHooks, response_size, response_status
+from src.scraper.throttle import HostRateLimiter
+
 
 class Scraper(ABC):
 
     def __init__(self):
         self.url = None
+        self.hooks: ScrapeHooks = None
 
     @abstractmethod
     def fetch_data(self, url):
@@ -15,6 +21,16 @@ class Scraper(ABC):
         """
         pass
 
+    def fetch(self, url):
+        """
+        Fetch data from the given URL along with the HTTP response it comes from, which the
+        instrumentation measures. Scrapers without a response to report return None for it.
+
+        :param url: The URL to fetch data from.
+        :return: A (raw_data, response) pair.
+        """
+        return self.fetch_data(url), None
+
     @abstractmethod
     def parse_data(self, raw_data):
         """
@@ -39,9 +55,131 @@ class Scraper(ABC):
         The main method to orchestrate the scraping process.
 
         :param url: The URL to scrape data from.
+        :return: The parsed data, or None when there was nothing new to fetch.
         """
+        if self.hooks is not None:
+            return self._scrape_instrumented(url)
         raw_data = self.fetch_data(url)
+        if raw_data is None:
+            return None
+        self.url = url
+        data = self.parse_data(raw_data)
+        self.store_data(data)
+        return data
+
+    def _scrape_instrumented(self, url):
+        start = time.perf_counter()
+        try:
+            raw_data, response = self.fetch(url)
+        except Exception as e:
+            self.hooks.on_fetch(url, time.perf_counter() - start, status=response_status(None, e), error=e)
+            raise
+        self.hooks.on_fetch(url, time.perf_counter() - start, response_size(response), response_status(response))
+        if raw_data is None:
+            return None
+        return self._parse_and_store_instrumented(url, raw_data)
+
+    def _parse_and_store_instrumented(self, url, raw_data):
+        self.url = url
+        start = time.perf_counter()
+        try:
+            data = self.parse_data(raw_data)
+        except Exception as e:
+            self.hooks.on_parse(url, time.perf_counter() - start, error=e)
+            raise
+        self.hooks.on_parse(url, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        try:
+            self.store_data(data)
+        except Exception as e:
+            self.hooks.on_store(url, time.perf_counter() - start, error=e)
+            raise
+        self.hooks.on_store(url, time.perf_counter() - start)
+        return data
+
+    async def fetch_data_async(self, url):
+        """
+        Fetch data from the given URL without blocking the event loop.
+
+        By default the blocking fetch_data is run in a worker thread; subclasses
+        with a native asyncio client can override this method.
+
+        :param url: The URL to fetch data from.
+        """
+        return await asyncio.to_thread(self.fetch_data, url)
+
+    async def fetch_async(self, url):
+        """
+        Asyncio counterpart of fetch, run in a worker thread by default.
+
+        :param url: The URL to fetch data from.
+        :return: A (raw_data, response) pair.
+        """
+        return await asyncio.to_thread(self.fetch, url)
+
+    async def scrape_async(self, url):
+        """
+        Asyncio counterpart of scrape: only the fetch is awaited, parsing and storing
+        run on the event loop right after it so self.url always matches the parsed page.
+
+        :param url: The URL to scrape data from.
+        """
+        if self.hooks is not None:
+            return await self._scrape_async_instrumented(url)
+        raw_data = await self.fetch_data_async(url)
+        if raw_data is None:
+            return None
         self.url = url
         data = self.parse_data(raw_data)
         self.store_data(data)
         return data
+
+    async def _scrape_async_instrumented(self, url):
+        start = time.perf_counter()
+        try:
+            raw_data, response = await self.fetch_async(url)
+        except Exception as e:
+            self.hooks.on_fetch(url, time.perf_counter() - start, status=response_status(None, e), error=e)
+            raise
+        self.hooks.on_fetch(url, time.perf_counter() - start, response_size(response), response_status(response))
+        if raw_data is None:
+            return None
+        return self._parse_and_store_instrumented(url, raw_data)
+
+    async def scrape_many(self, urls, on_result, concurrency=8, requests_per_second=None, rate_limiter=None,
+                          retry_policy=None):
+        """
+        Scrape many URLs concurrently.
+
+        :param urls: Iterable of URLs to scrape.
+        :param on_result: Callback invoked as on_result(url, data, error) in completion order;
+                          error is None on success and data is None on failure.
+        :param concurrency: Maximum number of requests in flight at the same time.
+        :param requests_per_second: Per-host request budget, None for no limit.
+        :param rate_limiter: HostRateLimiter to use instead of a fixed requests_per_second budget.
+        :param retry_policy: RetryPolicy of the failed URLs, None to report every failure right away.
+        """
+        rate_limiter = rate_limiter or HostRateLimiter(requests_per_second)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def worker(url):
+            attempt = 0
+            while True:
+                async with semaphore:
+                    await rate_limiter.acquire(url)
+                    try:
+                        data = await self.scrape_async(url)
+                    except Exception as e:
+                        error = e
+                    else:
+                        on_result(url, data, None)
+                        return
+                if retry_policy is None or not retry_policy.should_retry(error, attempt):
+                    on_result(url, None, error)
+                    return
+                # The backoff does not hold a concurrency slot
+                await asyncio.sleep(retry_policy.delay(attempt, error))
+                attempt += 1
+
+        await asyncio.gather(*(worker(url) for url in urls))
@@ -0,0 +1,63 @@
+from abc import ABC, abstractmethod
+
+
+class SearchBackend(ABC):
+    """
+    Abstract class for the recipe search operations used by the meal planners.
+
+    Queries are expressed as lists of (field, value) term clauses on the fields
+    'category', 'ingredient' and 'difficulty'; results are (recipe_id, recipe_name) pairs.
+    """
+
+    @abstractmethod
+    def search(self, must=None, should=None, must_not=None, size=10, seed=None):
+        """
+        Runs a boolean query made of term clauses.
+
+        :param must: Clauses every result has to match.
+        :param should: Clauses of which every result has to match at least one, ignored when empty.
+        :param must_not: Clauses no result may match.
+        :param size: Maximum number of results.
+        :param seed: Seed of a random sample of the matching recipes, None for the first matches.
+        :return: List of (recipe_id, recipe_name) pairs.
+        """
+        pass
+
+    @abstractmethod
+    def sample_by_category(self, slots_per_category, seed=None):
+        """
+        Draws distinct random recipes for several categories at once.
+
+        :param slots_per_category: Mapping of category to the number of recipes to draw.
+        :param seed: Seed of the random sample.
+        :return: Mapping of category to a list of (recipe_id, recipe_name) pairs.
+        """
+        pass
+
+    @abstractmethod
+    def category_pool(self, category, max_size):
+        """
+        Returns the recipes of a category.
+
+        :param category: The recipe category.
+        :param max_size: Maximum number of recipes to return.
+        :return: A pair of tuples with the IDs and the names of the recipes.
+        """
+        pass
+
+    @abstractmethod
+    def index_version(self):
+        """
+        Returns a fingerprint of the searched data that changes whenever the data changes.
+        """
+        pass
+
+    async def sample_many_async(self, requests, concurrency=8):
+        """
+        Runs many sample_by_category requests, concurrently when the backend supports it.
+
+        :param requests: List of (slots_per_category, seed) pairs.
+        :param concurrency: Maximum number of requests in flight at the same time.
+        :return: List of the sample_by_category results, in the order of the requests.
+        """
+        return [self.sample_by_category(slots_per_category, seed) for slots_per_category, seed in requests]
@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+from urllib.parse import urlsplit, urlunsplit
+import hashlib
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class Quantity:
+    amount: str | None
+    standard_unit: str | None
+    descriptor: str | None
+
+
+@dataclass(slots=True)
+class Ingredient:
+    name: str
+    quantity: Quantity
+
+
+@dataclass(slots=True)
+class Time:
+    preparation: str | None
+    cooking: str | None
+
+
+@dataclass(slots=True)
+class Recipe:
+    recipe: str
+    ingredients: list[Ingredient]
+    category: list[str]
+    difficulty: str | None
+    dosage_for: str | None
+    price: str | None
+    time: Time
+    steps: dict[int, str]
+    link: str
+
+    def to_dict(self):
+        """
+        Converts the recipe to the nested dictionary used by the JSON files and Elasticsearch.
+
+        :return: A dictionary containing the structured data of a single recipe.
+        """
+        return {
+            'recipe': self.recipe,
+            'ingredients': [
+                {
+                    'name': ingredient.name,
+                    'quantity': {
+                        'amount': ingredient.quantity.amount,
+                        'standard_unit': ingredient.quantity.standard_unit,
+                        'descriptor': ingredient.quantity.descriptor
+                    }
+                }
+                for ingredient in self.ingredients
+            ],
+            'category': self.category,
+            'difficulty': self.difficulty,
+            'dosage_for': self.dosage_for,
+            'price': self.price,
+            'time': {'preparation': self.time.preparation, 'cooking': self.time.cooking},
+            'steps': self.steps,
+            'link': self.link
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a recipe from its nested dictionary, step numbers read from JSON are turned back to integers.
+
+        :param data: A dictionary containing the structured data of a single recipe.
+        :return: The Recipe.
+        """
+        return cls(
+            recipe=data['recipe'],
+            ingredients=[
+                Ingredient(ingredient['name'], Quantity(**ingredient['quantity']))
+                for ingredient in data['ingredients']
+            ],
+            category=data['category'],
+            difficulty=data['difficulty'],
+            dosage_for=data['dosage_for'],
+            price=data['price'],
+            time=Time(**data['time']),
+            steps={int(step): text for step, text in data['steps'].items()},
+            link=data['link']
+        )
+
+
+# scheme://netloc/path, then the query and fragment to drop; links with characters urlsplit
+# removes or validates go through urlsplit
+PLAIN_LINK_PATTERN = re.compile(r"([A-Za-z][A-Za-z0-9+.-]*)://([^/?#\t\r\n\[\]]*)([^?#\t\r\n]*)(?:[?#].*)?", re.DOTALL)
+
+
+def canonical_link(link):
+    """
+    Normalizes a recipe link: lowercase scheme and host, no query, fragment or trailing slash.
+
+    :param link: The link of the recipe.
+    :return: The canonical link.
+    """
+    # Plain absolute links, i.e. every scraped one, skip the much slower urlsplit
+    match = PLAIN_LINK_PATTERN.fullmatch(link.strip())
+    if match is not None:
+        scheme, netloc, path = match.groups()
+        return f"{scheme.lower()}://{netloc.lower()}{path.rstrip('/')}"
+    parts = urlsplit(link.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+
+def recipe_id(link):
+    """
+    Deterministic document ID of a recipe, derived from its canonical link.
+
+    :param link: The link of the recipe.
+    :return: A hexadecimal SHA-1 digest.
+    """
+    return hashlib.sha1(canonical_link(link).encode('utf-8')).hexdigest()
+
+
+def as_dict(record):
+    """
+    Returns the dictionary form of a record that is either a Recipe or already a dictionary.
+    """
+    return record.to_dict() if isinstance(record, Recipe) else record
+
+
+def dumps(record):
+    """
+    Serializes a Recipe or a dictionary to compact JSON bytes.
+
+    orjson serializes the slotted dataclasses natively when it is installed,
+    the standard library json module is used otherwise.
+
+    :param record: A Recipe or a JSON-compatible dictionary.
+    :return: UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(as_dict(record), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """
+    Deserializes JSON bytes or text to Python objects.
+
+    :param data: UTF-8 encoded JSON.
+    :return: The decoded object.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_recipe(recipe):
+    """
+    Encodes a Recipe to JSON bytes.
+    """
+    return dumps(recipe)
+
+
+def decode_recipe(data):
+    """
+    Decodes JSON bytes to a Recipe.
+    """
+    return Recipe.from_dict(loads(data))
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import threading
+import time
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class URLManifest:
+    """
+    Persistent record of the status of every recipe URL of a crawl, stored in SQLite.
+
+    Each URL keeps its status (done or failed), the number of failed attempts, the time
+    it was last fetched and the chunk file its recipe was saved to, so a crawl can resume
+    and retry failed URLs with an indexed query instead of rescanning the output.
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: Path of the SQLite database file.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                retries INTEGER NOT NULL DEFAULT 0,
+                last_fetched REAL,
+                chunk_file TEXT,
+                error TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS urls_status ON urls (status)")
+        self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def mark_done(self, urls, chunk_file=None):
+        """
+        Records the given URLs as successfully scraped.
+
+        :param urls: Iterable of URLs.
+        :param chunk_file: The chunk file the recipes were saved to, None keeps the previous one.
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.executemany("""
+                INSERT INTO urls (url, status, retries, last_fetched, chunk_file) VALUES (?, ?, 0, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    status = excluded.status,
+                    retries = 0,
+                    last_fetched = excluded.last_fetched,
+                    chunk_file = COALESCE(excluded.chunk_file, urls.chunk_file),
+                    error = NULL
+            """, [(url, STATUS_DONE, now, chunk_file) for url in urls])
+            self.conn.commit()
+
+    def mark_failed(self, url, error):
+        """
+        Records a failed attempt of the given URL.
+
+        :param url: The URL that failed.
+        :param error: The error raised while scraping it.
+        """
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO urls (url, status, retries, last_fetched, error) VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    status = excluded.status,
+                    retries = urls.retries + 1,
+                    last_fetched = excluded.last_fetched,
+                    error = excluded.error
+            """, (url, STATUS_FAILED, time.time(), str(error)))
+            self.conn.commit()
+
+    def pending_urls(self, urls, max_retries=3):
+        """
+        Filters the URLs that still have to be scraped.
+
+        :param urls: Iterable of candidate URLs.
+        :param max_retries: Failed URLs are retried until they failed this many times.
+        :return: List of the URLs never seen or failed fewer than max_retries times.
+        """
+        with self._lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS candidates (url TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM candidates")
+            self.conn.executemany("INSERT OR IGNORE INTO candidates (url) VALUES (?)", ((url,) for url in urls))
+            rows = self.conn.execute("""
+                SELECT candidates.url FROM candidates LEFT JOIN urls ON urls.url = candidates.url
+                WHERE urls.url IS NULL OR (urls.status = ? AND urls.retries < ?)
+            """, (STATUS_FAILED, max_retries)).fetchall()
+            self.conn.execute("DELETE FROM candidates")
+            self.conn.commit()
+        return [row[0] for row in rows]
+
+    def failed_urls(self, max_retries=3):
+        """
+        Returns the failed URLs that can still be retried.
+
+        :param max_retries: Failed URLs are retried until they failed this many times.
+        :return: List of URLs.
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT url FROM urls WHERE status = ? AND retries < ?",
+                                     (STATUS_FAILED, max_retries)).fetchall()
+        return [row[0] for row in rows]
+
+    def bootstrap_from_links(self, links_by_chunk):
+        """
+        Fills an empty manifest from recipes that were saved before the manifest existed.
+
+        :param links_by_chunk: Iterable of (chunk_file, links) pairs.
+        """
+        for chunk_file, links in links_by_chunk:
+            self.mark_done(links, chunk_file=os.path.basename(chunk_file))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
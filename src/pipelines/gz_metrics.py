@@ -0,0 +1,197 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from src.interface.instrumentation import ScrapeHooks
+
+STAGES = ('fetch', 'parse', 'store')
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _percentile(sorted_values, quantile):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values), max(1, math.ceil(quantile * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def _error_class(error):
+    if isinstance(error, str):
+        # The parser processes report errors as "ErrorClass: message"
+        return error.split(':', 1)[0]
+    return type(error).__name__
+
+
+def _write_atomically(filename, text):
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'w') as f:
+        f.write(text)
+    os.replace(tmp_filename, filename)
+
+
+class CrawlMetrics(ScrapeHooks):
+    """
+    Collects the per-URL measurements of a crawl.
+
+    Keeps counters and the durations of the last window events of every stage, from which
+    rolling percentiles are computed. Snapshots are written as JSON and as a Prometheus
+    textfile at most every export_interval seconds, and every event is appended to a JSON
+    lines log.
+    """
+
+    def __init__(self, json_file=None, prometheus_file=None, log_file=None, export_interval=30, window=1024):
+        """
+        :param json_file: File of the JSON snapshot, None to disable it.
+        :param prometheus_file: File of the Prometheus textfile snapshot, None to disable it.
+        :param log_file: JSON lines file receiving one record per event, None to disable it.
+        :param export_interval: Minimum number of seconds between two snapshots.
+        :param window: Number of recent durations per stage the percentiles are computed on.
+        """
+        self.json_file = json_file
+        self.prometheus_file = prometheus_file
+        self.export_interval = export_interval
+        self._log = open(log_file, 'a') if log_file else None
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._started = time.time()
+        self._exported_at = time.monotonic()
+
+        self.durations = {stage: deque(maxlen=window) for stage in STAGES}
+        self.counts = Counter()
+        self.seconds = Counter()
+        self.errors = Counter()
+        self.statuses = Counter()
+        self.bytes = 0
+
+    @classmethod
+    def for_output_dir(cls, output_dir, **kwargs):
+        """
+        Creates metrics snapshotted to metrics.json, metrics.prom and metrics.log.jsonl in the output directory.
+        """
+        return cls(json_file=f"{output_dir}/metrics.json", prometheus_file=f"{output_dir}/metrics.prom",
+                   log_file=f"{output_dir}/metrics.log.jsonl", **kwargs)
+
+    def _record(self, stage, url, seconds, error, **fields):
+        with self._lock:
+            self.counts[stage] += 1
+            self.seconds[stage] += seconds
+            self.durations[stage].append(seconds)
+            if error is not None:
+                self.errors[(stage, _error_class(error))] += 1
+            if self._log is not None:
+                event = {'ts': time.time(), 'stage': stage, 'url': url, 'seconds': round(seconds, 6), **fields,
+                         'error': None if error is None else _error_class(error)}
+                self._log.write(json.dumps(event) + '\n')
+            export = time.monotonic() - self._exported_at >= self.export_interval
+        if export:
+            self.export()
+
+    def on_fetch(self, url, seconds, size=None, status=None, error=None):
+        with self._lock:
+            if size:
+                self.bytes += size
+            if status is not None:
+                self.statuses[status] += 1
+        self._record('fetch', url, seconds, error, size=size, status=status)
+
+    def on_parse(self, url, seconds, error=None):
+        self._record('parse', url, seconds, error)
+
+    def on_store(self, url, seconds, error=None):
+        self._record('store', url, seconds, error)
+
+    def snapshot(self):
+        """
+        Returns the counters and the rolling percentiles of every stage.
+        """
+        with self._lock:
+            stages = dict()
+            for stage in STAGES:
+                durations = sorted(self.durations[stage])
+                stages[stage] = {
+                    'count': self.counts[stage],
+                    'seconds': self.seconds[stage],
+                    'errors': sum(n for (s, _), n in self.errors.items() if s == stage),
+                    'percentiles': {str(q): _percentile(durations, q) for q in QUANTILES},
+                }
+            return {
+                'uptime': time.time() - self._started,
+                'stages': stages,
+                'errors': {f"{stage}:{error_class}": n for (stage, error_class), n in self.errors.items()},
+                'statuses': {str(status): n for status, n in self.statuses.items()},
+                'bytes': self.bytes,
+            }
+
+    @staticmethod
+    def to_prometheus(snapshot):
+        """
+        Formats a snapshot in the Prometheus text exposition format.
+        """
+        lines = [
+            '# HELP gz_scrape_stage_seconds Duration of the scraping stages.',
+            '# TYPE gz_scrape_stage_seconds summary',
+        ]
+        for stage, stats in snapshot['stages'].items():
+            for quantile, value in stats['percentiles'].items():
+                if value is not None:
+                    lines.append(f'gz_scrape_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {value}')
+            lines.append(f'gz_scrape_stage_seconds_sum{{stage="{stage}"}} {stats["seconds"]}')
+            lines.append(f'gz_scrape_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines += [
+            '# HELP gz_scrape_errors_total Errors by stage and error class.',
+            '# TYPE gz_scrape_errors_total counter',
+        ]
+        for key, n in snapshot['errors'].items():
+            stage, error_class = key.split(':', 1)
+            lines.append(f'gz_scrape_errors_total{{stage="{stage}",error="{error_class}"}} {n}')
+        lines += [
+            '# HELP gz_scrape_responses_total Fetched responses by HTTP status.',
+            '# TYPE gz_scrape_responses_total counter',
+        ]
+        for status, n in snapshot['statuses'].items():
+            lines.append(f'gz_scrape_responses_total{{status="{status}"}} {n}')
+        lines += [
+            '# HELP gz_scrape_response_bytes_total Length of the fetched pages.',
+            '# TYPE gz_scrape_response_bytes_total counter',
+            f'gz_scrape_response_bytes_total {snapshot["bytes"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        """
+        Writes the JSON and Prometheus snapshots now.
+        """
+        self._exported_at = time.monotonic()
+        snapshot = self.snapshot()
+        with self._export_lock:
+            if self.json_file:
+                _write_atomically(self.json_file, json.dumps(snapshot, indent=2))
+            if self.prometheus_file:
+                _write_atomically(self.prometheus_file, self.to_prometheus(snapshot))
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+        return snapshot
+
+    def report(self):
+        """
+        Returns a one line summary of the stages, with their median and 99th percentile durations.
+        """
+        snapshot = self.snapshot()
+        parts = list()
+        for stage, stats in snapshot['stages'].items():
+            if stats['count']:
+                p50, p99 = stats['percentiles']['0.5'], stats['percentiles']['0.99']
+                parts.append(f"{stage}: {stats['count']} ({stats['errors']} errors), "
+                             f"p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms")
+        return '; '.join(parts)
+
+    def close(self):
+        self.export()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,200 @@
+import time
+from collections import Counter, defaultdict
+import numpy as np
+from src.models.recipe import dumps
+from src.populator.gz_populator import CachedMealSearcher
+from src.template.weekly_menu_template import CATEGORY_LABELS, FREE, MealPlanner
+from src.utilis import fsync_and_replace, open_segment_writer
+
+NOT_FOUND = -1
+
+
+class PlanningStats:
+    """
+    Counts the plans and slots resolved by a planning run, and the profiles skipped because their
+    preferences cannot be planned.
+    """
+
+    def __init__(self):
+        self.plans = 0
+        self.failed = 0
+        self.failures = Counter()
+        self.slots = 0
+        self.free_slots = 0
+        self.resolved_slots = 0
+        self.recipes_used = defaultdict(set)
+        self.pool_sizes = dict()
+        self.start = time.perf_counter()
+
+    def add(self, plans, indexes):
+        self.plans += len(plans)
+        self.slots += plans.size
+        self.free_slots += int(np.count_nonzero(plans == FREE))
+        self.resolved_slots += int(np.count_nonzero(indexes != NOT_FOUND))
+        for code, label in enumerate(CATEGORY_LABELS):
+            if label in self.pool_sizes:
+                self.recipes_used[label].update(np.unique(indexes[plans == code]).tolist())
+
+    def add_failure(self, n_profiles, error):
+        self.failed += n_profiles
+        self.failures[str(error)] += n_profiles
+
+    def summary(self):
+        """
+        Returns the throughput and the recipe coverage of the run.
+        """
+        seconds = time.perf_counter() - self.start
+        meal_slots = self.slots - self.free_slots
+        return {
+            'plans': self.plans,
+            'failed': self.failed,
+            'failures': dict(self.failures),
+            'seconds': seconds,
+            'plans_per_second': self.plans / seconds if seconds else 0.0,
+            'slot_coverage': self.resolved_slots / meal_slots if meal_slots else 0.0,
+            'recipe_coverage': {
+                label: len(self.recipes_used[label] - {NOT_FOUND}) / size if size else 0.0
+                for label, size in self.pool_sizes.items()
+            }
+        }
+
+    def report(self):
+        summary = self.summary()
+        coverage = ', '.join(f"{label} {share:.1%}" for label, share in summary['recipe_coverage'].items())
+        report = (f"{summary['plans']} plans in {summary['seconds']:.1f}s, {summary['plans_per_second']:.0f} plans/s, "
+                  f"{summary['slot_coverage']:.1%} slots resolved, recipes used per category: {coverage}")
+        for error, n_profiles in summary['failures'].items():
+            report += f"\nSkipped {n_profiles} profiles: {error}"
+        return report
+
+
+def resolve_plans(plans, pools, rng):
+    """
+    Resolves the slots of a matrix of plans to recipes of the category pools, in one vectorized pass.
+
+    Every pool is shuffled once and every plan reads each category from its own random offset
+    of the shuffled pool, so a recipe is only repeated within a plan when its category has fewer
+    recipes than slots.
+
+    :param plans: An array of shape (n_plans, days, meal_times) of category codes, as built by
+                  MealPlanner.generate_plans.
+    :param pools: Mapping of category label to its (ids, names) pool.
+    :param rng: The numpy random Generator.
+    :return: An int32 array of the shape of plans, with the position of the recipe in its category
+             pool, or NOT_FOUND for free and unresolved slots.
+    """
+    flat = plans.reshape(len(plans), -1)
+    indexes = np.full(flat.shape, NOT_FOUND, dtype=np.int32)
+    for code, label in enumerate(CATEGORY_LABELS):
+        size = len(pools[label][0]) if label in pools else 0
+        if not size:
+            continue
+        mask = flat == code
+        # Rank of every slot among the slots of the same category in its plan
+        ranks = np.cumsum(mask, axis=1, dtype=np.int32) - 1
+        offsets = rng.integers(0, size, size=(len(flat), 1), dtype=np.int32)
+        shuffled = rng.permutation(size).astype(np.int32)
+        indexes[mask] = shuffled[(offsets + ranks) % size][mask]
+    return indexes.reshape(plans.shape)
+
+
+def _profile_key(profile):
+    return profile.get('meat_meals', 0), profile.get('fish_meals', 0), profile.get('free_day')
+
+
+def iter_meal_plans(profiles, searcher: CachedMealSearcher = None, weeks=1, seed=None, batch_size=10000,
+                    stats: PlanningStats = None):
+    """
+    Generates and resolves the meal plans of many users, streaming one plan at a time.
+
+    Profiles are consumed in batches; the users of a batch sharing the same preferences get their
+    plans from a single MealPlanner.generate_plans call, and all their slots are resolved at once
+    against category pools loaded a single time and reused across users and batches.
+
+    :param profiles: Iterable of dictionaries with 'user_id' and the optional 'meat_meals',
+                     'fish_meals' and 'free_day' preferences.
+    :param searcher: The CachedMealSearcher holding the category pools, a default one is created when None.
+    :param weeks: Number of weeks of every plan.
+    :param seed: Seed of the plans and of the recipe sampling, for reproducible runs.
+    :param batch_size: Number of profiles planned together.
+    :param stats: PlanningStats updated with every batch, and with the profiles skipped because their
+                  preferences cannot be planned, e.g. more meat meals than days.
+    :return: A generator of dictionaries with 'user_id' and 'plan', a list of slots with 'week', 'day',
+             'moment_of_day', 'category', 'recipe_id' and 'recipe_name' keys.
+    """
+    searcher = searcher or CachedMealSearcher()
+    rng = np.random.default_rng(seed)
+    planners = dict()
+
+    batch = list()
+    for profile in profiles:
+        batch.append(profile)
+        if len(batch) >= batch_size:
+            yield from _plan_batch(batch, searcher, planners, weeks, rng, stats)
+            batch = list()
+    if batch:
+        yield from _plan_batch(batch, searcher, planners, weeks, rng, stats)
+
+
+def _plan_batch(profiles, searcher, planners, weeks, rng, stats):
+    pools = {label: searcher.pool(label) for label in CATEGORY_LABELS if label != CATEGORY_LABELS[FREE]}
+    if stats is not None:
+        stats.pool_sizes.update((label, len(pool[0])) for label, pool in pools.items())
+
+    groups = defaultdict(list)
+    for profile in profiles:
+        groups[_profile_key(profile)].append(profile)
+
+    for key, group in groups.items():
+        try:
+            planner = planners.get(key)
+            if planner is None:
+                planner = planners[key] = MealPlanner(*key)
+            plans = planner.generate_plans(len(group), weeks=weeks, seed=rng.integers(2 ** 63))
+        except ValueError as e:
+            # An infeasible profile must not abort the plans of the other users
+            if stats is not None:
+                stats.add_failure(len(group), e)
+            else:
+                print(f"Skipped {len(group)} profiles: {e}")
+            continue
+        indexes = resolve_plans(plans, pools, rng)
+        if stats is not None:
+            stats.add(plans, indexes)
+
+        for profile, plan, plan_indexes in zip(group, plans, indexes):
+            slots = planner.to_template(plan)
+            for slot, index in zip(slots, plan_indexes.ravel().tolist()):
+                if index == NOT_FOUND:
+                    slot['recipe_id'] = None
+                    slot['recipe_name'] = None if slot['category'] == CATEGORY_LABELS[FREE] else "Recipe Not Found"
+                else:
+                    ids, names = pools[slot['category']]
+                    slot['recipe_id'] = ids[index]
+                    slot['recipe_name'] = names[index]
+            yield {'user_id': profile.get('user_id'), 'plan': slots}
+
+
+def run_planning(profiles, output_file, searcher: CachedMealSearcher = None, weeks=1, seed=None, batch_size=10000,
+                 compression='gzip'):
+    """
+    Plans the meals of many users and streams the plans to a JSONL file.
+
+    :param profiles: Iterable of user preference profiles, see iter_meal_plans.
+    :param output_file: Path of the JSONL file, written atomically.
+    :param searcher: The CachedMealSearcher holding the category pools.
+    :param weeks: Number of weeks of every plan.
+    :param seed: Seed of the plans and of the recipe sampling.
+    :param batch_size: Number of profiles planned together.
+    :param compression: 'gzip', 'zstd' or None.
+    :return: The summary of the PlanningStats.
+    """
+    stats = PlanningStats()
+    tmp_file = f"{output_file}.tmp"
+    with open_segment_writer(tmp_file, compression) as f:
+        for meal_plan in iter_meal_plans(profiles, searcher, weeks=weeks, seed=seed, batch_size=batch_size,
+                                         stats=stats):
+            f.write(dumps(meal_plan) + b'\n')
+    fsync_and_replace(tmp_file, output_file)
+    print(stats.report())
+    return stats.summary()
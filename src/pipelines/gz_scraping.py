@@ -1,27 +1,147 @@
+import asyncio
+import hashlib
+import logging
+import queue
+from collections import deque
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
 from tqdm import tqdm
-from src.utilis import save_to_json, load_from_json, check_and_create_dir, delete_file
+from src.utilis import save_to_json, load_from_json, check_and_create_dir, delete_file, iter_jsonl
 from src.scraper import gz_scrapers
+from src.scraper.http_session import HttpSession
+from src.scraper.throttle import AdaptiveRateLimiter, HostRateLimiter, RetryPolicy, RetryQueue, SharedRateLimiter
+from src.interface.instrumentation import ScrapeHooks, combine_hooks, response_size, response_status
+from src.pipelines.gz_metrics import CrawlMetrics
+from src.pipelines.gz_manifest import URLManifest
+from src.pipelines.gz_work_queue import WorkQueue, default_worker_id
+from src.store.recipe_store import RecipeStore, by_sequence, list_segments
+from src.models.recipe import Recipe, canonical_link, loads
 import os
-import json
 
+logger = logging.getLogger(__name__)
+
+
+def _requests_per_second(time_sleep, requests_per_second):
+    # Without an explicit budget keep the politeness of the sequential mode
+    if requests_per_second is None and time_sleep:
+        return 1 / time_sleep
+    return requests_per_second
+
+
+def _report_failure(rec_url, error, manifest=None):
+    logger.warning("An error occurred while scraping %s: %s", rec_url, error)
+    if manifest is not None:
+        manifest.mark_failed(rec_url, error)
+
+
+def page_fingerprint(recipes_urls):
+    """
+    Fingerprint of the recipes listed by a category page, independent of their order.
+    """
+    return hashlib.sha1('\n'.join(sorted(recipes_urls)).encode('utf-8')).hexdigest()
+
+
+def discover_recipes_urls(output_dir: str, time_sleep: int, n_pages=440, stop_after=3, session=None,
+                          hooks: ScrapeHooks = None) -> list[str]:
+    """
+    Incrementally discovers new recipes, merging them into the persisted recipes URLs.
+
+    Category pages are walked newest first and revalidated with conditional GETs. A page
+    answering 304, listing the same recipes as last time (same fingerprint) or listing only
+    known recipes adds nothing; the walk stops after stop_after such pages in a row, so a
+    refresh only costs the few pages holding the recipes published since the last one. Pages
+    that fail to fetch count as pages without new recipes, so a failing site is not walked to
+    the last page.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :param time_sleep: Seconds to wait between two requests.
+    :param n_pages: Number of category pages to walk at most.
+    :param stop_after: Number of consecutive pages without new recipes, or failed, that ends the walk.
+    :param session: HttpSession used for the requests.
+    :param hooks: ScrapeHooks receiving the measurements of every page.
+    :return: The list of all the known recipes URLs, the new ones included.
+    """
+    urls_file = f"{output_dir}/recipes_urls.json"
+    pages_file = f"{output_dir}/category_pages.json"
+    known_urls = set(load_from_json(urls_file))
+    fingerprints = dict(load_from_json(pages_file) or dict())
+
+    ct_scraper = gz_scrapers.GZCategoriesScraper(session=session, conditional=True)
+    ct_scraper.hooks = hooks
+    n_new, n_requests, pages_without_new = 0, 0, 0
+    for url in ct_scraper.build_urls(n_pages=n_pages):
+        if pages_without_new >= stop_after:
+            break
+        n_requests += 1
+        try:
+            recipes_urls = ct_scraper.scrape(url)
+        except Exception as e:
+            # A failed page counts as a page without new recipes, so an unreachable site ends the walk
+            print(f"An error occurred while scraping {url}: {e}")
+            pages_without_new += 1
+            continue
+        finally:
+            time.sleep(time_sleep)
+
+        new_urls = set()
+        if recipes_urls is not None:
+            fingerprint = page_fingerprint(recipes_urls)
+            if fingerprints.get(url) != fingerprint:
+                fingerprints[url] = fingerprint
+                new_urls = set(recipes_urls) - known_urls
+        if new_urls:
+            known_urls.update(new_urls)
+            n_new += len(new_urls)
+            pages_without_new = 0
+        else:
+            pages_without_new += 1
+
+    save_to_json(sorted(known_urls), urls_file)
+    save_to_json(fingerprints, pages_file)
+    print(f"Discovered {n_new} new recipes with {n_requests} category pages requests.")
+    return sorted(known_urls)
+
+
+def extract_urls_recipes(output_dir: str, time_sleep: int, n_pages=440, async_mode=False, concurrency=8,
+                         requests_per_second=None, session=None, hooks: ScrapeHooks = None, incremental=False,
+                         stop_after=3) -> list[str]:
+    if incremental:
+        return discover_recipes_urls(output_dir, time_sleep, n_pages=n_pages, stop_after=stop_after,
+                                     session=session, hooks=hooks)
 
-def extract_urls_recipes(output_dir: str, time_sleep: int, n_pages=440) -> list[str]:
     all_recipes_urls = load_from_json(f"{output_dir}/recipes_urls.json")
     if len(all_recipes_urls) == 0:
-        ct_scraper = gz_scrapers.GZCategoriesScraper()
+        ct_scraper = gz_scrapers.GZCategoriesScraper(session=session)
+        ct_scraper.hooks = hooks
         categories_urls = ct_scraper.build_urls(n_pages=n_pages)
         all_recipes_urls = list()
 
         # Scrape category URLs to get recipe URLs
-        for url in tqdm(categories_urls):
-            try:
-                recipes_urls = ct_scraper.scrape(url)
-                all_recipes_urls.extend(recipes_urls)
-            except Exception as e:
-                print(f"An error occurred while scraping {url}: {e}")
-            finally:
-                time.sleep(time_sleep)
+        if async_mode:
+            progress_bar = tqdm(total=len(categories_urls))
+
+            def on_result(url, recipes_urls, error):
+                progress_bar.update(1)
+                if error is not None:
+                    print(f"An error occurred while scraping {url}: {error}")
+                else:
+                    all_recipes_urls.extend(recipes_urls)
+
+            asyncio.run(ct_scraper.scrape_many(categories_urls, on_result, concurrency=concurrency,
+                                               requests_per_second=_requests_per_second(time_sleep,
+                                                                                        requests_per_second)))
+            progress_bar.close()
+        else:
+            for url in tqdm(categories_urls):
+                try:
+                    recipes_urls = ct_scraper.scrape(url)
+                    all_recipes_urls.extend(recipes_urls)
+                except Exception as e:
+                    print(f"An error occurred while scraping {url}: {e}")
+                finally:
+                    time.sleep(time_sleep)
 
         # Save the scraped URLs to a JSON file
         save_to_json(list(set(all_recipes_urls)), f"{output_dir}/recipes_urls.json")
@@ -29,26 +149,346 @@ def extract_urls_recipes(output_dir: str, time_sleep: int, n_pages=440) -> list[
     return all_recipes_urls
 
 
-def extract_recipes_info(all_recipes_urls: list[str], output_dir: str, time_sleep: int, n_files_already_processed: int):
-    check_and_create_dir(f"{output_dir}/recipes_json")
-    rec_scraper = gz_scrapers.GZRecipeScraper()
+def open_recipe_store(output_dir, session=None, manifest=None, segment_size=100, compression='gzip', prefix='recipes',
+                      work_queue: WorkQueue = None):
+    """
+    Opens the recipe store of the output directory.
+
+    Every committed segment persists the HTTP validators and marks its recipes as done
+    in the manifest, so the resume state never runs ahead of the recipes on disk.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :param session: HttpSession whose validators are saved on every commit.
+    :param manifest: URLManifest updated on every commit.
+    :param segment_size: Number of recipes in a segment.
+    :param compression: Compression of the segments, 'gzip', 'zstd' or None.
+    :param prefix: Prefix of the segment file names, unique to every worker of a queue crawl.
+    :param work_queue: WorkQueue whose URLs are acknowledged on every commit.
+    :return: The RecipeStore of the crawl.
+    """
+    def on_commit(segment_name, recipes):
+        if session is not None:
+            session.save_validators()
+        # Records recovered from an interrupted segment are plain dictionaries
+        links = [recipe.link if isinstance(recipe, Recipe) else recipe['link'] for recipe in recipes]
+        if manifest is not None:
+            manifest.mark_done(links, chunk_file=segment_name)
+        if work_queue is not None:
+            work_queue.ack(links)
+
+    return RecipeStore(f"{output_dir}/recipes", segment_size=segment_size, compression=compression, prefix=prefix,
+                       on_commit=on_commit)
+
+
+def extract_recipes_info(all_recipes_urls: list[str], output_dir: str, time_sleep: int, store: RecipeStore = None,
+                         async_mode=False, concurrency=8, requests_per_second=None, session=None, refresh=False,
+                         manifest=None, hooks: ScrapeHooks = None, rate_limiter: HostRateLimiter = None,
+                         retry_policy: RetryPolicy = None):
+    store = store or open_recipe_store(output_dir, session, manifest)
+    rec_scraper = gz_scrapers.GZRecipeScraper(session=session, conditional=refresh, store=store)
+    rec_scraper.hooks = _feedback_hooks(hooks, rate_limiter)
+
+    if async_mode:
+        _extract_recipes_info_async(rec_scraper, all_recipes_urls, store, concurrency,
+                                    _requests_per_second(time_sleep, requests_per_second), manifest,
+                                    rate_limiter, retry_policy)
+        return
 
-    all_recipes = list()
-    chunk_n = 0
-    for i, rec_url in enumerate(tqdm(all_recipes_urls)):
+    progress_bar = tqdm(total=len(all_recipes_urls))
+    pending = deque((rec_url, 0) for rec_url in all_recipes_urls)
+    retries = RetryQueue()
+    while pending or retries:
+        # Retries whose backoff expired go first, then new URLs, then the retries still backing off
+        item = retries.pop(block=False) or (pending.popleft() if pending else retries.pop())
+        if item is None:
+            continue
+        rec_url, attempt = item
+        if rate_limiter is not None:
+            rate_limiter.wait(rec_url)
         try:
             recipe = rec_scraper.scrape(rec_url)
-            all_recipes.append(recipe)
+            if recipe is None and manifest is not None:
+                manifest.mark_done([rec_url])
         except Exception as e:
-            print(f"An error occurred while scraping {rec_url}: {e}")
+            if retry_policy is not None and retry_policy.should_retry(e, attempt):
+                retries.push((rec_url, attempt + 1), retry_policy.delay(attempt, e))
+                continue
+            _report_failure(rec_url, e, manifest)
         finally:
-            time.sleep(time_sleep)
+            if rate_limiter is None:
+                time.sleep(time_sleep)
+        progress_bar.update(1)
+    progress_bar.close()
+    store.close()
+
+
+def _feedback_hooks(hooks, rate_limiter):
+    # An adaptive rate limiter learns from the outcome of every fetch
+    return combine_hooks(hooks, rate_limiter if isinstance(rate_limiter, ScrapeHooks) else None)
+
+
+def _extract_recipes_info_async(rec_scraper, all_recipes_urls, store, concurrency, requests_per_second,
+                                manifest=None, rate_limiter=None, retry_policy=None):
+    progress_bar = tqdm(total=len(all_recipes_urls))
+
+    def on_result(rec_url, recipe, error):
+        progress_bar.update(1)
+        if error is not None:
+            _report_failure(rec_url, error, manifest)
+        elif recipe is None and manifest is not None:
+            manifest.mark_done([rec_url])
+
+    asyncio.run(rec_scraper.scrape_many(all_recipes_urls, on_result, concurrency=concurrency,
+                                        requests_per_second=requests_per_second, rate_limiter=rate_limiter,
+                                        retry_policy=retry_policy))
+    store.close()
+    progress_bar.close()
+
+
+class StageStats:
+    """
+    Counts items and busy time of a single pipeline stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, error=False):
+        with self._lock:
+            self.items += 1
+            self.errors += int(error)
+            self.busy_seconds += seconds
+
+    def report(self, wall_seconds):
+        throughput = self.items / wall_seconds if wall_seconds else 0.0
+        return (f"{self.name}: {self.items} items ({self.errors} errors), {throughput:.2f} items/s, "
+                f"{self.busy_seconds:.1f}s busy")
+
+
+_worker_scraper = None
+
+
+def _parse_recipe_page(rec_url, raw_data):
+    """
+    Parse stage executed in the process pool, one scraper instance per worker process.
+    """
+    global _worker_scraper
+    if _worker_scraper is None:
+        _worker_scraper = gz_scrapers.GZRecipeScraper()
+    start = time.perf_counter()
+    try:
+        _worker_scraper.url = rec_url
+        recipe = _worker_scraper.parse_data(raw_data)
+        error = None
+    except Exception as e:
+        recipe = None
+        error = f"{type(e).__name__}: {e}"
+    return rec_url, recipe, error, time.perf_counter() - start
+
+
+def extract_recipes_info_pipelined(all_recipes_urls: list[str], output_dir: str, store: RecipeStore = None,
+                                   n_fetchers=4, n_parsers=None, queue_size=64, requests_per_second=None,
+                                   session=None, refresh=False, manifest=None, hooks: ScrapeHooks = None,
+                                   rate_limiter: HostRateLimiter = None, retry_policy: RetryPolicy = None):
+    """
+    Scrapes the recipes with decoupled fetch, parse and write stages.
+
+    Fetcher threads push raw HTML into a bounded queue, a process pool parses the pages on
+    every core and the calling thread is the single writer streaming them into the store.
+    A full queue blocks the fetchers, so memory stays bounded when parsing falls behind.
+
+    :param all_recipes_urls: The recipe URLs to scrape.
+    :param output_dir: Directory where the recipes are saved.
+    :param store: RecipeStore the recipes are written to, defaults to the store of the output directory.
+    :param n_fetchers: Number of fetcher threads.
+    :param n_parsers: Number of parser processes, defaults to the number of CPUs.
+    :param queue_size: Maximum number of fetched pages waiting to be parsed.
+    :param requests_per_second: Per-host request budget shared by the fetchers, None for no limit.
+    :param session: HttpSession used by the fetchers.
+    :param refresh: Revalidate pages with conditional GETs, unchanged pages are skipped.
+    :param manifest: URLManifest recording the status of every URL, None to disable it.
+    :param hooks: ScrapeHooks receiving the measurements of every URL, None to disable them.
+    :param rate_limiter: HostRateLimiter to use instead of a fixed requests_per_second budget.
+    :param retry_policy: RetryPolicy re-queueing the failed fetches, None to report every failure right away.
+    :return: A list with the StageStats of the fetch, parse and write stages.
+    """
+    store = store or open_recipe_store(output_dir, session, manifest)
+    rec_scraper = gz_scrapers.GZRecipeScraper(session=session, conditional=refresh, store=store)
+    hooks = _feedback_hooks(hooks, rate_limiter)
+    rate_limiter = rate_limiter or HostRateLimiter(requests_per_second)
+    fetch_stats, parse_stats, write_stats = StageStats('fetch'), StageStats('parse'), StageStats('write')
+
+    urls_queue = queue.Queue()
+    for rec_url in all_recipes_urls:
+        urls_queue.put(rec_url)
+    html_queue = queue.Queue(maxsize=queue_size)
+
+    retries = RetryQueue()
+
+    def next_url():
+        item = retries.pop(block=False)
+        if item is not None:
+            return item
+        try:
+            return urls_queue.get_nowait(), 0
+        except queue.Empty:
+            # Wait for the retries still backing off, None once there is nothing left
+            return retries.pop()
+
+    fetcher_errors = list()
+
+    def fetch_urls():
+        while True:
+            item = next_url()
+            if item is None:
+                return
+            rec_url, attempt = item
+            rate_limiter.wait(rec_url)
+            start = time.perf_counter()
+            try:
+                raw_data, response = rec_scraper.fetch(rec_url)
+            except Exception as e:
+                fetch_stats.add(time.perf_counter() - start, error=True)
+                if hooks is not None:
+                    hooks.on_fetch(rec_url, time.perf_counter() - start, status=response_status(None, e), error=e)
+                if retry_policy is not None and retry_policy.should_retry(e, attempt):
+                    retries.push((rec_url, attempt + 1), retry_policy.delay(attempt, e))
+                    continue
+                progress_bar.update(1)
+                _report_failure(rec_url, e, manifest)
+                continue
+            fetch_stats.add(time.perf_counter() - start)
+            if hooks is not None:
+                hooks.on_fetch(rec_url, time.perf_counter() - start, response_size(response),
+                               response_status(response))
+            if raw_data is not None:
+                html_queue.put((rec_url, raw_data))
+                continue
+            progress_bar.update(1)
+            if manifest is not None:
+                manifest.mark_done([rec_url])
 
-        # Save every 100 iterations and at the end
-        if (i + 1) % 100 == 0 or i + 1 == len(all_recipes_urls):
-            chunk_n += 1
-            save_to_json(all_recipes, f'{output_dir}/recipes_json/all_recipes_{chunk_n + n_files_already_processed}.json')
-            all_recipes = list()
+    def fetcher():
+        # The writer waits for the end marker of every fetcher, even one killed by an unexpected error
+        try:
+            fetch_urls()
+        except Exception as e:
+            fetcher_errors.append(e)
+        finally:
+            html_queue.put(None)
+
+    def write(future):
+        rec_url, recipe, error, parse_seconds = future.result()
+        parse_stats.add(parse_seconds, error=error is not None)
+        if hooks is not None:
+            hooks.on_parse(rec_url, parse_seconds, error=error)
+        progress_bar.update(1)
+        if error is not None:
+            _report_failure(rec_url, error, manifest)
+            return
+        start = time.perf_counter()
+        rec_scraper.store_data(recipe)
+        write_stats.add(time.perf_counter() - start)
+        if hooks is not None:
+            hooks.on_store(rec_url, time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    progress_bar = tqdm(total=len(all_recipes_urls))
+    fetchers = [threading.Thread(target=fetcher, daemon=True) for _ in range(n_fetchers)]
+    for thread in fetchers:
+        thread.start()
+
+    n_parsers = n_parsers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=n_parsers) as executor:
+        max_in_flight = 2 * n_parsers
+        in_flight = set()
+        finished_fetchers = 0
+        while finished_fetchers < n_fetchers:
+            item = html_queue.get()
+            if item is None:
+                finished_fetchers += 1
+                continue
+            in_flight.add(executor.submit(_parse_recipe_page, *item))
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future)
+        for future in wait(in_flight).done:
+            write(future)
+
+    store.close()
+    rec_scraper.session.save_validators()
+    progress_bar.close()
+    if fetcher_errors:
+        raise fetcher_errors[0]
+
+    wall_seconds = time.perf_counter() - wall_start
+    stages = [fetch_stats, parse_stats, write_stats]
+    for stage in stages:
+        logger.info(stage.report(wall_seconds))
+    return stages
+
+
+def _iter_latest_links(links_by_file):
+    # The files are read once: only the links are kept, with their canonical form, and a link
+    # is yielded with the last file holding it
+    last_file = dict()
+    files = list()
+    for number, (filename, links) in enumerate(links_by_file):
+        keys = [canonical_link(link) for link in links]
+        last_file.update(dict.fromkeys(keys, number))
+        files.append((filename, links, keys))
+    for number, (filename, links, keys) in enumerate(files):
+        links = [link for link, key in zip(links, keys) if last_file[key] == number]
+        if links:
+            yield filename, links
+
+
+def iter_links_by_json_file(directory):
+    """
+    Yield the links saved in every JSON file of the specified directory, oldest file first by chunk number.
+    A link saved in several files is only yielded with the last one.
+
+    Parameters:
+    - directory (str): The directory containing JSON files.
+
+    Returns:
+    - generator: (filepath, links) pairs, one for each JSON file holding a last version.
+    """
+    try:
+        filenames = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    filepaths = by_sequence(os.path.join(directory, filename) for filename in filenames if filename.endswith('.json'))
+    yield from _iter_latest_links(
+        (filepath, [item['link'] for item in load_from_json(filepath) if 'link' in item]) for filepath in filepaths)
+
+
+def count_files(directory) -> int:
+    """
+    Count the entries of the specified directory, 0 if it does not exist.
+    """
+    try:
+        return len(os.listdir(directory))
+    except FileNotFoundError:
+        return 0
+
+
+def iter_links_by_segment(directory):
+    """
+    Yield the links saved in every committed segment of a recipe store directory. A link refreshed
+    into a later segment is only yielded with that segment.
+
+    :param directory: The directory of the recipe store.
+    :return: A generator of (segment, links) pairs.
+    """
+    yield from _iter_latest_links(
+        (segment, [item['link'] for item in iter_jsonl(segment, loads=loads) if 'link' in item])
+        for segment in list_segments(directory))
 
 
 def extract_links_from_json_dir(directory) -> (list[str], int):
@@ -62,29 +502,274 @@ def extract_links_from_json_dir(directory) -> (list[str], int):
     - list: A list of links extracted from the JSON files.
     """
     links = []
-    n_files = 0
+    for _, file_links in iter_links_by_json_file(directory):
+        links.extend(file_links)
+    return links, count_files(directory)
+
+
+def open_manifest(output_dir) -> URLManifest:
+    """
+    Opens the URL manifest of the output directory.
+
+    The first time it is opened for an output directory that already holds recipes, the
+    manifest is filled from the saved JSON chunks and store segments so the resume state
+    is not lost.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :return: The URLManifest of the crawl.
+    """
+    manifest = URLManifest(f"{output_dir}/manifest.sqlite")
+    if len(manifest) == 0:
+        manifest.bootstrap_from_links(iter_links_by_json_file(f"{output_dir}/recipes_json"))
+        manifest.bootstrap_from_links(iter_links_by_segment(f"{output_dir}/recipes"))
+    return manifest
+
+
+def open_work_queue(output_dir, lease_timeout=600, max_retries=3) -> WorkQueue:
+    """
+    Opens the work queue shared by the crawler processes of the output directory.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :param lease_timeout: Seconds after which the URLs leased by a dead worker are leased again.
+    :param max_retries: Number of failed attempts after which a URL is set aside.
+    :return: The WorkQueue of the crawl.
+    """
+    return WorkQueue(f"{output_dir}/work_queue.sqlite", lease_timeout=lease_timeout, max_attempts=max_retries)
+
+
+def run_queue_worker(output_dir, worker_id=None, time_sleep=2, requests_per_second=None, lease_size=10,
+                     lease_timeout=600, max_retries=3, segment_size=100, compression='gzip', session=None,
+                     hooks: ScrapeHooks = None, poll_interval=5, refresh=False):
+    """
+    Scrapes the recipes of the work queue of the output directory until it is empty.
+
+    Any number of workers can run at the same time, in separate processes. Each one writes to
+    its own store segments, named after its worker id, and acknowledges its URLs once their
+    segment is committed. All of them share a single per-host request budget, so adding workers
+    speeds up the crawl only while the fetches, not the politeness budget, are the bottleneck.
+
+    Without a session, the worker starts from the HTTP validators of the output directory and
+    saves the ones it collects to its own http_validators_{worker_id}.json, see merge_worker_validators.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :param worker_id: Identifier of the worker, made of letters, digits and dashes. A worker restarted
+                      with the same id recovers the segment it was writing; defaults to host and process id.
+    :param time_sleep: Seconds between two requests of all the workers, when requests_per_second is None.
+    :param requests_per_second: Per-host request budget shared by all the workers.
+    :param lease_size: Number of URLs leased at a time.
+    :param lease_timeout: Seconds after which the URLs leased by a dead worker are leased again.
+    :param max_retries: Number of failed attempts after which a URL is set aside.
+    :param segment_size: Number of recipes in a committed store segment.
+    :param compression: Compression of the store segments, 'gzip', 'zstd' or None.
+    :param session: HttpSession used to fetch the recipes.
+    :param hooks: ScrapeHooks receiving the fetch, parse and store measurements of every URL.
+    :param poll_interval: Seconds to wait for the URLs leased by other workers before leasing again.
+    :param refresh: Revalidate the recipes with conditional GETs, unchanged ones are not saved again.
+    :return: The number of fetches of this worker, retries included.
+    """
+    worker_id = worker_id or default_worker_id()
+    work_queue = open_work_queue(output_dir, lease_timeout=lease_timeout, max_retries=max_retries)
+    manifest = URLManifest(f"{output_dir}/manifest.sqlite")
+    rate_limiter = SharedRateLimiter(f"{output_dir}/politeness.sqlite",
+                                     _requests_per_second(time_sleep, requests_per_second))
+    own_session = session is None
+    if own_session:
+        # Validators saved by an interrupted run of this worker are newer than the shared ones
+        session = HttpSession(pool_maxsize=1, validators_file=_worker_validators_file(output_dir, worker_id))
+        session.load_validators(f"{output_dir}/http_validators.json", replace=False)
+    store = open_recipe_store(output_dir, session, manifest, segment_size=segment_size, compression=compression,
+                              prefix=f"recipes_{worker_id}", work_queue=work_queue)
+    rec_scraper = gz_scrapers.GZRecipeScraper(session=session, conditional=refresh, store=store)
+    rec_scraper.hooks = hooks
+
+    fetched = 0
     try:
-        for filename in os.listdir(directory):
-            n_files += 1
-            if filename.endswith('.json'):
-                filepath = os.path.join(directory, filename)
-                with open(filepath, 'r') as file:
-                    data = json.load(file)
-                    for item in data:
-                        if 'link' in item:
-                            links.append(item['link'])
-    except FileNotFoundError:
-        pass
-    return links, n_files
+        while True:
+            urls = work_queue.lease(worker_id, lease_size)
+            if not urls:
+                # Acknowledge what this worker holds, then wait for the leases of the other workers
+                store.commit()
+                if not work_queue.unfinished():
+                    break
+                time.sleep(poll_interval)
+                continue
+            for rec_url in urls:
+                rate_limiter.wait(rec_url)
+                try:
+                    if rec_scraper.scrape(rec_url) is None:
+                        work_queue.ack([rec_url])
+                except Exception as e:
+                    _report_failure(rec_url, e, manifest)
+                    work_queue.fail(worker_id, rec_url, e)
+                fetched += 1
+        store.close()
+    finally:
+        # The URLs of an uncommitted segment are leased again once their lease expires
+        if own_session:
+            session.close()
+        rate_limiter.close()
+        manifest.close()
+        work_queue.close()
+    return fetched
+
+
+def _worker_validators_file(output_dir, worker_id):
+    return f"{output_dir}/http_validators_{worker_id}.json"
 
 
-def run_pipeline(output_dir, time_sleep=2, n_pages=440, delete_cached_files=False):
+def merge_worker_validators(output_dir, worker_ids, session=None):
+    """
+    Merges the HTTP validators saved by queue workers into the validators of the output directory,
+    and deletes their files.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :param worker_ids: Identifiers of the workers that are done.
+    :param session: HttpSession of the output directory validators, which would otherwise overwrite
+                    the merged file when closed.
+    """
+    own_session = session is None
+    session = session or HttpSession(validators_file=f"{output_dir}/http_validators.json")
+    for worker_id in worker_ids:
+        session.load_validators(_worker_validators_file(output_dir, worker_id))
+    session.save_validators()
+    for worker_id in worker_ids:
+        delete_file(_worker_validators_file(output_dir, worker_id))
+    if own_session:
+        session.close()
+
+
+def _queue_worker_process(output_dir, worker_id, kwargs):
+    fetched = run_queue_worker(output_dir, worker_id, **kwargs)
+    print(f"Worker {worker_id} fetched {fetched} pages")
+
+
+def run_queue_workers(output_dir, recipes_urls, n_workers, refresh=False, session=None, **kwargs):
+    """
+    Enqueues recipe URLs and scrapes them with n_workers crawler processes.
+
+    The workers are named w0 to w{n_workers - 1}, so a restarted crawl recovers the segments its
+    workers were writing. More workers, e.g. on other terminals, can join the crawl with
+    run_queue_worker and their default ids. The workers share one request budget, requests_per_second
+    or 1 / time_sleep, so n_workers only speeds up the crawl when that budget is raised with it.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :param recipes_urls: The recipe URLs to enqueue, the ones already queued keep their state unless refresh is set.
+    :param n_workers: Number of worker processes.
+    :param refresh: Queue the URLs already scraped again and revalidate them with conditional GETs.
+    :param session: HttpSession of the output directory validators, receiving the ones of the workers.
+    :param kwargs: Arguments of run_queue_worker.
+    :return: The number of URLs in every state of the queue at the end.
+    """
+    work_queue = open_work_queue(output_dir, lease_timeout=kwargs.get('lease_timeout', 600),
+                                 max_retries=kwargs.get('max_retries', 3))
+    added = work_queue.enqueue(recipes_urls, reset=refresh)
+    print(f"{added} URLs enqueued, {work_queue.unfinished()} to scrape")
+
+    if session is not None:
+        # The workers start from the validators collected so far
+        session.save_validators()
+    worker_ids = [f"w{i}" for i in range(n_workers)]
+    workers = [
+        multiprocessing.Process(target=_queue_worker_process,
+                                args=(output_dir, worker_id, {**kwargs, 'refresh': refresh}))
+        for worker_id in worker_ids
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    merge_worker_validators(output_dir, worker_ids, session)
+
+    counts = work_queue.counts()
+    work_queue.close()
+    print(f"Work queue: {', '.join(f'{n} {state}' for state, n in counts.items())}")
+    return counts
+
+
+def run_pipeline(output_dir, time_sleep=2, n_pages=440, delete_cached_files=False, async_mode=False, concurrency=8,
+                 requests_per_second=None, refresh=False, pipelined=False, n_parsers=None, queue_size=64,
+                 max_retries=3, segment_size=100, compression='gzip', hooks: ScrapeHooks = None, metrics=False,
+                 adaptive=False, max_requests_per_second=10.0, retry_policy: RetryPolicy = None, incremental=False,
+                 stop_after=3, workers=0, lease_size=10, lease_timeout=600):
+    """
+    Runs the full GialloZafferano scraping pipeline.
+
+    :param output_dir: Directory where URLs and recipes are saved.
+    :param time_sleep: Seconds to wait between two requests in sequential mode.
+    :param n_pages: Number of category pages to crawl.
+    :param delete_cached_files: Delete the cached recipes URLs at the end.
+    :param async_mode: Fetch pages concurrently with asyncio instead of one after another.
+    :param concurrency: Maximum number of requests in flight in async mode.
+    :param requests_per_second: Per-host request budget in async mode, defaults to 1 / time_sleep.
+    :param refresh: Revalidate already scraped recipes with conditional GETs and save only the changed ones.
+    :param pipelined: Scrape the recipes with concurrency fetcher threads feeding a pool of parser processes.
+    :param n_parsers: Number of parser processes in pipelined mode, defaults to the number of CPUs.
+    :param queue_size: Maximum number of fetched pages waiting to be parsed in pipelined mode.
+    :param max_retries: Failed recipes are retried on the next runs until they failed this many times.
+    :param segment_size: Number of recipes in a committed store segment.
+    :param compression: Compression of the store segments, 'gzip', 'zstd' or None.
+    :param hooks: ScrapeHooks receiving the fetch, parse and store measurements of every URL.
+    :param metrics: Without hooks, collect CrawlMetrics snapshotted in the output directory.
+    :param adaptive: Adapt the request rate of the recipe pages to the health of the site, starting from
+                     1 / time_sleep or requests_per_second, instead of keeping it fixed.
+    :param max_requests_per_second: Highest request rate the adaptive mode may reach.
+    :param retry_policy: RetryPolicy re-queueing the recipes that failed with a throttling, server or
+                         connection error, defaults to RetryPolicy() in adaptive mode.
+    :param incremental: Discover the recipes published since the last run instead of reusing the cached
+                        recipes URLs as they are, see discover_recipes_urls.
+    :param stop_after: Number of consecutive category pages without new recipes ending the discovery.
+    :param workers: Scrape the recipes with this many crawler processes sharing a work queue and the
+                    request budget, see run_queue_workers. The budget of requests_per_second, or
+                    1 / time_sleep, is shared by all the workers through a SharedRateLimiter, so more
+                    workers only help when requests_per_second is raised accordingly. Hooks, metrics and
+                    the adaptive rate do not apply to the workers.
+    :param lease_size: Number of URLs a worker leases at a time.
+    :param lease_timeout: Seconds after which the URLs leased by a dead worker are leased again.
+    """
     check_and_create_dir(output_dir)
+    rate_limiter = None
+    if adaptive:
+        initial_rate = _requests_per_second(time_sleep, requests_per_second) or max_requests_per_second
+        rate_limiter = AdaptiveRateLimiter(initial_rate=min(initial_rate, max_requests_per_second),
+                                           max_rate=max_requests_per_second)
+        retry_policy = retry_policy or RetryPolicy()
+    own_hooks = hooks is None and metrics
+    if own_hooks:
+        hooks = CrawlMetrics.for_output_dir(output_dir)
+    session = HttpSession(pool_maxsize=max(concurrency, 1), validators_file=f"{output_dir}/http_validators.json")
+    manifest = open_manifest(output_dir)
+    store = open_recipe_store(output_dir, session, manifest, segment_size=segment_size, compression=compression)
 
-    recipes_urls = extract_urls_recipes(output_dir, time_sleep, n_pages=n_pages)
-    already_processed_recipes_urls, n_files = extract_links_from_json_dir(f"{output_dir}/recipes_json")
-    recipes_urls = list(set(recipes_urls) - set(already_processed_recipes_urls))
-    extract_recipes_info(recipes_urls, output_dir, time_sleep, n_files)
+    recipes_urls = extract_urls_recipes(output_dir, time_sleep, n_pages=n_pages, async_mode=async_mode,
+                                        concurrency=concurrency, requests_per_second=requests_per_second,
+                                        session=session, hooks=hooks, incremental=incremental,
+                                        stop_after=stop_after)
+    if not refresh:
+        recipes_urls = manifest.pending_urls(recipes_urls, max_retries=max_retries)
+    if workers:
+        run_queue_workers(output_dir, recipes_urls, workers, refresh=refresh, session=session, time_sleep=time_sleep,
+                          requests_per_second=requests_per_second, lease_size=lease_size,
+                          lease_timeout=lease_timeout, max_retries=max_retries, segment_size=segment_size,
+                          compression=compression)
+    elif pipelined:
+        extract_recipes_info_pipelined(recipes_urls, output_dir, store, n_fetchers=concurrency, n_parsers=n_parsers,
+                                       queue_size=queue_size,
+                                       requests_per_second=_requests_per_second(time_sleep, requests_per_second),
+                                       session=session, refresh=refresh, manifest=manifest, hooks=hooks,
+                                       rate_limiter=rate_limiter, retry_policy=retry_policy)
+    else:
+        extract_recipes_info(recipes_urls, output_dir, time_sleep, store, async_mode=async_mode,
+                             concurrency=concurrency, requests_per_second=requests_per_second, session=session,
+                             refresh=refresh, manifest=manifest, hooks=hooks, rate_limiter=rate_limiter,
+                             retry_policy=retry_policy)
+    if rate_limiter is not None:
+        print(f"Adaptive request rate at the end of the crawl: "
+              f"{', '.join(f'{host} {rate:.2f}/s' for host, rate in rate_limiter.rates.items())}")
+    session.close()
+    manifest.close()
+    if own_hooks:
+        hooks.close()
+        print(hooks.report())
 
     if delete_cached_files:
         delete_file(f"{output_dir}/recipes_urls.json")
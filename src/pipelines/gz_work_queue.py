@@ -0,0 +1,178 @@
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+
+STATE_PENDING = 'pending'
+STATE_LEASED = 'leased'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+
+def default_worker_id():
+    """
+    Returns an identifier of this process, made of the host name and the process id, safe to use
+    in file names.
+    """
+    return re.sub(r'[^A-Za-z0-9-]', '-', f"{socket.gethostname()}-{os.getpid()}")
+
+
+class WorkQueue:
+    """
+    Queue of recipe URLs shared by several crawler processes, stored in SQLite.
+
+    A worker leases a few URLs at a time. A lease expires after lease_timeout seconds unless the
+    worker renews it, which it does every time it leases more URLs, so the URLs of a worker that
+    died are leased again by the others. A URL is done once it is acknowledged, i.e. once its
+    recipe is committed to disk; a URL that failed max_attempts times is set aside as failed.
+    """
+
+    def __init__(self, db_path, lease_timeout=600, max_attempts=3):
+        """
+        :param db_path: Path of the SQLite database file, shared by the workers.
+        :param lease_timeout: Seconds after which the URLs leased by a silent worker are leased again.
+        :param max_attempts: Number of failed attempts after which a URL is not leased anymore.
+        """
+        self.db_path = db_path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Transactions are explicit: leases are read and written inside BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                url TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS queue_state ON queue (state, lease_expires)")
+
+    def _transaction(self, statements):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self.conn)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def enqueue(self, urls, reset=False):
+        """
+        Adds URLs to the queue. URLs already queued keep their state, so every worker can enqueue
+        the same URLs, unless reset is set.
+
+        :param urls: Iterable of URLs.
+        :param reset: Set the URLs already done or failed back to pending, with no failed attempt,
+                      e.g. to revalidate them in a refresh. Leased URLs are left to their worker.
+        :return: Number of URLs actually added, or set back to pending.
+        """
+        urls = list(urls)
+
+        def insert(conn):
+            before = conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+            conn.executemany("INSERT OR IGNORE INTO queue (url, state) VALUES (?, ?)",
+                             ((url, STATE_PENDING) for url in urls))
+            added = conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0] - before
+            if reset:
+                changes = conn.total_changes
+                conn.executemany("""
+                    UPDATE queue SET state = ?, attempts = 0, error = NULL
+                    WHERE url = ? AND state IN (?, ?)
+                """, ((STATE_PENDING, url, STATE_DONE, STATE_FAILED) for url in urls))
+                added += conn.total_changes - changes
+            return added
+
+        return self._transaction(insert)
+
+    def lease(self, worker_id, n=10):
+        """
+        Leases pending URLs, and URLs whose lease expired, to a worker, renewing the leases it
+        already holds.
+
+        :param worker_id: Identifier of the worker.
+        :param n: Maximum number of URLs to lease.
+        :return: List of leased URLs, empty when there is nothing left to lease for now.
+        """
+        def lease(conn):
+            now = time.time()
+            expires = now + self.lease_timeout
+            conn.execute("UPDATE queue SET lease_expires = ? WHERE state = ? AND lease_owner = ?",
+                         (expires, STATE_LEASED, worker_id))
+            rows = conn.execute("""
+                SELECT url FROM queue
+                WHERE state = ? OR (state = ? AND lease_expires < ?)
+                LIMIT ?
+            """, (STATE_PENDING, STATE_LEASED, now, n)).fetchall()
+            urls = [row[0] for row in rows]
+            conn.executemany("UPDATE queue SET state = ?, lease_owner = ?, lease_expires = ? WHERE url = ?",
+                             [(STATE_LEASED, worker_id, expires, url) for url in urls])
+            return urls
+
+        return self._transaction(lease)
+
+    def ack(self, urls):
+        """
+        Marks URLs as done, whoever holds their lease.
+
+        :param urls: Iterable of URLs whose recipes are committed to disk.
+        """
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE queue SET state = ?, lease_owner = NULL, lease_expires = NULL, error = NULL WHERE url = ?",
+            ((STATE_DONE, url) for url in urls)))
+
+    def fail(self, worker_id, url, error):
+        """
+        Records a failed attempt of a URL, releasing its lease. The URL is leased again until it
+        failed max_attempts times. Nothing happens if the lease of the worker expired meanwhile.
+
+        :param worker_id: Identifier of the worker.
+        :param url: The URL that failed.
+        :param error: The error raised while scraping it.
+        """
+        self._transaction(lambda conn: conn.execute("""
+            UPDATE queue SET
+                attempts = attempts + 1,
+                state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END,
+                lease_owner = NULL,
+                lease_expires = NULL,
+                error = ?
+            WHERE url = ? AND state = ? AND lease_owner = ?
+        """, (self.max_attempts, STATE_FAILED, STATE_PENDING, str(error), url, STATE_LEASED, worker_id)))
+
+    def release(self, worker_id):
+        """
+        Gives back the URLs leased by a worker that stops before scraping them.
+
+        :param worker_id: Identifier of the worker.
+        """
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE queue SET state = ?, lease_owner = NULL, lease_expires = NULL WHERE state = ? AND lease_owner = ?",
+            (STATE_PENDING, STATE_LEASED, worker_id)))
+
+    def counts(self):
+        """
+        Returns the number of URLs in every state.
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall()
+        return {state: 0 for state in (STATE_PENDING, STATE_LEASED, STATE_DONE, STATE_FAILED)} | dict(rows)
+
+    def unfinished(self):
+        """
+        Returns the number of URLs pending or leased.
+        """
+        counts = self.counts()
+        return counts[STATE_PENDING] + counts[STATE_LEASED]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,145 @@
+import asyncio
+from elasticsearch import Elasticsearch
+from src.interface.search import SearchBackend
+
+try:
+    # The async Elasticsearch client runs on aiohttp, an optional dependency
+    import aiohttp  # noqa: F401
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+# Elasticsearch field queried by each term clause field, see RECIPE_MAPPING
+FIELD_PATHS = {
+    'category': 'category',
+    'difficulty': 'difficulty',
+    'ingredient': 'ingredients.name',
+}
+
+# Path of the nested objects holding the fields that are not at the root of the recipe
+NESTED_PATHS = {
+    'ingredient': 'ingredients',
+}
+
+
+class ElasticsearchBackend(SearchBackend):
+    """
+    Search backend running the recipe queries on an Elasticsearch index.
+    """
+
+    def __init__(self, es_host="http://localhost:9200", index_name='recipes'):
+        """
+        :param es_host: The hostname or IP address of the Elasticsearch instance.
+        :param index_name: The name of the index, or alias, holding the recipes.
+        """
+        self.es = Elasticsearch([es_host])
+        self.es_host = es_host
+        self.index_name = index_name
+
+    @staticmethod
+    def _term(field, value):
+        term = {"term": {FIELD_PATHS[field]: {"value": value.lower()}}}
+        if field in NESTED_PATHS:
+            return {"nested": {"path": NESTED_PATHS[field], "query": term}}
+        return term
+
+    @staticmethod
+    def _random_order(query, seed):
+        return {
+            "function_score": {
+                "query": query,
+                "random_score": {"seed": seed, "field": "_seq_no"},
+                "boost_mode": "replace"
+            }
+        }
+
+    @classmethod
+    def category_query(cls, category, size, seed=None):
+        """
+        Builds the query returning size recipes of a category, in random order when a seed is given.
+
+        :param category: The recipe category.
+        :param size: Number of recipes to return.
+        :param seed: Seed of the random ordering, None to keep the index order.
+        :return: The body of the search request.
+        """
+        query = cls._term('category', category)
+        if seed is not None:
+            query = cls._random_order(query, seed)
+        return {"query": query, "size": size, "_source": ["recipe"]}
+
+    @staticmethod
+    def _pairs(response):
+        return [(hit['_id'], hit['_source']['recipe']) for hit in response.get('hits', {}).get('hits', [])]
+
+    def search(self, must=None, should=None, must_not=None, size=10, seed=None):
+        query = {"bool": {
+            "filter": [self._term(field, value) for field, value in must or ()],
+            "must_not": [self._term(field, value) for field, value in must_not or ()],
+        }}
+        if should:
+            query["bool"]["should"] = [self._term(field, value) for field, value in should]
+            query["bool"]["minimum_should_match"] = 1
+        if seed is not None:
+            query = self._random_order(query, seed)
+        response = self.es.search(index=self.index_name, body={"query": query, "size": size, "_source": ["recipe"]})
+        return self._pairs(response)
+
+    def _msearch_body(self, slots_per_category, seed):
+        searches = list()
+        for category, n_slots in slots_per_category.items():
+            searches.append({"index": self.index_name})
+            searches.append(self.category_query(category, n_slots, seed))
+        return searches
+
+    def sample_by_category(self, slots_per_category, seed=None):
+        if not slots_per_category:
+            return dict()
+        response = self.es.msearch(searches=self._msearch_body(slots_per_category, seed))
+        return {category: self._pairs(r) for category, r in zip(slots_per_category, response['responses'])}
+
+    async def sample_many_async(self, requests, concurrency=8):
+        if not HAS_AIOHTTP:
+            raise ImportError("Serving meal plans asynchronously needs aiohttp, install it with "
+                              "`pip install aiohttp` or use get_meal_plan instead.")
+        from elasticsearch import AsyncElasticsearch
+
+        es = AsyncElasticsearch([self.es_host])
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def sample(slots_per_category, seed):
+            if not slots_per_category:
+                return dict()
+            async with semaphore:
+                response = await es.msearch(searches=self._msearch_body(slots_per_category, seed))
+            return {category: self._pairs(r) for category, r in zip(slots_per_category, response['responses'])}
+
+        try:
+            return await asyncio.gather(*(sample(slots, seed) for slots, seed in requests))
+        finally:
+            await es.close()
+
+    def category_pool(self, category, max_size, page_size=1000):
+        ids, names = list(), list()
+        search_after = None
+        while len(ids) < max_size:
+            body = self.category_query(category, min(page_size, max_size - len(ids)))
+            body['sort'] = ['_doc']
+            if search_after is not None:
+                body['search_after'] = search_after
+            hits = self.es.search(index=self.index_name, body=body)['hits']['hits']
+            if not hits:
+                break
+            for hit in hits:
+                ids.append(hit['_id'])
+                names.append(hit['_source']['recipe'])
+            search_after = hits[-1]['sort']
+        return tuple(ids), tuple(names)
+
+    def index_version(self):
+        response = self.es.indices.stats(index=self.index_name, metric=['docs', 'indexing'])
+        return tuple(sorted(
+            (name, stats.get('uuid'), stats['primaries']['docs']['count'],
+             stats['primaries']['indexing']['index_total'])
+            for name, stats in response['indices'].items()
+        ))
@@ -1,37 +1,194 @@
-from elasticsearch import Elasticsearch
+import random
+import time
+from collections import Counter, OrderedDict
+from src.interface.search import SearchBackend
 
 
 class MealSearcher:
-    def __init__(self):
-        self.es = Elasticsearch(["http://localhost:9200"])
+    def __init__(self, es_host="http://localhost:9200", index_name='recipes', backend: SearchBackend = None):
+        """
+        :param es_host: The Elasticsearch instance used when no backend is given.
+        :param index_name: The Elasticsearch index used when no backend is given.
+        :param backend: The SearchBackend resolving the recipes, e.g. an in-process InMemoryRecipeIndex.
+        """
+        if backend is None:
+            # Elasticsearch is only imported when it is actually used
+            from src.populator.gz_backends import ElasticsearchBackend
+            backend = ElasticsearchBackend(es_host, index_name)
+        self.backend = backend
 
     def search_recipe(self, category):
         print(category)
-        query_body = {
-            "query": {
-                "term": {
-                    "category": {
-                        "value": category.lower()
-                    }
-                }
-            }
-        }
-        # Assuming the Elasticsearch index is called 'recipes'
-        response = self.es.search(index='recipes', body=query_body)
-        if response['hits']['hits']:
-            # Assuming the recipe name is stored in a field named 'recipe_name'
-            recipe_name = response['hits']['hits'][0]['_source']['recipe']
+        hits = self.backend.search(must=[('category', category)], size=1)
+        if hits:
+            recipe_name = hits[0][1]
             return recipe_name
         else:
             return "Recipe Not Found"
 
-    def get_meal_plan(self, template):
+    @staticmethod
+    def _assign_recipes(template, recipes_per_category, with_ids=False):
+        """
+        Hands out the recipes of every category to its slots, without repeating a recipe within the plan.
+        A recipe is only repeated when its category has fewer recipes than slots.
+
+        :param template: List of slots with 'day', 'moment_of_day' and 'category' keys.
+        :param recipes_per_category: Mapping of category to a list of (recipe_id, recipe_name) pairs.
+        :param with_ids: Add the 'recipe_id' of every slot to the plan.
+        """
+        handed_out = Counter()
         meal_plan = []
         for record in template:
-            recipe_name = self.search_recipe(record['category'])
-            meal_plan.append({
-                'day': record['day'],
-                'moment_of_day': record['moment_of_day'],
-                'recipe_name': recipe_name
-            })
+            category = record['category'].lower()
+            recipes = recipes_per_category.get(category)
+            if recipes:
+                recipe_id, recipe_name = recipes[handed_out[category] % len(recipes)]
+                handed_out[category] += 1
+            else:
+                recipe_id, recipe_name = None, "Recipe Not Found"
+            slot = {'day': record['day'], 'moment_of_day': record['moment_of_day']}
+            if with_ids:
+                slot['recipe_id'] = recipe_id
+            slot['recipe_name'] = recipe_name
+            meal_plan.append(slot)
         return meal_plan
+
+    def get_meal_plan(self, template, seed=None):
+        """
+        Resolves every slot of a meal plan template with a single backend request.
+
+        Slots are grouped by category and each category asks for as many distinct recipes
+        as it has slots, in random order, so the same recipe is not repeated within a plan.
+
+        :param template: List of slots with 'day', 'moment_of_day' and 'category' keys.
+        :param seed: Seed of the random recipe ordering, a random one is drawn when None.
+        :return: List of slots with 'day', 'moment_of_day' and 'recipe_name' keys.
+        """
+        slots_per_category = Counter(record['category'].lower() for record in template)
+        seed = random.randrange(2 ** 31) if seed is None else seed
+        return self._assign_recipes(template, self.backend.sample_by_category(slots_per_category, seed))
+
+    async def get_meal_plans_async(self, templates, seed=None, concurrency=8):
+        """
+        Resolves many meal plans concurrently, one backend request per plan.
+
+        :param templates: List of meal plan templates.
+        :param seed: Base seed of the random recipe ordering, each plan gets its own offset.
+        :param concurrency: Maximum number of backend requests in flight at the same time.
+        :return: List of meal plans, in the order of the templates.
+        """
+        base_seed = random.randrange(2 ** 31) if seed is None else seed
+        requests = [
+            (Counter(record['category'].lower() for record in template), base_seed + i)
+            for i, template in enumerate(templates)
+        ]
+        samples = await self.backend.sample_many_async(requests, concurrency=concurrency)
+        return [self._assign_recipes(template, sample) for template, sample in zip(templates, samples)]
+
+
+class CachedMealSearcher:
+    """
+    Serves meal plans from local per-category pools of recipes.
+
+    The pools hold the IDs and names of up to max_pool_size recipes of a category and are
+    loaded from the search backend on first use. They are reloaded when older than ttl seconds,
+    or earlier when the index changed, which is checked at most every version_check_interval
+    seconds. Between reloads plans are sampled locally, with no network I/O at all.
+    """
+
+    def __init__(self, searcher: MealSearcher = None, ttl=3600, max_pool_size=10000, max_categories=64,
+                 version_check_interval=300, seed=None):
+        """
+        :param searcher: The MealSearcher used to load the pools, a default one is created when None.
+        :param ttl: Seconds after which a pool is reloaded.
+        :param max_pool_size: Maximum number of recipes kept per category.
+        :param max_categories: Maximum number of cached categories, the least recently used one is evicted.
+        :param version_check_interval: Minimum number of seconds between two checks of the index version.
+        :param seed: Seed of the local sampling, for reproducible plans.
+        """
+        self.searcher = searcher or MealSearcher()
+        self.ttl = ttl
+        self.max_pool_size = max_pool_size
+        self.max_categories = max_categories
+        self.version_check_interval = version_check_interval
+        self.random = random.Random(seed)
+
+        self._pools = OrderedDict()
+        self._index_version = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_index_version(self, now):
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        version = self.searcher.backend.index_version()
+        if self._index_version is not None and version != self._index_version:
+            self.invalidate()
+        self._index_version = version
+
+    def _now(self):
+        return time.monotonic()
+
+    def invalidate(self):
+        """
+        Drops every cached pool, they are reloaded on next use.
+        """
+        self._pools.clear()
+        self.invalidations += 1
+
+    def pool(self, category):
+        """
+        Returns the cached (ids, names) pool of a category, loading it when missing or expired.
+
+        :param category: The recipe category.
+        :return: A pair of tuples with the IDs and the names of the recipes.
+        """
+        category = category.lower()
+        now = self._now()
+        self._check_index_version(now)
+        cached = self._pools.get(category)
+        if cached is not None and now - cached[0] < self.ttl:
+            self.hits += 1
+            self._pools.move_to_end(category)
+            return cached[1]
+
+        self.misses += 1
+        pool = self.searcher.backend.category_pool(category, self.max_pool_size)
+        self._pools[category] = (now, pool)
+        self._pools.move_to_end(category)
+        while len(self._pools) > self.max_categories:
+            self._pools.popitem(last=False)
+            self.evictions += 1
+        return pool
+
+    def get_meal_plan(self, template):
+        """
+        Samples a meal plan from the cached pools, without repeating a recipe within the plan
+        unless its category has fewer recipes than slots.
+
+        :param template: List of slots with 'day', 'moment_of_day' and 'category' keys.
+        :return: List of slots with 'day', 'moment_of_day', 'recipe_id' and 'recipe_name' keys.
+        """
+        slots_per_category = Counter(record['category'].lower() for record in template)
+        picks = dict()
+        for category, n_slots in slots_per_category.items():
+            ids, names = self.pool(category)
+            indexes = self.random.sample(range(len(ids)), min(n_slots, len(ids)))
+            picks[category] = [(ids[i], names[i]) for i in indexes]
+        return MealSearcher._assign_recipes(template, picks, with_ids=True)
+
+    def stats(self):
+        """
+        Returns the cache counters and the size of the cached pools.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'pools': {category: len(pool[1][0]) for category, pool in self._pools.items()}
+        }
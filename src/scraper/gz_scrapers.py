@@ -1,8 +1,16 @@
 from src.interface.scraper import Scraper
-import requests
-from bs4 import BeautifulSoup
+from src.scraper.http_session import get_default_session
+from src.transformer.gz_quantity import parse_quantity
+from src.models.recipe import Recipe, Ingredient, Quantity, Time
+from bs4 import BeautifulSoup, SoupStrainer
 import re
 
+# Only the subtrees holding recipe fields are built when parsing a recipe page
+RECIPE_PAGE_STRAINER = SoupStrainer(class_=re.compile(
+    r'(^|\s)(gz-title-recipe|gz-title-content|gz-list-featured-data-other|'
+    r'gz-ingredient|gz-content-recipe-step|gz-name-featured-data)(\s|$)'
+))
+
 
 class GZRecipeScraper(Scraper):
     """
@@ -10,47 +18,113 @@ class GZRecipeScraper(Scraper):
     Inherits from the Scraper base class.
     """
 
+    def __init__(self, session=None, conditional=False, store=None):
+        """
+        :param session: HttpSession used for the requests, defaults to the shared session.
+        :param conditional: Revalidate pages with conditional GETs, unchanged pages are skipped.
+        :param store: RecipeStore the scraped recipes are appended to, None to keep them in memory only.
+        """
+        super().__init__()
+        self.session = session or get_default_session()
+        self.conditional = conditional
+        self.store = store
+
+    def fetch(self, url):
+        """
+        Fetches the specified URL, keeping the response for the instrumentation.
+
+        :param url: URL of the web page to scrape.
+        :return: A (raw_data, response) pair, raw_data being None if the page was not modified.
+        """
+        response = self.session.get(url, conditional=self.conditional, return_not_modified=True)
+        if response.status_code == 304:
+            return None, response
+        return response.text, response
+
     def fetch_data(self, url):
         """
         Fetches the HTML content of the specified URL.
 
         :param url: URL of the web page to scrape.
-        :return: Raw HTML content of the web page as a string.
+        :return: Raw HTML content of the web page as a string, or None if it was not modified.
         """
-        response = requests.get(url)
-        response.raise_for_status()  # Ensure the request was successful.
-        return response.text
+        return self.fetch(url)[0]
 
     def parse_data(self, raw_data):
         """
         Parses the raw HTML content to extract structured recipe data.
 
         :param raw_data: Raw HTML content of a web page.
-        :return: A dictionary containing the structured data of a single recipe.
+        :return: The Recipe, its to_dict() gives the structured data of a single recipe.
         """
-        single_recipe = dict()
-        soup = BeautifulSoup(raw_data, 'lxml')
-        single_recipe['recipe'] = self.name(soup)
-        single_recipe['ingredients'] = self.extract_ingredients(soup)
-        single_recipe['category'] = self.extract_categories(soup)
-        single_recipe['difficulty'] = self.infobox(soup)['difficoltà']
-        single_recipe['dosage_for'] = self.infobox(soup)['dosi per']
-        single_recipe['price'] = self.infobox(soup)['costo']
-        single_recipe['time'] = {
-            'preparation': self.infobox(soup)['preparazione'],
-            'cooking': self.infobox(soup)['cottura']
+        soup = BeautifulSoup(raw_data, 'lxml', parse_only=RECIPE_PAGE_STRAINER)
+        tags = self.collect_recipe_tags(soup)
+        infos = self._infobox_from_tags(tags['infobox'])
+
+        return Recipe(
+            recipe=tags['title'].text.lower(),
+            ingredients=[
+                Ingredient(ingredient['name'], Quantity(**ingredient['quantity']))
+                for ingredient in self._ingredients_from_tags(tags['ingredients'])
+            ],
+            category=self._categories_from_tags(tags['title_content'], tags['other_categories']),
+            difficulty=infos['difficoltà'],
+            dosage_for=infos['dosi per'],
+            price=infos['costo'],
+            time=Time(preparation=infos['preparazione'], cooking=infos['cottura']),
+            steps=self._steps_from_tags(tags['steps']),
+            link=self.url
+        )
+
+    @staticmethod
+    def collect_recipe_tags(recipe_soup):
+        """
+        Collects every tag holding a recipe field in a single traversal of the soup object.
+
+        The tags are selected with the same rules as the find/find_all calls of the single
+        field extractors, first match wins for the tags that are looked up with find.
+
+        :param recipe_soup: BeautifulSoup object representing the parsed HTML of a recipe page.
+        :return: Dictionary of the tags, keyed by the recipe field they hold.
+        """
+        tags = {
+            'title': None,
+            'title_content': None,
+            'other_categories': None,
+            'ingredients': list(),
+            'steps': list(),
+            'infobox': list()
         }
-        single_recipe['steps'] = self.steps(soup)
-        single_recipe['link'] = self.url
-        return single_recipe
+        for tag in recipe_soup.find_all(True):
+            classes = tag.get('class')
+            if not classes:
+                continue
+            if tag.name == 'span':
+                if 'gz-name-featured-data' in classes:
+                    tags['infobox'].append(tag)
+            elif tag.name == 'dd':
+                if 'gz-ingredient' in classes:
+                    tags['ingredients'].append(tag)
+            elif tag.name == 'div':
+                if 'gz-content-recipe-step' in classes:
+                    tags['steps'].append(tag)
+                if tags['other_categories'] is None and 'gz-list-featured-data-other' in classes:
+                    tags['other_categories'] = tag
+                if tags['title_content'] is None and ' '.join(classes) == 'gz-title-content gz-innerdesktop':
+                    tags['title_content'] = tag
+            elif tag.name == 'h1':
+                if tags['title'] is None and ' '.join(classes) == 'gz-title-recipe gz-mBottom2x':
+                    tags['title'] = tag
+        return tags
 
     def store_data(self, data):
         """
-        Placeholder method for storing scraped data. Currently does nothing.
+        Appends the scraped recipe to the store, if the scraper has one.
 
-        :param data: The data to store.
+        :param data: The Recipe to store.
         """
-        pass  # Implement data storage logic here.
+        if self.store is not None:
+            self.store.append(data)
 
     @staticmethod
     def name(recipe_soup):
@@ -71,13 +145,17 @@ class GZRecipeScraper(Scraper):
         :param recipe_soup: BeautifulSoup object representing the parsed HTML of a recipe page.
         :return: Recipe category as a string.
         """
+        return GZRecipeScraper._categories_from_tags(
+            recipe_soup.find("div", {"class": "gz-title-content gz-innerdesktop"}),
+            recipe_soup.find("div", {"class": "gz-list-featured-data-other"}))
+
+    @staticmethod
+    def _categories_from_tags(tag, infos_categories):
         categories = list()
-        tag = recipe_soup.find("div", {"class": "gz-title-content gz-innerdesktop"})
         if tag:
             tag = [cat.lower() for cat in tag.div.ul.li.text.strip().lower().split('\n') if cat != '']
             tag = list(set(tag))
             categories.extend(tag)
-        infos_categories = recipe_soup.find("div", {"class": "gz-list-featured-data-other"})
         if infos_categories:
             infos_categories = [cat.lower() for cat in infos_categories.text.strip().split('\n') if cat != '']
             categories.extend(infos_categories)
@@ -90,34 +168,9 @@ class GZRecipeScraper(Scraper):
         including cases where the number might come after text within parentheses.
 
         :param text: String containing the quantity and possibly a unit or other descriptive text.
-        :return: A dictionary with keys 'quantity', 'unit_measure', and 'strange_measure'.
-        """
-        # List of known cooking units for comparison
-        known_units = [
-            'tsp', 'tbsp', 'fl oz', 'c', 'pt', 'qt', 'gal', 'ml', 'l',
-            'oz', 'lb', 'g', 'kg', 'cl', 'cm', 'm'
-        ]
-
-        # Regular expression to match the number and the following text, including parentheses
-        pattern = re.compile(r'(\d+\.?\d*)\s*(\w+)?|(\(\w+\))(\d+\.?\d*)')
-        matches = pattern.findall(text.lower())
-
-        # Initialize default values
-        quantity = None
-        measure = None
-
-        for match in matches:
-            if match[0]:  # Number before text
-                quantity = match[0]
-                measure = match[1]
-            elif match[3]:  # Number after parentheses
-                quantity = match[3]
-                measure = match[2].strip('()')  # Remove parentheses
-
-        if measure and measure.lower() in known_units:
-            return {'amount': quantity, 'standard_unit': measure, 'descriptor': None}
-        else:
-            return {'amount': quantity, 'standard_unit': None, 'descriptor': measure}
+        :return: A dictionary with keys 'amount', 'standard_unit' and 'descriptor'.
+        """
+        return parse_quantity(text)
 
     @staticmethod
     def steps(recipe_soup):
@@ -127,8 +180,11 @@ class GZRecipeScraper(Scraper):
         :param recipe_soup: BeautifulSoup object representing the parsed HTML of a recipe page.
         :return: Dictionary of cooking steps, indexed by step number.
         """
+        return GZRecipeScraper._steps_from_tags(recipe_soup.find_all("div", {"class": "gz-content-recipe-step"}))
+
+    @staticmethod
+    def _steps_from_tags(all_recipes_tag):
         steps = dict()
-        all_recipes_tag = recipe_soup.find_all("div", {"class": "gz-content-recipe-step"})
         for i, recipe_name in enumerate(all_recipes_tag):
             list_tag_remove = recipe_name.find_all("span", {"class": "num-step"})
             for tag in list_tag_remove:
@@ -151,13 +207,15 @@ class GZRecipeScraper(Scraper):
         :param recipe_soup: BeautifulSoup object representing the parsed HTML of a recipe page.
         :return: Dictionary of ingredients and their respective quantities.
         """
+        return self._ingredients_from_tags(recipe_soup.find_all("dd", {"class": "gz-ingredient"}))
+
+    def _ingredients_from_tags(self, all_recipes_tag):
         ingredients = list()
-        already_parsed_ingredient = list()
-        all_recipes_tag = recipe_soup.find_all("dd", {"class": "gz-ingredient"})
+        already_parsed_ingredient = set()
         for recipe_name in all_recipes_tag:
             name = recipe_name.a.text.strip().replace("\t", "").replace("\n", "").lower()
             if name not in already_parsed_ingredient:
-                already_parsed_ingredient.append(name)
+                already_parsed_ingredient.add(name)
                 ingredient = {
                     "name": name,
                     "quantity": self.extract_quantity_unit_enhanced(
@@ -174,13 +232,10 @@ class GZRecipeScraper(Scraper):
         :param recipe_soup: BeautifulSoup object representing the parsed HTML of a recipe page.
         :return: Dictionary of infobox data.
         """
-        all_infos_clean = list()
-        all_infos = recipe_soup.find_all("span", {"class": "gz-name-featured-data"})
-        for info in all_infos:
-            single_data = [i.strip().lower() for i in info.text.split(':')]
-            if len(single_data) > 1 and single_data not in all_infos_clean:
-                all_infos_clean.append(single_data)
+        return GZRecipeScraper._infobox_from_tags(recipe_soup.find_all("span", {"class": "gz-name-featured-data"}))
 
+    @staticmethod
+    def _infobox_from_tags(all_infos):
         infos_dict = {
             "difficoltà": None,
             "preparazione": None,
@@ -188,17 +243,14 @@ class GZRecipeScraper(Scraper):
             "dosi per": None,
             "costo": None
         }
-        for info in all_infos_clean:
-            if info[0] == 'difficoltà':
-                infos_dict['difficoltà'] = info[1]
-            elif info[0] == 'preparazione':
-                infos_dict['preparazione'] = info[1]
-            elif info[0] == 'cottura':
-                infos_dict['cottura'] = info[1]
-            elif info[0] == 'costo':
-                infos_dict['costo'] = info[1]
-            elif info[0] == 'dosi per':
-                infos_dict['dosi per'] = info[1]
+        # Repeated entries are skipped so that the first occurrence keeps its position
+        already_seen = set()
+        for info in all_infos:
+            single_data = tuple(i.strip().lower() for i in info.text.split(':'))
+            if len(single_data) > 1 and single_data not in already_seen:
+                already_seen.add(single_data)
+                if single_data[0] in infos_dict:
+                    infos_dict[single_data[0]] = single_data[1]
 
         return infos_dict
 
@@ -209,16 +261,35 @@ class GZCategoriesScraper(Scraper):
     Inherits from the Scraper base class.
     """
 
+    def __init__(self, session=None, conditional=False):
+        """
+        :param session: HttpSession used for the requests, defaults to the shared session.
+        :param conditional: Revalidate pages with conditional GETs, unchanged pages are skipped.
+        """
+        super().__init__()
+        self.session = session or get_default_session()
+        self.conditional = conditional
+
+    def fetch(self, url):
+        """
+        Fetches the specified URL, keeping the response for the instrumentation.
+
+        :param url: URL of the category page to scrape.
+        :return: A (raw_data, response) pair, raw_data being None if the page was not modified.
+        """
+        response = self.session.get(url, conditional=self.conditional, return_not_modified=True)
+        if response.status_code == 304:
+            return None, response
+        return response.text, response
+
     def fetch_data(self, url):
         """
         Fetches the HTML content of the specified category URL.
 
         :param url: URL of the category page to scrape.
-        :return: Raw HTML content of the category page as a string.
+        :return: Raw HTML content of the category page as a string, or None if it was not modified.
         """
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
+        return self.fetch(url)[0]
 
     def parse_data(self, raw_data):
         """
@@ -0,0 +1,116 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from src.utilis import save_to_json, load_from_json
+
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class HttpSession:
+    """
+    Shared HTTP layer for the scrapers.
+
+    Keeps a pool of keep-alive connections per host, negotiates compressed responses
+    and remembers the ETag / Last-Modified validators of every URL, so that a later
+    conditional GET can be answered with a cheap 304 Not Modified.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, timeout=30, headers=None, validators_file=None):
+        """
+        :param pool_connections: Number of hosts to keep connection pools for.
+        :param pool_maxsize: Maximum number of keep-alive connections per host.
+        :param timeout: Timeout in seconds of a single request.
+        :param headers: Extra headers sent with every request.
+        :param validators_file: JSON file where the validators are persisted, None to keep them in memory only.
+        """
+        self.timeout = timeout
+        self.validators_file = validators_file
+        self.validators = dict(load_from_json(validators_file)) if validators_file else dict()
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        if headers:
+            self.session.headers.update(headers)
+
+    def get(self, url, conditional=False, return_not_modified=False):
+        """
+        Sends a GET request through the pooled session.
+
+        :param url: The URL to request.
+        :param conditional: Send the stored validators of the URL and accept a 304 answer.
+        :param return_not_modified: Return the 304 Not Modified responses instead of None.
+        :return: The response, or None when the server answered 304 Not Modified.
+        """
+        headers = dict()
+        if conditional:
+            validator = self.validators.get(url, dict())
+            if validator.get('etag'):
+                headers['If-None-Match'] = validator['etag']
+            if validator.get('last_modified'):
+                headers['If-Modified-Since'] = validator['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return response if return_not_modified else None
+        response.raise_for_status()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            with self._lock:
+                self.validators[url] = {'etag': etag, 'last_modified': last_modified}
+        return response
+
+    def load_validators(self, filename, replace=True):
+        """
+        Adds the validators persisted in another file, e.g. by another crawler process.
+
+        :param filename: JSON file written by save_validators.
+        :param replace: Let the validators of the file replace the known ones of the same URLs.
+        """
+        validators = dict(load_from_json(filename))
+        with self._lock:
+            if replace:
+                self.validators.update(validators)
+            else:
+                self.validators = {**validators, **self.validators}
+
+    def save_validators(self):
+        """
+        Persists the validators to the validators file, if one was configured.
+        """
+        if self.validators_file:
+            with self._lock:
+                save_to_json(self.validators, self.validators_file)
+
+    def close(self):
+        """
+        Persists the validators and closes the pooled connections.
+        """
+        self.save_validators()
+        self.session.close()
+
+
+_default_session = None
+
+
+def get_default_session():
+    """
+    Returns the process-wide session shared by scrapers created without an explicit one.
+    """
+    global _default_session
+    if _default_session is None:
+        _default_session = HttpSession()
+    return _default_session
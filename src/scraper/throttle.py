@@ -0,0 +1,308 @@
+import asyncio
+import heapq
+import itertools
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from src.interface.instrumentation import ScrapeHooks, response_status
+
+
+class HostRateLimiter:
+    """
+    Per-host requests-per-second budget shared by concurrent fetchers.
+
+    Every host gets its own schedule of evenly spaced request slots, so requests to
+    the same host never go out faster than the configured rate while requests to
+    different hosts do not wait for each other.
+    """
+
+    def __init__(self, requests_per_second=None):
+        """
+        :param requests_per_second: Maximum number of requests per second sent to a single host.
+                                    None or 0 disables the limit.
+        """
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self._next_slot = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def _now(self):
+        return time.monotonic()
+
+    def _interval(self, host):
+        return self.interval
+
+    def _reserve(self, url, now):
+        host = urlparse(url).netloc
+        with self._lock:
+            slot = max(now, self._next_slot[host])
+            self._next_slot[host] = slot + self._interval(host)
+        return slot
+
+    async def acquire(self, url):
+        """
+        Waits until a request to the host of the given URL fits in the budget.
+
+        :param url: The URL that is about to be requested.
+        """
+        if not self.interval:
+            return
+        now = self._now()
+        slot = self._reserve(url, now)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def wait(self, url):
+        """
+        Blocking counterpart of acquire, safe to share between fetcher threads.
+
+        :param url: The URL that is about to be requested.
+        """
+        if not self.interval:
+            return
+        now = self._now()
+        slot = self._reserve(url, now)
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SharedRateLimiter(HostRateLimiter):
+    """
+    Per-host requests-per-second budget shared by several crawler processes.
+
+    The next free request slot of every host is reserved in a SQLite database, so N processes
+    of the same machine together never exceed the budget a single one would have.
+    """
+
+    def __init__(self, db_path, requests_per_second=None):
+        """
+        :param db_path: Path of the SQLite database file, shared by the processes.
+        :param requests_per_second: Maximum number of requests per second sent to a single host by
+                                    all the processes together. None or 0 disables the limit.
+        """
+        super().__init__(requests_per_second)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS slots (host TEXT PRIMARY KEY, next_slot REAL NOT NULL)")
+
+    def _now(self):
+        # Slots are compared between processes, so they use the wall clock
+        return time.time()
+
+    def _reserve(self, url, now):
+        host = urlparse(url).netloc
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT next_slot FROM slots WHERE host = ?", (host,)).fetchone()
+                slot = max(now, row[0] if row else 0.0)
+                self.conn.execute("INSERT OR REPLACE INTO slots (host, next_slot) VALUES (?, ?)",
+                                  (host, slot + self._interval(host)))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return slot
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def retry_after_seconds(error):
+    """
+    Returns the delay asked by the Retry-After header of a failed response.
+
+    :param error: The exception raised by a fetch.
+    :return: The delay in seconds, None when the response has no valid Retry-After header.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or dict()
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_overload(status):
+    """
+    Tells whether an HTTP status means that the server is overloaded or throttling us.
+    """
+    return status is not None and (status == 429 or status >= 500)
+
+
+class AdaptiveRateLimiter(HostRateLimiter, ScrapeHooks):
+    """
+    Per-host rate limiter adapting the rate to the health of every host (AIMD).
+
+    It is fed with the outcome of every fetch as ScrapeHooks. Healthy responses raise the
+    rate of their host additively, by additive_increase requests per second for every second
+    of requests at the current rate. A 429, a 5xx, or a recent latency (fast moving average)
+    above latency_factor times the usual latency (slow moving average) of the host cut the rate
+    by multiplicative_decrease, at most once per cooldown; a Retry-After header also holds back
+    every request to the host for the asked delay.
+    """
+
+    def __init__(self, initial_rate=0.5, min_rate=0.05, max_rate=10.0, additive_increase=0.1,
+                 multiplicative_decrease=0.5, latency_factor=2.0, recent_smoothing=0.3, usual_smoothing=0.02,
+                 cooldown=5.0):
+        """
+        :param initial_rate: Requests per second of a host before any feedback.
+        :param min_rate: Lowest requests per second of a host.
+        :param max_rate: Highest requests per second of a host.
+        :param additive_increase: Rate increase, in requests per second, per second of healthy requests.
+        :param multiplicative_decrease: Factor applied to the rate of an overloaded host.
+        :param latency_factor: Latency, relative to the usual latency of the host, considered overload.
+        :param recent_smoothing: Weight of a new sample in the moving average of the recent latency.
+        :param usual_smoothing: Weight of a new sample in the moving average of the usual latency.
+        :param cooldown: Minimum number of seconds between two decreases of the rate of a host.
+        """
+        super().__init__(initial_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.latency_factor = latency_factor
+        self.recent_smoothing = recent_smoothing
+        self.usual_smoothing = usual_smoothing
+        self.cooldown = cooldown
+        self.rates = defaultdict(lambda: initial_rate)
+        self._latency = dict()
+        self._decreased_at = defaultdict(lambda: float('-inf'))
+
+    def _interval(self, host):
+        return 1 / self.rates[host]
+
+    def rate(self, url):
+        """
+        Returns the current requests per second of the host of a URL.
+        """
+        with self._lock:
+            return self.rates[urlparse(url).netloc]
+
+    def _decrease(self, host, now):
+        if now - self._decreased_at[host] >= self.cooldown:
+            self._decreased_at[host] = now
+            self.rates[host] = max(self.min_rate, self.rates[host] * self.multiplicative_decrease)
+
+    def on_fetch(self, url, seconds, size=None, status=None, error=None):
+        host = urlparse(url).netloc
+        now = self._now()
+        delay = retry_after_seconds(error) if error is not None else None
+        with self._lock:
+            if delay:
+                self._next_slot[host] = max(self._next_slot[host], now + delay)
+            if is_overload(status) or delay:
+                self._decrease(host, now)
+                return
+            if error is not None:
+                return
+
+            recent, usual = self._latency.get(host, (seconds, seconds))
+            recent += self.recent_smoothing * (seconds - recent)
+            usual += self.usual_smoothing * (seconds - usual)
+            self._latency[host] = (recent, usual)
+            if recent > self.latency_factor * usual:
+                self._decrease(host, now)
+            else:
+                rate = self.rates[host]
+                self.rates[host] = min(self.max_rate, rate + self.additive_increase / rate)
+
+
+class RetryPolicy:
+    """
+    Decides which failed fetches are retried, and when.
+
+    Throttling, server and connection errors are retried up to max_attempts times, after an
+    exponential backoff with full jitter, or after the Retry-After delay when the server asks
+    for a longer one.
+    """
+
+    def __init__(self, max_attempts=3, initial_backoff=2.0, max_backoff=120.0):
+        """
+        :param max_attempts: Maximum number of retries of a URL.
+        :param initial_backoff: Upper bound in seconds of the first backoff, doubled at every retry.
+        :param max_backoff: Upper bound in seconds of any backoff.
+        """
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, error, attempt):
+        """
+        :param error: The exception raised by the fetch.
+        :param attempt: Number of retries of the URL so far.
+        :return: True when the URL should be fetched again.
+        """
+        if attempt >= self.max_attempts:
+            return False
+        status = response_status(None, error)
+        if status is not None:
+            return is_overload(status)
+        # Connection errors and timeouts, requests' included, are OSError subclasses
+        return isinstance(error, OSError)
+
+    def delay(self, attempt, error=None):
+        """
+        :param attempt: Number of retries of the URL so far.
+        :param error: The exception raised by the fetch, for its Retry-After header.
+        :return: Seconds to wait before the next attempt.
+        """
+        backoff = random.uniform(0, min(self.max_backoff, self.initial_backoff * 2 ** attempt))
+        retry_after = retry_after_seconds(error) if error is not None else None
+        return max(backoff, retry_after or 0.0)
+
+
+class RetryQueue:
+    """
+    Thread safe queue of items that become available after a delay.
+    """
+
+    def __init__(self):
+        self._heap = list()
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _now(self):
+        return time.monotonic()
+
+    def push(self, item, delay):
+        """
+        :param item: The item to retry.
+        :param delay: Seconds before the item is available.
+        """
+        with self._condition:
+            heapq.heappush(self._heap, (self._now() + delay, next(self._counter), item))
+            self._condition.notify()
+
+    def pop(self, block=True):
+        """
+        Returns the item available for the longest time.
+
+        :param block: Wait for the earliest item when none is available yet.
+        :return: The item, None when no item is available (without blocking) or the queue is empty.
+        """
+        with self._condition:
+            while self._heap:
+                ready_at = self._heap[0][0]
+                now = self._now()
+                if ready_at <= now:
+                    return heapq.heappop(self._heap)[2]
+                if not block:
+                    return None
+                self._condition.wait(ready_at - now)
+            return None
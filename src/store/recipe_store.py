@@ -0,0 +1,228 @@
+import glob
+import os
+import re
+from src.models.recipe import Recipe, canonical_link, dumps, loads
+from src.utilis import check_and_create_dir, open_segment_writer, iter_jsonl, fsync_and_replace
+
+SEGMENT_SUFFIXES = {
+    None: '.jsonl',
+    'gzip': '.jsonl.gz',
+    'zstd': '.jsonl.zst',
+}
+
+
+# Sequence number of a segment or of a legacy JSON chunk, e.g. recipes_w1_000012.jsonl.gz or all_recipes_12.json
+SEQUENCE_PATTERN = re.compile(r"_(\d+)\.json")
+
+
+def sequence_number(filename):
+    """
+    Returns the sequence number of a segment or JSON chunk file name, -1 when it has none.
+    """
+    match = SEQUENCE_PATTERN.search(os.path.basename(filename))
+    return int(match.group(1)) if match else -1
+
+
+def by_sequence(filenames):
+    """
+    Sorts files oldest first, by the sequence number of their names then by name.
+
+    Unlike modification times, names survive copies that do not preserve them.
+    """
+    return sorted(filenames, key=lambda filename: (sequence_number(filename), os.path.basename(filename)))
+
+
+def list_segments(directory, prefix='recipes'):
+    """
+    Returns the committed segments of a store directory, oldest first.
+
+    A store numbers its segments after the highest sequence number of its directory, so the
+    segments of a run, e.g. a refresh, sort after those of the previous runs whatever the worker
+    of a queue crawl that wrote them.
+
+    :param directory: Directory holding the segments.
+    :param prefix: Prefix of the segment file names.
+    """
+    segments = list()
+    for suffix in SEGMENT_SUFFIXES.values():
+        segments.extend(glob.glob(os.path.join(directory, f"{prefix}_*{suffix}")))
+    return by_sequence(segments)
+
+
+def _link_key(record):
+    return canonical_link(record['link']) if 'link' in record else None
+
+
+def latest_versions(sources):
+    """
+    Locates the last version of every recipe of a sequence of record sources.
+
+    :param sources: Sequence of callables returning an iterator of recipe dictionaries, oldest first.
+    :return: Dictionary of canonical link to the (source number, record number) of its last version.
+    """
+    latest = dict()
+    for number, source in enumerate(sources):
+        for position, record in enumerate(source()):
+            key = _link_key(record)
+            if key is not None:
+                latest[key] = (number, position)
+    return latest
+
+
+def iter_latest(sources, latest=None):
+    """
+    Streams the records of a sequence of sources, skipping the versions of a recipe superseded by
+    a later one, e.g. by a refresh of its page. Records without a link are all kept.
+
+    The sources are read twice: once to locate the last version of every link, then to stream them.
+
+    :param sources: Sequence of callables returning an iterator of recipe dictionaries, oldest first.
+    :param latest: The result of latest_versions on the sources, computed when None.
+    :return: A generator of (source number, record) pairs.
+    """
+    if latest is None:
+        latest = latest_versions(sources)
+    for number, source in enumerate(sources):
+        for position, record in enumerate(source()):
+            key = _link_key(record)
+            if key is None or latest[key] == (number, position):
+                yield number, record
+
+
+def segment_reader(segment):
+    """
+    Returns a source of iter_latest streaming the records of a segment.
+    """
+    return lambda: iter_jsonl(segment, loads=loads)
+
+
+def _dumps(record):
+    return dumps(record) + b'\n'
+
+
+class RecipeStore:
+    """
+    Append-only recipe store made of compressed JSONL segments.
+
+    Records are streamed one per line into an open temporary segment and flushed as they
+    arrive. Once a segment holds segment_size records it is committed: closed, fsynced and
+    renamed to its final name, so readers only ever see complete segments. Temporary
+    segments left by a crash are recovered, up to their last complete record, when the
+    store is opened again.
+    """
+
+    def __init__(self, directory, segment_size=100, compression='gzip', prefix='recipes', flush_every=1,
+                 on_commit=None):
+        """
+        :param directory: Directory holding the segments.
+        :param segment_size: Number of records after which a segment is committed.
+        :param compression: 'gzip', 'zstd' or None for uncompressed segments.
+        :param prefix: Prefix of the segment file names.
+        :param flush_every: Number of records after which the open segment is flushed.
+        :param on_commit: Callback invoked as on_commit(segment_name, records) after every commit.
+        """
+        if compression not in SEGMENT_SUFFIXES:
+            raise ValueError(f"Unknown compression '{compression}', use one of {list(SEGMENT_SUFFIXES)}")
+        check_and_create_dir(directory)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compression = compression
+        self.prefix = prefix
+        self.flush_every = flush_every
+        self.on_commit = on_commit
+
+        self._own_segment = re.compile(rf"\.?{re.escape(prefix)}_\d+\.jsonl(\.gz|\.zst)?(\.tmp)?")
+        self._writer = None
+        self._tmp_filename = None
+        self._records = list()
+        # Never reuse the number of a segment, even when an older one was deleted
+        self._next_index = max(map(sequence_number, list_segments(directory, '*')), default=0) + 1
+        self._recover()
+
+    def segments(self):
+        """
+        Returns the committed segments of the store, oldest first.
+
+        Segments of other stores sharing the directory, whose prefix starts with this one
+        (e.g. the recipes_w1 segments of a crawler worker next to the recipes segments), are not included.
+        """
+        return [segment for segment in list_segments(self.directory, self.prefix)
+                if self._own_segment.fullmatch(os.path.basename(segment))]
+
+    def append(self, record):
+        """
+        Streams a record into the open segment, committing it when it is full.
+
+        :param record: The Recipe or recipe dictionary to store.
+        :return: The name of the committed segment, or None if the segment is still open.
+        """
+        if self._writer is None:
+            self._open_segment()
+        self._writer.write(_dumps(record))
+        self._records.append(record)
+        if len(self._records) % self.flush_every == 0:
+            self._writer.flush()
+        if len(self._records) >= self.segment_size:
+            return self.commit()
+        return None
+
+    def commit(self):
+        """
+        Atomically commits the open segment.
+
+        :return: The name of the committed segment, or None if there was nothing to commit.
+        """
+        if self._writer is None:
+            return None
+        self._writer.close()
+        segment_name = self._segment_name(self._next_index)
+        fsync_and_replace(self._tmp_filename, os.path.join(self.directory, segment_name))
+        records = self._records
+        self._writer, self._tmp_filename, self._records = None, None, list()
+        self._next_index += 1
+        if self.on_commit is not None:
+            self.on_commit(segment_name, records)
+        return segment_name
+
+    def close(self):
+        """
+        Commits the last, partially filled, segment.
+        """
+        self.commit()
+
+    def iter_records(self):
+        """
+        Streams the last version of every record of the committed segments, in memory proportional
+        to the number of distinct links only.
+
+        :return: A generator of recipe dictionaries.
+        """
+        for _, record in iter_latest([segment_reader(segment) for segment in self.segments()]):
+            yield record
+
+    def iter_recipes(self):
+        """
+        Streams every record of the committed segments as Recipe objects.
+
+        :return: A generator of Recipe.
+        """
+        for record in self.iter_records():
+            yield Recipe.from_dict(record)
+
+    def _segment_name(self, index):
+        return f"{self.prefix}_{index:06d}{SEGMENT_SUFFIXES[self.compression]}"
+
+    def _open_segment(self):
+        self._tmp_filename = os.path.join(self.directory, f".{self._segment_name(self._next_index)}.tmp")
+        self._writer = open_segment_writer(self._tmp_filename, self.compression)
+
+    def _recover(self):
+        records = list()
+        for tmp_filename in sorted(glob.glob(os.path.join(self.directory, f".{self.prefix}_*.tmp"))):
+            if not self._own_segment.fullmatch(os.path.basename(tmp_filename)):
+                continue
+            records.extend(iter_jsonl(tmp_filename, loads=loads, strict=False))
+            os.remove(tmp_filename)
+        for record in records:
+            self.append(record)
+        self.commit()
@@ -1,4 +1,9 @@
 import random
+import numpy as np
+
+# Codes of the categories in the plan matrices built by generate_plans
+VEGETARIAN, VEGAN, MEAT, FISH, FREE = range(5)
+CATEGORY_LABELS = ('vegetariano', 'vegano', 'carne', 'pesce', 'Free')
 
 
 class MealPlanner:
@@ -12,6 +17,7 @@ class MealPlanner:
 
     def generate_plan(self):
         plan = []
+        taken = set()
         meat_assigned = []
         fish_assigned = []
 
@@ -19,12 +25,14 @@ class MealPlanner:
         if self.free_day and self.free_day in self.days_of_week:
             for meal_time in self.meal_times:
                 plan.append({'day': self.free_day, 'moment_of_day': meal_time, 'category': 'Free'})
+                taken.add((self.free_day, meal_time))
 
         # Assign meat and fish meals
         for _ in range(self.meat_meals + self.fish_meals):
             category = 'carne' if len(meat_assigned) < self.meat_meals else 'pesce'
-            day, meal_time = self._get_random_day_time(meat_assigned if category == 'carne' else fish_assigned)
+            day, meal_time = self._get_random_day_time(meat_assigned if category == 'carne' else fish_assigned, taken)
             plan.append({'day': day, 'moment_of_day': meal_time, 'category': category})
+            taken.add((day, meal_time))
             if category == 'carne':
                 meat_assigned.append(day)
             else:
@@ -33,15 +41,82 @@ class MealPlanner:
         # Fill remaining meals with vegetarian or vegan
         for day in self.days_of_week:
             for meal_time in self.meal_times:
-                if not any(meal['day'] == day and meal['moment_of_day'] == meal_time for meal in plan):
+                if (day, meal_time) not in taken:
                     category = random.choice(['vegetariano', 'vegano'])
                     plan.append({'day': day, 'moment_of_day': meal_time, 'category': category})
 
         return plan
 
-    def _get_random_day_time(self, assigned_days):
-        available_days = set(self.days_of_week) - set(assigned_days) - {self.free_day}
-        day = random.choice(list(available_days))
-        meal_time = random.choice(self.meal_times)
-        return day, meal_time
+    def _get_random_day_time(self, assigned_days, taken=()):
+        """
+        Picks a random free slot on a day not yet assigned to the same category.
+
+        :param assigned_days: Days already holding a meal of the category.
+        :param taken: Set of the (day, meal_time) slots already in the plan.
+        :return: A (day, meal_time) pair.
+        """
+        available_slots = [
+            (day, meal_time)
+            for day in self.days_of_week if day not in assigned_days and day != self.free_day
+            for meal_time in self.meal_times if (day, meal_time) not in taken
+        ]
+        if not available_slots:
+            raise ValueError(f"Cannot fit {self.meat_meals} meat and {self.fish_meals} fish meals "
+                             f"in a week with free day {self.free_day}")
+        return random.choice(available_slots)
+
+    def generate_plans(self, n_users, weeks=1, seed=None):
+        """
+        Generates the plans of many users at once, as a matrix of category codes.
+
+        Every week of every plan holds meat_meals meat meals on distinct days, fish_meals fish
+        meals on distinct days, never in the same slot as a meat meal, both free meals of the
+        free day, and vegetarian or vegan meals in the remaining slots.
+
+        :param n_users: Number of plans to generate.
+        :param weeks: Number of weeks of every plan.
+        :param seed: Seed of the random generator, for reproducible plans.
+        :return: An int8 array of shape (n_users, weeks * 7, len(meal_times)) of codes indexing CATEGORY_LABELS.
+        """
+        n_times = len(self.meal_times)
+        days = [i for i, day in enumerate(self.days_of_week) if day != self.free_day]
+        if max(self.meat_meals, self.fish_meals) > len(days):
+            raise ValueError(f"Cannot fit {self.meat_meals} meat and {self.fish_meals} fish meals "
+                             f"in a week with free day {self.free_day}")
+
+        rng = np.random.default_rng(seed)
+        n_weeks = n_users * weeks
+        rows = np.arange(n_weeks)[:, None]
+        shuffled_days = np.tile(np.asarray(days, dtype=np.int8), (n_weeks, 1))
+        plans = rng.integers(VEGETARIAN, VEGAN + 1, size=(n_weeks, len(self.days_of_week), n_times), dtype=np.int8)
+
+        if self.meat_meals:
+            meat_days = rng.permuted(shuffled_days, axis=1)[:, :self.meat_meals]
+            meat_times = rng.integers(0, n_times, size=meat_days.shape)
+            plans[rows, meat_days, meat_times] = MEAT
+        if self.fish_meals:
+            fish_days = rng.permuted(shuffled_days, axis=1)[:, :self.fish_meals]
+            fish_times = rng.integers(0, n_times, size=fish_days.shape)
+            # A day holds at most one meat meal, so moving to the next meal time always frees the slot
+            collisions = plans[rows, fish_days, fish_times] == MEAT
+            fish_times = np.where(collisions, (fish_times + 1) % n_times, fish_times)
+            plans[rows, fish_days, fish_times] = FISH
+        if self.free_day in self.days_of_week:
+            plans[:, self.days_of_week.index(self.free_day), :] = FREE
+
+        return plans.reshape(n_users, weeks * len(self.days_of_week), n_times)
+
+    def to_template(self, plan):
+        """
+        Converts a plan of the matrix returned by generate_plans to the list format of generate_plan.
 
+        :param plan: An array of shape (weeks * 7, len(meal_times)) of category codes.
+        :return: List of slots with 'week', 'day', 'moment_of_day' and 'category' keys.
+        """
+        n_days = len(self.days_of_week)
+        return [
+            {'week': day // n_days, 'day': self.days_of_week[day % n_days], 'moment_of_day': self.meal_times[time],
+             'category': CATEGORY_LABELS[code]}
+            for day, codes in enumerate(plan.tolist())
+            for time, code in enumerate(codes)
+        ]
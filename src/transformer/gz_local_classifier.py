@@ -0,0 +1,227 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from src.interface.classifier import IngredientClassifier
+from src.transformer.gz_transformer import CATEGORIES
+
+# Articles and prepositions carrying no information on the category
+STOPWORDS = frozenset([
+    'a', 'al', 'alla', 'alle', 'allo', 'ai', 'agli', 'con', 'd', 'da', 'dal', 'dalla', 'de', 'dei', 'del',
+    'della', 'delle', 'dello', 'degli', 'di', 'e', 'ed', 'gli', 'i', 'il', 'in', 'l', 'la', 'le', 'lo',
+    'o', 'per', 'su', 'un', 'una', 'uno'
+])
+
+TOKEN_PATTERN = re.compile(r'[a-z]+')
+
+# Curated keywords of every category, single words or phrases
+SEEDS = {
+    'Altri ingredienti': [
+        'amido', 'biscotti', 'brodo', 'cacao', 'cioccolato', 'colla di pesce', 'farina', 'fecola', 'gelatina',
+        'lievito', 'pan di spagna', 'pane', 'pangrattato', 'pasta', 'pasta sfoglia', 'pasta brisee', 'polenta',
+        'riso', 'semola', 'spaghetti', 'penne', 'fusilli', 'rigatoni', 'tagliatelle', 'lasagne', 'gnocchi',
+        'orzo', 'farro', 'cous cous', 'legumi', 'ceci', 'lenticchie', 'fagioli', 'savoiardi', 'tofu',
+        'bicarbonato', 'cremor tartaro', 'latte', 'panna', 'yogurt', 'colorante', 'granella',
+    ],
+    'Bevande': [
+        'acqua', 'birra', 'brandy', 'caffe', 'cognac', 'gin', 'grappa', 'liquore', 'marsala', 'prosecco',
+        'rum', 'spumante', 'succo', 'te', 'tequila', 'vermouth', 'vino', 'vodka', 'whisky', 'limoncello',
+        'maraschino', 'amaretto', 'cointreau', 'champagne',
+    ],
+    'Burri, salse e olii': [
+        'aceto', 'besciamella', 'burro', 'ketchup', 'maionese', 'margarina', 'olio', 'pesto', 'salsa',
+        'salsa di soia', 'senape', 'strutto', 'tahina', 'glassa',
+    ],
+    'Carni': [
+        'agnello', 'anatra', 'bresaola', 'capocollo', 'carne', 'coniglio', 'cotechino', 'fesa', 'filetto',
+        'guanciale', 'lardo', 'maiale', 'manzo', 'macinato', 'mortadella', 'nduja', 'pancetta', 'petto di pollo',
+        'pollo', 'prosciutto', 'salame', 'salsiccia', 'speck', 'tacchino', 'vitello', 'wurstel', 'cinghiale',
+        'faraona', 'quaglia', 'lonza', 'costine', 'cosce di pollo', 'sovracoscia', 'trippa', 'fegato', 'ossobuco',
+        'coppa', 'cappone', 'arrosto', 'hamburger', 'spezzatino', 'fettine', 'polpa di manzo',
+    ],
+    'Dolcificanti': [
+        'dolcificante', 'fruttosio', 'glucosio', 'melassa', 'miele', 'sciroppo', 'stevia', 'zucchero',
+        'zucchero a velo', 'zucchero di canna', 'destrosio', 'malto',
+    ],
+    'Erbe, spezie, aromi': [
+        'alloro', 'anice', 'basilico', 'cannella', 'cardamomo', 'chiodi di garofano', 'coriandolo', 'cumino',
+        'curcuma', 'curry', 'aneto', 'erba cipollina', 'dragoncello', 'finocchietto', 'maggiorana', 'menta',
+        'noce moscata', 'origano', 'paprika', 'pepe', 'peperoncino', 'prezzemolo', 'rosmarino', 'sale',
+        'salvia', 'timo', 'vaniglia', 'vanillina', 'zafferano', 'zenzero', 'ginepro', 'semi di finocchio',
+        'scorza', 'aroma', 'erbe aromatiche', 'mentuccia', 'santoreggia', 'sesamo', 'semi',
+    ],
+    'Formaggi': [
+        'asiago', 'burrata', 'caciocavallo', 'caprino', 'emmental', 'feta', 'fontina', 'formaggio',
+        'gorgonzola', 'grana', 'grana padano', 'gruyere', 'mascarpone', 'mozzarella', 'parmigiano',
+        'parmigiano reggiano', 'pecorino', 'philadelphia', 'provola', 'provolone', 'ricotta', 'robiola',
+        'scamorza', 'stracchino', 'stracciatella', 'taleggio', 'fiordilatte', 'squacquerone', 'quartirolo',
+        'brie', 'cheddar', 'montasio', 'formaggio spalmabile', 'primo sale',
+    ],
+    'Frutta': [
+        'albicocca', 'ananas', 'anguria', 'arancia', 'avocado', 'banana', 'castagna', 'ciliegia', 'cocco',
+        'datteri', 'fichi', 'fragola', 'frutti di bosco', 'kiwi', 'lampone', 'limone', 'lime', 'mandarino',
+        'mandorla', 'mango', 'mela', 'melone', 'mirtillo', 'more', 'nocciola', 'noce', 'pera',
+        'pinoli', 'pistacchio', 'pompelmo', 'prugna', 'uvetta', 'uva', 'melograno', 'cedro', 'arachidi',
+        'anacardi', 'frutta', 'amarene', 'ribes', 'cachi', 'clementine', 'papaya', 'frutto della passione',
+    ],
+    'Pesci': [
+        'acciuga', 'alici', 'aragosta', 'baccala', 'branzino', 'calamari', 'canocchie', 'capesante',
+        'cozze', 'gamberi', 'gamberetti', 'granchio', 'merluzzo', 'orata', 'ostriche', 'pesce', 'pesce spada',
+        'polpo', 'salmone', 'sarde', 'scampi', 'seppie', 'sgombro', 'sogliola', 'spigola', 'stoccafisso',
+        'tonno', 'totani', 'trota', 'vongole', 'mazzancolle', 'moscardini', 'bottarga', 'rana pescatrice',
+        'cernia', 'dentice', 'nasello', 'platessa', 'frutti di mare', 'surimi', 'astice', 'ricciola',
+    ],
+    'Uova': [
+        'albume', 'tuorlo', 'uovo', 'uova', 'uova di quaglia',
+    ],
+    'Verdure': [
+        'aglio', 'asparagi', 'barbabietola', 'bietole', 'broccoli', 'carciofi', 'cardi',
+        'carota', 'cavolfiore', 'cavolo', 'cavolo nero', 'cetriolo', 'cicoria', 'cime di rapa', 'cipolla',
+        'cipollotto', 'finocchio', 'friarielli', 'funghi', 'funghi porcini', 'indivia', 'insalata', 'lattuga',
+        'melanzana', 'olive', 'patata', 'peperone', 'piselli', 'pomodoro', 'pomodorini', 'porro', 'radicchio',
+        'rapa', 'rucola', 'scalogno', 'sedano', 'spinaci', 'valeriana', 'verza', 'zucca', 'zucchina',
+        'fagiolini', 'passata di pomodoro', 'concentrato di pomodoro', 'capperi', 'germogli', 'songino',
+        'topinambur', 'mais', 'edamame', 'tartufo', 'champignon', 'porcini', 'scarola', 'catalogna',
+    ],
+}
+
+
+def _stem(token):
+    # Italian nouns and adjectives inflect on the last vowel (pomodoro/pomodori, mela/mele)
+    if len(token) > 3 and token[-1] in 'aeiou':
+        return token[:-1]
+    return token
+
+
+@lru_cache(maxsize=65536)
+def normalize_tokens(name):
+    """
+    Turns an ingredient name into the tuple of its normalized tokens, without accents,
+    stopwords, digits and inflection.
+
+    :param name: The ingredient name, e.g. "Olio extra vergine d'oliva".
+    :return: The tuple of the normalized tokens, e.g. ('olio', 'extr', 'vergin', 'oliv').
+    """
+    text = unicodedata.normalize('NFKD', name.lower()).encode('ascii', 'ignore').decode('ascii')
+    return tuple(_stem(token) for token in TOKEN_PATTERN.findall(text) if token not in STOPWORDS)
+
+
+class LocalClassifier(IngredientClassifier):
+    """
+    Deterministic ingredient classifier, answering from a dictionary of known names and a
+    trie of keyword phrases.
+
+    A name is classified by its exact normalized form when it was classified before, otherwise
+    by the leftmost keyword phrase it contains (the longest one when several start at the same
+    token), since the head noun of Italian ingredient names comes first. Keywords come from the
+    curated SEEDS and from the head tokens of the already classified names; names with no
+    confident keyword are left unclassified, for a remote classifier to answer.
+    """
+
+    def __init__(self, seeds=None, min_support=2, min_purity=0.9):
+        """
+        :param seeds: Mapping of category to its keyword phrases, SEEDS when None.
+        :param min_support: Minimum number of classified names a learned keyword has to head.
+        :param min_purity: Minimum share of those names that has to fall in the keyword category.
+        """
+        self.min_support = min_support
+        self.min_purity = min_purity
+        self.exact = dict()
+        self.trie = dict()
+        self.n_seeds = 0
+        for category, phrases in (SEEDS if seeds is None else seeds).items():
+            if category not in CATEGORIES:
+                raise ValueError(f"Unknown category '{category}', use one of {CATEGORIES}")
+            for phrase in phrases:
+                self._insert(normalize_tokens(phrase), category)
+                self.n_seeds += 1
+        self.hits = 0
+        self.misses = 0
+
+    def _insert(self, tokens, category, overwrite=True):
+        if not tokens:
+            return
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, dict())
+        if overwrite or None not in node:
+            node[None] = category
+
+    def learn(self, classified):
+        """
+        Learns from already classified names, e.g. the items of a ClassificationCache.
+
+        Every name is remembered exactly; head tokens whose names agree on a category are
+        added as keywords, without overriding the curated seeds.
+
+        :param classified: Iterable of (name, category) pairs.
+        :return: The LocalClassifier.
+        """
+        head_votes = defaultdict(Counter)
+        exact_votes = defaultdict(Counter)
+        for name, category in classified:
+            if category not in CATEGORIES:
+                continue
+            tokens = normalize_tokens(name)
+            if tokens:
+                exact_votes[tokens][category] += 1
+                head_votes[tokens[0]][category] += 1
+
+        for tokens, votes in exact_votes.items():
+            self.exact[tokens] = votes.most_common(1)[0][0]
+        for token, votes in head_votes.items():
+            category, count = votes.most_common(1)[0]
+            total = sum(votes.values())
+            if total >= self.min_support and count / total >= self.min_purity:
+                self._insert((token,), category, overwrite=False)
+        return self
+
+    @classmethod
+    def from_cache(cls, cache, **kwargs):
+        """
+        Builds a classifier learning from a ClassificationCache.
+
+        :param cache: The ClassificationCache.
+        :return: The LocalClassifier.
+        """
+        return cls(**kwargs).learn(cache.items())
+
+    def lookup(self, name):
+        """
+        Classifies a single ingredient name.
+
+        :param name: The ingredient name.
+        :return: The category, None when the name has no confident keyword.
+        """
+        tokens = normalize_tokens(name)
+        category = self.exact.get(tokens)
+        if category is not None:
+            return category
+        for start in range(len(tokens)):
+            node = self.trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                category = node.get(None, category)
+            if category is not None:
+                return category
+        return None
+
+    def classify(self, names):
+        classified = dict()
+        for name in names:
+            category = self.lookup(name)
+            if category is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                classified[name] = category
+        return classified
+
+    def coverage(self):
+        """
+        Returns the share of the names classified so far that were classified locally.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
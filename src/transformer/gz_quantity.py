@@ -0,0 +1,108 @@
+import re
+from functools import lru_cache
+from src.models.recipe import as_dict
+
+# Known cooking units, looked up in constant time
+KNOWN_UNITS = frozenset([
+    'tsp', 'tbsp', 'fl oz', 'c', 'pt', 'qt', 'gal', 'ml', 'l',
+    'oz', 'lb', 'g', 'kg', 'cl', 'cm', 'm'
+])
+
+# Number followed by an optional word, or a word in parentheses followed by a number
+QUANTITY_PATTERN = re.compile(r'(\d+\.?\d*)\s*(\w+)?|(\(\w+\))(\d+\.?\d*)')
+
+# Factor and canonical base unit of every known unit
+UNIT_CONVERSIONS = {
+    'g': (1.0, 'g'),
+    'kg': (1000.0, 'g'),
+    'oz': (28.349523125, 'g'),
+    'lb': (453.59237, 'g'),
+    'ml': (1.0, 'ml'),
+    'cl': (10.0, 'ml'),
+    'l': (1000.0, 'ml'),
+    'tsp': (4.92892159375, 'ml'),
+    'tbsp': (14.78676478125, 'ml'),
+    'fl oz': (29.5735295625, 'ml'),
+    'c': (236.5882365, 'ml'),
+    'pt': (473.176473, 'ml'),
+    'qt': (946.352946, 'ml'),
+    'gal': (3785.411784, 'ml'),
+    'cm': (1.0, 'cm'),
+    'm': (100.0, 'cm'),
+}
+
+PIECES = 'pcs'
+
+
+def parse_quantity(text):
+    """
+    Extracts the quantity and the rest of the text from a given string,
+    including cases where the number might come after text within parentheses.
+
+    :param text: String containing the quantity and possibly a unit or other descriptive text.
+    :return: A dictionary with keys 'amount', 'standard_unit' and 'descriptor'.
+    """
+    quantity = None
+    measure = None
+
+    for match in QUANTITY_PATTERN.findall(text.lower()):
+        if match[0]:  # Number before text
+            quantity = match[0]
+            measure = match[1]
+        elif match[3]:  # Number after parentheses
+            quantity = match[3]
+            measure = match[2].strip('()')  # Remove parentheses
+
+    if measure and measure in KNOWN_UNITS:
+        return {'amount': quantity, 'standard_unit': measure, 'descriptor': None}
+    else:
+        return {'amount': quantity, 'standard_unit': None, 'descriptor': measure}
+
+
+@lru_cache(maxsize=8192)
+def _normalize(amount, standard_unit):
+    if amount is None:
+        return None, None
+    value = float(amount)
+    if standard_unit:
+        factor, base_unit = UNIT_CONVERSIONS[standard_unit]
+        return value * factor, base_unit
+    # A number without a known unit counts pieces, e.g. "2 (medie)" eggs
+    return value, PIECES
+
+
+def normalize_quantity(quantity):
+    """
+    Converts a parsed quantity to a numeric amount in its canonical base unit
+    (grams, millilitres, centimetres or pieces).
+
+    :param quantity: A dictionary as returned by parse_quantity.
+    :return: A dictionary with keys 'amount', 'unit' and the original 'descriptor'.
+    """
+    amount, unit = _normalize(quantity['amount'], quantity['standard_unit'])
+    return {'amount': amount, 'unit': unit, 'descriptor': quantity['descriptor']}
+
+
+def normalize_ingredients(ingredients):
+    """
+    Normalizes the quantities of all the ingredients of a recipe in one call.
+
+    :param ingredients: List of ingredient dictionaries with 'name' and 'quantity' keys.
+    :return: A new list of ingredients with an added 'normalized_quantity' key.
+    """
+    return [
+        {**ingredient, 'normalized_quantity': normalize_quantity(ingredient['quantity'])}
+        for ingredient in ingredients
+    ]
+
+
+def normalize_recipes(recipes):
+    """
+    Normalizes the ingredient quantities of a whole corpus of recipes.
+
+    :param recipes: Iterable of Recipe objects or recipe dictionaries.
+    :return: A generator of recipe dictionaries whose ingredients carry a 'normalized_quantity' key.
+    """
+    for recipe in recipes:
+        recipe = as_dict(recipe)
+        yield {**recipe, 'ingredients': normalize_ingredients(recipe['ingredients'])}
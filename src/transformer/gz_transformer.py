@@ -1,8 +1,12 @@
 import json
-from openai import OpenAI
-import os
-
-os.environ["OPENAI_API_KEY"] = ""
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.interface.classifier import IngredientClassifier
+from src.models.recipe import as_dict
+from src.scraper.throttle import HostRateLimiter
 
 INGREDIENTS_CATEGORY = """
       Altri ingredienti
@@ -18,32 +22,279 @@ INGREDIENTS_CATEGORY = """
       Verdure
     """
 
+CATEGORIES = [category.strip() for category in INGREDIENTS_CATEGORY.strip().split('\n')]
+
+# Category cached for the names a classifier was asked about and left unclassified
+UNCLASSIFIED = ''
+
 EXAMPLES = """
       Example:
-      Input user: Olio extra vergine d'oliva, fettine di tacchino
-      Response: [{"name": "Olio extra vergine d'oliva", "category": "Burri, salse e olii"}, {"name": "fettine di tacchino", "category": "Carni"}
+      Input user: ["Olio extra vergine d'oliva", "fettine di tacchino"]
+      Response: {"ingredients": [{"name": "Olio extra vergine d'oliva", "category": "Burri, salse e olii"}, {"name": "fettine di tacchino", "category": "Carni"}]}
     """
 
 PROMPT_CLASSIFIER = f"""
-      You are an ingredients italian expert designed to output JSON. You must classify the provided ingredients in one of these category:
+      You are an ingredients italian expert designed to output JSON. You must classify every ingredient of the provided JSON array in one of these category:
     {INGREDIENTS_CATEGORY}
     {EXAMPLES}
     """
 
 
+class OpenAIClassifier(IngredientClassifier):
+    """
+    Classifies ingredients with an OpenAI chat model, reusing a single client for every batch.
+    """
+
+    def __init__(self, model="gpt-3.5-turbo", client=None):
+        """
+        :param model: Name of the chat model.
+        :param client: OpenAI client, a default one is created when None. It reads the API key
+                       from the OPENAI_API_KEY environment variable.
+        """
+        if client is None:
+            # openai is slow to import, only load it when the model is actually used
+            from openai import OpenAI
+            client = OpenAI()
+        self.model = model
+        self.client = client
+
+    def complete(self, string_ingredients):
+        """
+        Sends a list of ingredients to the model.
+
+        :param string_ingredients: The ingredients as a JSON array, e.g. '["Olio extra vergine d'oliva", "uova"]'.
+        :return: The list of {"name", "category"} dictionaries returned by the model.
+        """
+        completion = self.client.chat.completions.create(
+            model=self.model,
+            temperature=0,
+            messages=[
+                {"role": "system", "content": PROMPT_CLASSIFIER},
+                {"role": "user", "content": string_ingredients}
+            ],
+            response_format={"type": "json_object"}
+        )
+        return json.loads(completion.choices[0].message.content)['ingredients']
+
+    def classify(self, names):
+        requested = {name.lower(): name for name in names}
+        classified = dict()
+        # A JSON array keeps the names containing commas, e.g. "Burri, salse e olii", in one piece
+        for item in self.complete(json.dumps(names, ensure_ascii=False)):
+            name = requested.get(str(item.get('name', '')).strip().lower())
+            if name is not None and item.get('category') in CATEGORIES:
+                classified[name] = item['category']
+        return classified
+
+
+class StaticClassifier(IngredientClassifier):
+    """
+    Local classifier answering from a fixed mapping, a drop-in fake of the remote model for tests.
+    """
+
+    def __init__(self, mapping, default=None):
+        """
+        :param mapping: Dictionary of ingredient names to categories.
+        :param default: Category of the names missing from the mapping, None to leave them unclassified.
+        """
+        self.mapping = mapping
+        self.default = default
+        self.calls = 0
+
+    def classify(self, names):
+        self.calls += 1
+        classified = dict()
+        for name in names:
+            category = self.mapping.get(name, self.default)
+            if category is not None:
+                classified[name] = category
+        return classified
+
+
+class ClassificationCache:
+    """
+    Persistent cache of the ingredient classifications, stored in SQLite.
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: Path of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                name TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                source TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def __len__(self):
+        # Counts the unclassified names too
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+
+    def get_many(self, names, with_unclassified=False):
+        """
+        Looks up the cached category of the given names.
+
+        :param names: Iterable of ingredient names.
+        :param with_unclassified: Also return the names cached as unclassified, mapped to None.
+        :return: Dictionary of the cached names to their category.
+        """
+        found = dict()
+        names = list(names)
+        with self._lock:
+            # Stay below the SQLite limit of bound parameters
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT name, category FROM classifications WHERE name IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                found.update(rows)
+        if with_unclassified:
+            return {name: category if category != UNCLASSIFIED else None for name, category in found.items()}
+        return {name: category for name, category in found.items() if category != UNCLASSIFIED}
+
+    def put_many(self, classified, source=None):
+        """
+        Stores classifications in the cache.
+
+        :param classified: Dictionary of ingredient names to categories, None for the names the
+                           classifier left unclassified.
+        :param source: Name of the classifier that produced them.
+        """
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO classifications (name, category, source) VALUES (?, ?, ?)",
+                [(name, UNCLASSIFIED if category is None else category, source)
+                 for name, category in classified.items()])
+            self.conn.commit()
+
+    def items(self):
+        """
+        Returns every cached (name, category) pair, without the unclassified names.
+        """
+        with self._lock:
+            return self.conn.execute("SELECT name, category FROM classifications WHERE category != ?",
+                                     (UNCLASSIFIED,)).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def collect_ingredient_names(recipes):
+    """
+    Collects the distinct ingredient names of a corpus of recipes.
+
+    :param recipes: Iterable of Recipe objects or recipe dictionaries.
+    :return: Sorted list of the distinct, normalized, ingredient names.
+    """
+    names = set()
+    for recipe in recipes:
+        for ingredient in as_dict(recipe)['ingredients']:
+            name = ' '.join(ingredient['name'].split()).lower()
+            if name:
+                names.add(name)
+    return sorted(names)
+
+
+def make_batches(names, max_items=50, max_chars=2000):
+    """
+    Packs names into batches bounded both in number of names and in prompt characters.
+
+    :param names: List of ingredient names.
+    :param max_items: Maximum number of names in a batch.
+    :param max_chars: Maximum length of the JSON array of the batch.
+    :return: List of batches, each a list of names.
+    """
+    batches = list()
+    batch, batch_chars = list(), 0
+    for name in names:
+        # The quoted, escaped name and its separator
+        name_chars = len(json.dumps(name, ensure_ascii=False)) + 2
+        if batch and (len(batch) >= max_items or batch_chars + name_chars > max_chars):
+            batches.append(batch)
+            batch, batch_chars = list(), 0
+        batch.append(name)
+        batch_chars += name_chars
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _classify_with_retries(backend, batch, rate_limiter, max_retries, initial_backoff):
+    for attempt in range(max_retries + 1):
+        # All the batches share one budget, whatever the backend endpoint is
+        rate_limiter.wait('classifier')
+        try:
+            return backend.classify(batch)
+        except Exception as e:
+            if attempt == max_retries:
+                print(f"An error occurred while classifying {len(batch)} ingredients: {e}")
+                return None
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, initial_backoff * 2 ** attempt))
+
+
+def classify_corpus(recipes, backend: IngredientClassifier, cache: ClassificationCache, max_workers=4,
+                    requests_per_second=None, max_items=50, max_chars=2000, max_retries=3, initial_backoff=1.0,
+                    local: IngredientClassifier = None, retry_unclassified=False):
+    """
+    Classifies the distinct ingredients of a corpus, asking the backend only for the uncached ones.
+
+    The uncached names are packed into size-bounded batches sent concurrently through one
+    backend, under a shared rate limit and with retries; every classified batch is stored in
+    the cache right away, so an interrupted run resumes where it stopped. The names the backend
+    leaves unclassified are cached too, so they are not sent again; failed batches are not cached.
+
+    :param recipes: Iterable of Recipe objects or recipe dictionaries.
+    :param backend: The IngredientClassifier answering the uncached names.
+    :param cache: The ClassificationCache.
+    :param max_workers: Number of batches in flight.
+    :param requests_per_second: Maximum number of backend calls per second, None for no limit.
+    :param max_items: Maximum number of names in a batch.
+    :param max_chars: Maximum length of the JSON array of the batch.
+    :param max_retries: Number of retries of a failed batch.
+    :param initial_backoff: Seconds to wait before the first retry, doubled at every retry.
+    :param local: Deterministic classifier answering the uncached names before the backend, e.g. a
+                  LocalClassifier; its answers are not cached since they are cheap to recompute.
+    :param retry_unclassified: Send again the names the backend left unclassified in a previous run.
+    :return: Dictionary of every classified name of the corpus to its category.
+    """
+    names = collect_ingredient_names(recipes)
+    cached = cache.get_many(names, with_unclassified=not retry_unclassified)
+    classified = {name: category for name, category in cached.items() if category is not None}
+    missing = [name for name in names if name not in cached]
+    print(f"{len(names)} distinct ingredients, {len(cached)} cached, {len(cached) - len(classified)} of them "
+          f"unclassified.")
+    if local is not None and missing:
+        local_classified = local.classify(missing)
+        classified.update(local_classified)
+        print(f"Local classifier coverage: {len(local_classified)}/{len(missing)} "
+              f"({len(local_classified) / len(missing):.1%}) of the uncached ingredients.")
+        missing = [name for name in missing if name not in local_classified]
+    batches = make_batches(missing, max_items=max_items, max_chars=max_chars)
+    print(f"{len(missing)} ingredients to classify in {len(batches)} batches.")
+
+    rate_limiter = HostRateLimiter(requests_per_second)
+    source = type(backend).__name__
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_classify_with_retries, backend, batch, rate_limiter, max_retries, initial_backoff): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            if result is None:
+                continue
+            cache.put_many({**dict.fromkeys(futures[future]), **result}, source=source)
+            classified.update(result)
+    return classified
+
+
 def classify_ingredients(string_ingredients: str):
-    client = OpenAI()
-
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        temperature=0,
-        messages=[
-            {"role": "system", "content": PROMPT_CLASSIFIER},
-            {"role": "user", "content": string_ingredients}
-        ],
-        response_format={"type": "json_object"}
-    )
-
-    prova = json.loads(completion.choices[0].message.content)
-    for _ in prova['ingredients']:
-        print(_)
+    return OpenAIClassifier().complete(string_ingredients)
@@ -1,6 +1,7 @@
 import json
 import os
 import glob
+import gzip
 
 
 def find_json_files(directory):
@@ -54,3 +55,80 @@ def delete_file(file_path):
         os.remove(file_path)
     except FileNotFoundError:
         pass
+
+
+def open_segment_writer(filename, compression=None):
+    """
+    Opens a binary writer for a JSONL segment.
+
+    :param filename: Path of the segment file.
+    :param compression: 'gzip', 'zstd' or None for an uncompressed file.
+    :return: A binary file object supporting write, flush and close.
+    """
+    if compression == 'gzip':
+        return gzip.open(filename, 'wb')
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(open(filename, 'wb'), closefd=True)
+    return open(filename, 'wb')
+
+
+def open_segment_reader(filename):
+    """
+    Opens a binary reader for a JSONL segment, the compression is taken from the file suffix
+    (a trailing .tmp suffix of a segment still being written is ignored).
+
+    :param filename: Path of the segment file.
+    :return: A binary file object iterable line by line.
+    """
+    name = filename[:-len('.tmp')] if filename.endswith('.tmp') else filename
+    if name.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    if name.endswith('.zst'):
+        import io
+        import zstandard
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True))
+    return open(filename, 'rb')
+
+
+def iter_jsonl(filename, loads=json.loads, strict=True):
+    """
+    Streams the records of a (compressed) JSONL file, one line at a time.
+
+    :param filename: Path of the JSONL file.
+    :param loads: Function decoding a single line.
+    :param strict: When False a truncated tail, e.g. left by a crash, ends the stream instead of raising.
+    :return: A generator of records.
+    """
+    with open_segment_reader(filename) as f:
+        try:
+            for line in f:
+                if line.endswith(b'\n'):
+                    yield loads(line)
+                elif strict:
+                    raise ValueError(f"Truncated record at the end of {filename}")
+        except (EOFError, OSError, ValueError):
+            if strict:
+                raise
+            # Anything can be left after the last complete line of an interrupted write
+            return
+
+
+def fsync_and_replace(tmp_filename, filename):
+    """
+    Atomically moves a fully written temporary file to its final name.
+
+    The data of the file is fsynced before the rename and the directory after it,
+    so after a crash the final file either does not exist or is complete.
+
+    :param tmp_filename: Path of the temporary file, already closed.
+    :param filename: Final path of the file.
+    """
+    with open(tmp_filename, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
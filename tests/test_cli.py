@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.gz_bench import HEAVY_MODULES, PLAN_IMPORTS, ROOT_DIR
+
+# Seconds the imports may take in a fresh interpreter, far above their usual cost so that only an
+# eager import of a heavy module makes the test fail
+STARTUP_BOUNDS = {
+    'import src.cli': 0.1,
+    PLAN_IMPORTS: 0.5,
+}
+
+
+def run_fresh(imports):
+    code = (f"import time\n"
+            f"start = time.perf_counter()\n"
+            f"{imports}\n"
+            f"seconds = time.perf_counter() - start\n"
+            f"import json, os, sys\n"
+            f"print(json.dumps([seconds, [m for m in {HEAVY_MODULES!r} if m in sys.modules],"
+            f" os.environ.get('OPENAI_API_KEY')]))")
+    env = {**os.environ, 'OPENAI_API_KEY': 'unchanged'}
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize('imports', list(STARTUP_BOUNDS))
+def test_startup_is_lazy(imports):
+    seconds, loaded, api_key = run_fresh(imports)
+    assert loaded == []
+    assert api_key == 'unchanged'
+    assert seconds < STARTUP_BOUNDS[imports]
+
@@ -0,0 +1,93 @@
+import asyncio
+
+import elasticsearch
+import pytest
+
+from src.populator import gz_backends
+from src.populator.gz_backends import ElasticsearchBackend
+from src.populator.gz_populator import MealSearcher
+
+TEMPLATE = [{'day': 'Monday', 'moment_of_day': 'Lunch', 'category': 'Carne'},
+            {'day': 'Monday', 'moment_of_day': 'Dinner', 'category': 'pesce'},
+            {'day': 'Tuesday', 'moment_of_day': 'Lunch', 'category': 'carne'},
+            {'day': 'Tuesday', 'moment_of_day': 'Dinner', 'category': 'dolci'}]
+
+HITS = {'carne': [('c1', 'arrosto'), ('c2', 'brasato')], 'pesce': [('p1', 'orata')], 'dolci': []}
+
+
+class FakeElasticsearch:
+    """
+    Answers every search of a multi-search with the HITS of its category, recording the requests.
+    """
+
+    def __init__(self):
+        self.requests = list()
+
+    def msearch(self, searches):
+        self.requests.append(searches)
+        responses = list()
+        for body in searches[1::2]:
+            category = body['query']['function_score']['query']['term']['category']['value']
+            responses.append({'hits': {'hits': [{'_id': recipe_id, '_source': {'recipe': name}}
+                                                for recipe_id, name in HITS[category][:body['size']]]}})
+        return {'responses': responses}
+
+
+class FakeAsyncElasticsearch:
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, hosts):
+        pass
+
+    async def msearch(self, searches):
+        cls = FakeAsyncElasticsearch
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        await asyncio.sleep(0.001)
+        cls.in_flight -= 1
+        return {'responses': [{'hits': {'hits': [{'_id': 'id', '_source': {'recipe': 'name'}}]}}
+                              for _ in range(len(searches) // 2)]}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def with_aiohttp(monkeypatch):
+    monkeypatch.setattr(gz_backends, 'HAS_AIOHTTP', True)
+    monkeypatch.setattr(elasticsearch, 'AsyncElasticsearch', FakeAsyncElasticsearch)
+
+
+def test_get_meal_plan_sends_one_multi_search():
+    backend = ElasticsearchBackend(index_name='recipes-v2')
+    backend.es = FakeElasticsearch()
+
+    plan = MealSearcher(backend=backend).get_meal_plan(TEMPLATE, seed=7)
+
+    assert len(backend.es.requests) == 1
+    searches = backend.es.requests[0]
+    assert searches[::2] == [{'index': 'recipes-v2'}] * 3
+    # One search per category, asking for as many recipes as it has slots, in seeded random order
+    assert [body['size'] for body in searches[1::2]] == [2, 1, 1]
+    assert all(body['query']['function_score']['random_score']['seed'] == 7 for body in searches[1::2])
+    assert [slot['recipe_name'] for slot in plan] == ['arrosto', 'orata', 'brasato', 'Recipe Not Found']
+    assert [(slot['day'], slot['moment_of_day']) for slot in plan] == [
+        (slot['day'], slot['moment_of_day']) for slot in TEMPLATE]
+
+
+def test_sample_many_async_without_aiohttp_fails_clearly(monkeypatch):
+    monkeypatch.setattr(gz_backends, 'HAS_AIOHTTP', False)
+    with pytest.raises(ImportError, match='aiohttp'):
+        asyncio.run(ElasticsearchBackend().sample_many_async([({'carne': 1}, 0)]))
+
+
+def test_sample_many_async_bounds_the_requests_in_flight(with_aiohttp):
+    backend = ElasticsearchBackend()
+    requests = [({'carne': 1, 'pesce': 1}, seed) for seed in range(50)] + [({}, 50)]
+
+    samples = asyncio.run(backend.sample_many_async(requests, concurrency=4))
+
+    assert FakeAsyncElasticsearch.max_in_flight == 4
+    assert samples[0] == {'carne': [('id', 'name')], 'pesce': [('id', 'name')]} and samples[-1] == {}
+    assert len(samples) == len(requests)
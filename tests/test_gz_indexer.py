@@ -0,0 +1,183 @@
+import re
+
+import pytest
+from elasticsearch import NotFoundError
+from src.indexer.elastic import gz_indexer
+from src.indexer.elastic.gz_indexer import MyElasticsearchIndexer
+from src.store.recipe_store import RecipeStore
+from src.transformer.gz_quantity import parse_quantity
+
+
+class FakeIndices:
+    def __init__(self, aliases=None, health=None, fail_delete=False):
+        self.aliases = aliases or dict()
+        self.health_response = health or {'status': 'green', 'timed_out': False}
+        self.fail_delete = fail_delete
+        self.calls = list()
+
+    def _call(self, name, **kwargs):
+        self.calls.append((name, kwargs))
+
+    def create(self, **kwargs):
+        self._call('create', **kwargs)
+
+    def refresh(self, **kwargs):
+        self._call('refresh', **kwargs)
+
+    def forcemerge(self, **kwargs):
+        self._call('forcemerge', **kwargs)
+
+    def put_settings(self, **kwargs):
+        self._call('put_settings', **kwargs)
+
+    def health(self, **kwargs):
+        self._call('health', **kwargs)
+        return self.health_response
+
+    def exists(self, index):
+        return False
+
+    def get_alias(self, name):
+        if name not in self.aliases:
+            raise NotFoundError('not found', None, None)
+        return {index: dict() for index in self.aliases[name]}
+
+    def update_aliases(self, actions):
+        self._call('update_aliases', actions=actions)
+
+    def delete(self, index):
+        self._call('delete', index=index)
+        if self.fail_delete:
+            raise ConnectionError('cluster unreachable')
+
+
+class FakeElasticsearch:
+    def __init__(self, indices):
+        self.indices = indices
+        self.cluster = indices
+        self.sent = list()
+        self.hashes = dict()
+
+    def mget(self, index, ids, source_includes):
+        return {'docs': [{'_id': doc_id, 'found': True, '_source': {'content_hash': self.hashes[doc_id]}}
+                         if doc_id in self.hashes else {'_id': doc_id, 'found': False} for doc_id in ids]}
+
+
+def make_indexer(monkeypatch, rejected=(), **kwargs):
+    def streaming_bulk(es, actions, **options):
+        for action in actions:
+            es.sent.append(action)
+            if action['_source']['link'] in rejected:
+                yield False, {'index': {'_id': action['_id'], 'error': 'mapper_parsing_exception'}}
+            else:
+                yield True, {'index': {'_id': action['_id']}}
+
+    monkeypatch.setattr(gz_indexer, 'streaming_bulk', streaming_bulk)
+    indexer = MyElasticsearchIndexer('http://localhost:9200', 'recipes')
+    indexer.es = FakeElasticsearch(FakeIndices(aliases={'recipes': ['recipes-old']}, **kwargs))
+    return indexer
+
+
+def documents():
+    return [{'recipe': f"recipe {i}", 'link': f"https://ricette.giallozafferano.it/Ricetta-{i}.html",
+             'ingredients': [], 'category': ['pasta']} for i in range(5)]
+
+
+def call_names(indexer):
+    return [name for name, _ in indexer.es.indices.calls]
+
+
+def test_rebuild_swaps_the_alias_and_deletes_the_old_index(monkeypatch):
+    indexer = make_indexer(monkeypatch)
+    stats = indexer.rebuild_index(documents(), thread_count=1)
+
+    assert stats['indexed'] == 5
+    assert call_names(indexer) == ['create', 'refresh', 'forcemerge', 'put_settings', 'health', 'update_aliases',
+                                   'delete']
+    _, update = indexer.es.indices.calls[5]
+    assert update['actions'] == [{'add': {'index': stats['index'], 'alias': 'recipes'}},
+                                 {'remove': {'index': 'recipes-old', 'alias': 'recipes'}}]
+    assert indexer.es.indices.calls[6][1] == {'index': ['recipes-old']}
+
+
+def test_rebuilds_within_the_same_second_get_distinct_indices(monkeypatch):
+    monkeypatch.setattr(gz_indexer.time, 'time', lambda: 1700000000.25)
+    names = {gz_indexer.timestamped_index_name('recipes') for _ in range(20)}
+
+    assert len(names) == 20
+    assert all(re.fullmatch(r"recipes-\d{8}-\d{6}-250000-[0-9a-f]{6}", name) for name in names)
+
+
+def test_rejected_documents_keep_the_alias_on_the_old_index(monkeypatch):
+    indexer = make_indexer(monkeypatch, rejected={documents()[2]['link']})
+    with pytest.raises(RuntimeError, match='1 documents were rejected'):
+        indexer.rebuild_index(documents(), thread_count=1)
+
+    assert 'update_aliases' not in call_names(indexer)
+    name, kwargs = indexer.es.indices.calls[-1]
+    assert name == 'delete' and kwargs['index'] != ['recipes-old']
+
+
+def test_health_timeout_keeps_the_alias_on_the_old_index(monkeypatch):
+    indexer = make_indexer(monkeypatch, health={'status': 'red', 'timed_out': True})
+    with pytest.raises(RuntimeError, match='not allocated'):
+        indexer.rebuild_index(documents(), thread_count=1)
+    assert 'update_aliases' not in call_names(indexer)
+
+
+def test_failed_cleanup_does_not_hide_the_original_error(monkeypatch):
+    indexer = make_indexer(monkeypatch, rejected={documents()[0]['link']}, fail_delete=True)
+    with pytest.raises(RuntimeError, match='rejected'):
+        indexer.rebuild_index(documents(), thread_count=1)
+
+
+def refreshed_documents():
+    old, new = documents()[1], {**documents()[1], 'recipe': 'recipe 1, refreshed'}
+    return [old, documents()[0], new]
+
+
+def test_streaming_indexes_the_documents_as_they_come_by_default(monkeypatch):
+    indexer = make_indexer(monkeypatch)
+    stats = indexer.bulk_data_streaming(iter(refreshed_documents()), thread_count=1)
+    assert stats['indexed'] == 3
+
+
+def test_streaming_deduplicate_indexes_the_last_version_of_a_recipe(monkeypatch):
+    indexer = make_indexer(monkeypatch)
+    stats = indexer.bulk_data_streaming(refreshed_documents(), thread_count=2, deduplicate=True)
+
+    assert stats['indexed'] == 2
+    assert [action['_source']['recipe'] for action in indexer.es.sent] == ['recipe 1, refreshed', 'recipe 0']
+
+
+def test_delta_compares_the_last_version_of_a_recipe(monkeypatch):
+    indexer = make_indexer(monkeypatch)
+    old = refreshed_documents()[0]
+    indexer.es.hashes[gz_indexer.recipe_id(old['link'])] = gz_indexer.content_hash(old)
+    stats = indexer.bulk_data_delta(refreshed_documents(), thread_count=1, deduplicate=True)
+
+    assert stats['unchanged'] == 0
+    assert sorted(action['_source']['recipe'] for action in indexer.es.sent) == ['recipe 0', 'recipe 1, refreshed']
+
+
+def test_index_store_sends_the_last_version_of_a_recipe(monkeypatch, tmp_path):
+    store = RecipeStore(str(tmp_path), segment_size=2)
+    for document in refreshed_documents():
+        store.append(document)
+    store.close()
+    indexer = make_indexer(monkeypatch)
+    stats = indexer.index_store(str(tmp_path), thread_count=1)
+
+    assert stats['indexed'] == 2 and stats['bytes'] > 0
+    assert sorted(action['_source']['recipe'] for action in indexer.es.sent) == ['recipe 0', 'recipe 1, refreshed']
+
+
+def test_documents_carry_the_normalized_quantities(monkeypatch):
+    indexer = make_indexer(monkeypatch)
+    document = {**documents()[0], 'ingredients': [{'name': 'farina', 'quantity': parse_quantity('0.5 kg')}]}
+    action, = indexer._format_for_bulk_indexing([document])
+
+    ingredient, = action['_source']['ingredients']
+    assert ingredient['normalized_quantity'] == {'amount': 500.0, 'unit': 'g', 'descriptor': None}
+    # The hash is the one of the scraped document, so the delta mode sees it unchanged
+    assert action['_source']['content_hash'] == gz_indexer.content_hash(document)
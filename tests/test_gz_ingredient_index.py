@@ -0,0 +1,53 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.indexer.memory.gz_ingredient_index import IngredientIndex
+from src.models.recipe import recipe_id
+
+
+def recipe(number, ingredients):
+    return {'recipe': f"Ricetta {number}", 'link': f"https://ricette.giallozafferano.it/Ricetta-{number}.html",
+            'ingredients': [{'name': name} for name in ingredients]}
+
+
+RECIPES = [
+    recipe(0, ['Spaghetti', 'Guanciale', 'Uova', 'Pecorino']),
+    recipe(1, ['Uova', 'Zucchero']),
+    recipe(2, ['Riso', 'Zafferano', 'Brodo']),
+]
+
+
+@pytest.fixture
+def index():
+    return IngredientIndex.build(RECIPES)
+
+
+def test_top_k_ranks_the_recipes_against_a_pantry(index):
+    results = index.top_k(['uova', ' Zucchero ', 'spaghetti'], k=2)
+    assert [(item['recipe'], item['matched'], item['missing']) for item in results] == [
+        ('Ricetta 1', 2, 0), ('Ricetta 0', 2, 2)]
+    assert results[0]['recipe_id'] == recipe_id(RECIPES[1]['link'])
+
+
+def test_missing_ingredients_looks_up_the_recipe_id(index):
+    assert index.missing_ingredients(recipe_id(RECIPES[0]['link']), ['uova']) == ['guanciale', 'pecorino',
+                                                                                 'spaghetti']
+    with pytest.raises(ValueError):
+        index.missing_ingredients('unknown', ['uova'])
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    index.save(str(tmp_path))
+    loaded = IngredientIndex.load(str(tmp_path))
+
+    with open(os.path.join(tmp_path, 'meta.json')) as f:
+        assert json.load(f) == {'version': index.version}
+    assert isinstance(loaded.vocabulary.keys, np.memmap) and isinstance(loaded.id_positions.keys, np.memmap)
+    assert list(loaded.vocabulary) == list(index.vocabulary)
+    assert list(loaded.ids) == list(index.ids) and list(loaded.names) == list(index.names)
+    assert loaded.top_k(['riso', 'uova']) == index.top_k(['riso', 'uova'])
+    doc_id = recipe_id(RECIPES[2]['link'])
+    assert loaded.missing_ingredients(doc_id, ['riso']) == index.missing_ingredients(doc_id, ['riso'])
@@ -0,0 +1,71 @@
+import pytest
+
+from src.transformer.gz_local_classifier import LocalClassifier, normalize_tokens
+from src.transformer.gz_transformer import ClassificationCache
+
+
+@pytest.mark.parametrize('name, tokens', [
+    ("Olio extra vergine d'oliva", ('oli', 'extr', 'vergin', 'oliv')),
+    # Accents, digits and stopwords are dropped
+    ('Caffè', ('caff',)),
+    ("2 Tuorli d'uovo SODI", ('tuorl', 'uov', 'sod')),
+    # Short tokens keep their last vowel
+    ('tè al limone', ('te', 'limon')),
+    ('', ()),
+])
+def test_normalize_tokens(name, tokens):
+    assert normalize_tokens(name) == tokens
+
+
+@pytest.mark.parametrize('name, category', [
+    ('Pomodori San Marzano', 'Verdure'),
+    ('noce', 'Frutta'),
+    # The longest keyword starting at the same token wins
+    ('noce moscata grattugiata', 'Erbe, spezie, aromi'),
+    # The leftmost keyword wins, after the unknown tokens
+    ('gherigli di noce', 'Frutta'),
+    ('fettine di tacchino', 'Carni'),
+    ('zuppa toscana', None),
+])
+def test_lookup_uses_the_seed_keywords(name, category):
+    assert LocalClassifier().lookup(name) == category
+
+
+def test_unknown_seed_category_is_rejected():
+    with pytest.raises(ValueError):
+        LocalClassifier(seeds={'Spezie': ['pepe']})
+
+
+def test_learn_adds_the_confident_head_tokens():
+    classified = [('cavolini di bruxelles', 'Verdure'), ('cavolini lessati', 'Verdure'),
+                  ('zuppa inglese', 'Altri ingredienti'), ('zuppa di cozze', 'Pesci'),
+                  ('olio di semi', 'Altri ingredienti'), ('olio di cocco', 'Altri ingredienti'),
+                  ('acqua tonica', 'Non una categoria')]
+    classifier = LocalClassifier().learn(classified)
+
+    assert classifier.lookup('cavolini saltati') == 'Verdure'
+    # A head token whose names disagree is not a keyword, but the names are still known exactly
+    assert classifier.lookup('zuppa toscana') is None
+    assert classifier.lookup('Zuppa inglese') == 'Altri ingredienti'
+    # A learned head token does not override a curated seed
+    assert classifier.lookup('olio di oliva') == 'Burri, salse e olii'
+    assert classifier.lookup('olio di semi') == 'Altri ingredienti'
+    # Names of unknown categories are ignored
+    assert normalize_tokens('acqua tonica') not in classifier.exact
+
+    assert LocalClassifier(min_support=3).learn(classified).lookup('cavolini saltati') is None
+    assert LocalClassifier(min_purity=0.5).learn(classified).lookup('zuppa toscana') == 'Altri ingredienti'
+
+
+def test_classify_tracks_the_coverage(tmp_path):
+    cache = ClassificationCache(str(tmp_path / 'classifications.sqlite'))
+    cache.put_many({'cavolini di bruxelles': 'Verdure', 'cavolini lessati': 'Verdure'})
+    classifier = LocalClassifier.from_cache(cache, min_support=2)
+    cache.close()
+    assert classifier.coverage() == 0.0
+
+    classified = classifier.classify(['cavolini saltati', 'sale', 'zuppa toscana', 'ingrediente segreto'])
+
+    assert classified == {'cavolini saltati': 'Verdure', 'sale': 'Erbe, spezie, aromi'}
+    assert (classifier.hits, classifier.misses) == (2, 2)
+    assert classifier.coverage() == 0.5
@@ -0,0 +1,51 @@
+import pytest
+
+from src.pipelines.gz_manifest import URLManifest
+
+URLS = [f"https://ricette.giallozafferano.it/Ricetta-{i}.html" for i in range(5)]
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = URLManifest(str(tmp_path / 'manifest.sqlite'))
+    yield manifest
+    manifest.close()
+
+
+def test_pending_urls_skips_done_and_exhausted_urls(manifest):
+    manifest.mark_done(URLS[:1], chunk_file='recipes_000001.jsonl.gz')
+    manifest.mark_failed(URLS[1], 'HTTP 500')
+    for _ in range(3):
+        manifest.mark_failed(URLS[2], 'HTTP 404')
+
+    assert sorted(manifest.pending_urls(URLS + URLS[3:])) == [URLS[1], URLS[3], URLS[4]]
+    assert sorted(manifest.pending_urls(URLS, max_retries=4)) == URLS[1:]
+    assert manifest.failed_urls() == [URLS[1]]
+
+
+def test_a_retried_url_that_succeeds_is_done(manifest):
+    manifest.mark_failed(URLS[0], 'timeout')
+    manifest.mark_failed(URLS[0], 'timeout')
+    assert manifest.pending_urls(URLS[:1]) == URLS[:1]
+
+    manifest.mark_done(URLS[:1])
+    assert manifest.pending_urls(URLS[:1]) == []
+    # A later failure, e.g. of a refresh, starts counting from zero again
+    manifest.mark_failed(URLS[0], 'timeout')
+    assert manifest.pending_urls(URLS[:1], max_retries=2) == URLS[:1]
+
+
+def test_manifest_persists_and_bootstraps(tmp_path):
+    db_path = str(tmp_path / 'manifest.sqlite')
+    manifest = URLManifest(db_path)
+    manifest.bootstrap_from_links([(f"{tmp_path}/recipes_json/chunk_0.json", URLS[:2]),
+                                   (f"{tmp_path}/recipes/recipes_000001.jsonl.gz", URLS[2:3])])
+    manifest.mark_failed(URLS[3], 'HTTP 500')
+    manifest.close()
+
+    manifest = URLManifest(db_path)
+    assert len(manifest) == 4
+    assert sorted(manifest.pending_urls(URLS)) == URLS[3:]
+    chunk_file, = manifest.conn.execute("SELECT chunk_file FROM urls WHERE url = ?", (URLS[2],)).fetchone()
+    assert chunk_file == 'recipes_000001.jsonl.gz'
+    manifest.close()
@@ -0,0 +1,73 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.indexer.memory.gz_memory_index import InMemoryRecipeIndex, SortedStrings, StringTable
+from src.models.recipe import recipe_id
+
+
+def recipe(number, category, ingredients, difficulty='Facile'):
+    return {'recipe': f"Ricetta {number} è", 'link': f"https://ricette.giallozafferano.it/Ricetta-{number}.html",
+            'category': category, 'ingredients': [{'name': name} for name in ingredients], 'difficulty': difficulty}
+
+
+RECIPES = [
+    recipe(0, ['Primi piatti', 'Pasta'], ['Spaghetti', 'Guanciale', 'Uova']),
+    recipe(1, ['Primi piatti'], ['Riso', 'Zafferano'], 'Media'),
+    recipe(2, ['Dolci'], ['Uova', 'Zucchero']),
+    recipe(3, ['Primi piatti', 'Pasta'], ['Penne', 'Pomodoro']),
+]
+
+
+@pytest.fixture
+def index():
+    return InMemoryRecipeIndex.build(RECIPES)
+
+
+def test_match_combines_the_clauses(index):
+    assert index.match(must=[('category', 'primi piatti')]).tolist() == [0, 1, 3]
+    assert index.match(must=[('category', 'Primi Piatti'), ('category', 'pasta')]).tolist() == [0, 3]
+    assert index.match(should=[('ingredient', 'uova'), ('ingredient', 'riso')]).tolist() == [0, 1, 2]
+    assert index.match(must=[('category', 'primi piatti')], must_not=[('difficulty', 'media')]).tolist() == [0, 3]
+    assert index.match(must=[('category', 'secondi')]).tolist() == []
+    assert index.match().tolist() == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        index.match(must=[('course', 'primi')])
+
+
+def test_a_refreshed_recipe_replaces_its_older_version():
+    index = InMemoryRecipeIndex.build(RECIPES + [recipe(2, ['Dolci'], ['Farina'])])
+    assert len(index) == 4
+    assert index.match(must=[('ingredient', 'farina')]).tolist() == [2]
+    assert index.match(must=[('ingredient', 'zucchero')]).tolist() == []
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    index.save(str(tmp_path))
+    loaded = InMemoryRecipeIndex.load(str(tmp_path))
+
+    assert isinstance(loaded.postings, np.memmap) and isinstance(loaded.ids.data, np.memmap)
+    with open(os.path.join(tmp_path, 'meta.json')) as f:
+        assert json.load(f) == {'version': index.version}
+    assert loaded.index_version() == index.version
+    assert list(loaded.ids) == [recipe_id(item['link']) for item in RECIPES]
+    assert list(loaded.names) == [item['recipe'] for item in RECIPES]
+    assert list(loaded.terms) == list(index.terms)
+    for field, value in [('category', 'pasta'), ('ingredient', 'uova'), ('difficulty', 'media'), ('category', 'x')]:
+        assert loaded.postings_of(field, value).tolist() == index.postings_of(field, value).tolist()
+    assert loaded.category_pool('pasta', 10) == index.category_pool('pasta', 10)
+    assert loaded.search(must=[('ingredient', 'uova')], seed=1) == index.search(must=[('ingredient', 'uova')], seed=1)
+
+
+def test_string_tables_look_up_by_binary_search():
+    strings = SortedStrings.from_strings(sorted(['uova', 'è', 'a', 'zucchero']))
+    assert [strings.get(key) for key in ['a', 'uova', 'zucchero', 'è', 'b', 'zucchero a velo']] == [0, 1, 2, 3, None, None]
+    ids = SortedStrings.from_strings(['c', 'a', 'b'], numbered=True)
+    assert [ids.get(key) for key in 'abcd'] == [1, 2, 0, None]
+    assert strings.get_many(['zucchero', 'b', 'zucchero a velo', 'a', 'zz']).tolist() == [2, 0]
+    assert ids.get_many('dcba').tolist() == [0, 2, 1] and ids.get_many([]).tolist() == []
+
+    table = StringTable.from_strings(['', 'più', 'uova'])
+    assert list(table) == ['', 'più', 'uova'] and table[1] == 'più' and table.take([2, 0]) == ['uova', '']
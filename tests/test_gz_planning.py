@@ -0,0 +1,58 @@
+import pytest
+
+from src.indexer.memory.gz_memory_index import InMemoryRecipeIndex
+from src.pipelines.gz_planning import iter_meal_plans, PlanningStats, run_planning
+from src.populator.gz_populator import CachedMealSearcher, MealSearcher
+from src.utilis import iter_jsonl
+
+CATEGORIES = ('vegetariano', 'vegano', 'carne', 'pesce')
+
+
+@pytest.fixture
+def searcher():
+    recipes = [{'recipe': f"{category} {i}", 'link': f"https://ricette.giallozafferano.it/{category}-{i}.html",
+                'category': [category]} for category in CATEGORIES for i in range(20)]
+    return CachedMealSearcher(MealSearcher(backend=InMemoryRecipeIndex.build(recipes)), seed=1)
+
+
+def test_plans_follow_the_profiles(searcher):
+    profiles = [{'user_id': 'a', 'meat_meals': 3, 'fish_meals': 2, 'free_day': 'Sunday'},
+                {'user_id': 'b'}]
+    plans = {plan['user_id']: plan['plan'] for plan in iter_meal_plans(profiles, searcher, weeks=2, seed=7)}
+
+    assert len(plans['a']) == len(plans['b']) == 2 * 7 * 2
+    categories = [slot['category'] for slot in plans['a']]
+    assert categories.count('carne') == 2 * 3 and categories.count('pesce') == 2 * 2
+    assert all(slot['category'] == 'Free' and slot['recipe_id'] is None
+               for slot in plans['a'] if slot['day'] == 'Sunday')
+    assert {slot['category'] for slot in plans['b']} <= {'vegetariano', 'vegano'}
+    for slot in plans['a'] + plans['b']:
+        if slot['category'] != 'Free':
+            assert slot['recipe_name'].startswith(slot['category'])
+
+
+def test_plans_are_reproducible_with_a_seed(searcher):
+    profiles = [{'user_id': str(i), 'meat_meals': i % 3} for i in range(50)]
+    first = list(iter_meal_plans(profiles, searcher, seed=3, batch_size=16))
+    assert first == list(iter_meal_plans(profiles, searcher, seed=3, batch_size=16))
+
+
+def test_infeasible_profiles_are_skipped_and_counted(searcher):
+    profiles = [{'user_id': 'a', 'meat_meals': 2},
+                {'user_id': 'b', 'meat_meals': 8},
+                {'user_id': 'c', 'fish_meals': 7, 'free_day': 'Monday'},
+                {'user_id': 'd'}]
+    stats = PlanningStats()
+    plans = list(iter_meal_plans(profiles, searcher, seed=1, batch_size=2, stats=stats))
+
+    assert [plan['user_id'] for plan in plans] == ['a', 'd']
+    assert stats.summary()['plans'] == 2 and stats.summary()['failed'] == 2
+    assert len(stats.summary()['failures']) == 2
+
+
+def test_run_planning_writes_every_feasible_plan(searcher, tmp_path):
+    output_file = str(tmp_path / 'plans.jsonl.gz')
+    summary = run_planning([{'user_id': 'a'}, {'user_id': 'b', 'meat_meals': 9}], output_file, searcher, seed=1)
+
+    assert [plan['user_id'] for plan in iter_jsonl(output_file)] == ['a']
+    assert summary['failed'] == 1 and summary['slot_coverage'] == 1.0
@@ -0,0 +1,108 @@
+from src.populator.gz_populator import CachedMealSearcher, MealSearcher
+
+TEMPLATE = [{'day': 'Monday', 'moment_of_day': 'Lunch', 'category': 'Carne'},
+            {'day': 'Monday', 'moment_of_day': 'Dinner', 'category': 'pesce'},
+            {'day': 'Tuesday', 'moment_of_day': 'Lunch', 'category': 'carne'},
+            {'day': 'Tuesday', 'moment_of_day': 'Dinner', 'category': 'dolci'}]
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class PoolBackend:
+    """
+    Serves fixed category pools, counting the loads of every category.
+    """
+
+    def __init__(self, pools):
+        self.pools = pools
+        self.loads = dict()
+        self.version = 'v1'
+
+    def category_pool(self, category, max_size):
+        self.loads[category] = self.loads.get(category, 0) + 1
+        names = self.pools.get(category, ())[:max_size]
+        return tuple(f"{category}-{i}" for i in range(len(names))), tuple(names)
+
+    def index_version(self):
+        return self.version
+
+
+def cached_searcher(clock, **kwargs):
+    backend = PoolBackend({'carne': ('arrosto', 'brasato', 'polpette'), 'pesce': ('orata',)})
+    searcher = CachedMealSearcher(MealSearcher(backend=backend), **{'ttl': 60, 'seed': 0, **kwargs})
+    searcher._now = clock
+    return searcher, backend
+
+
+def test_get_meal_plan_does_not_repeat_recipes():
+    searcher, _ = cached_searcher(Clock())
+    plan = searcher.get_meal_plan(TEMPLATE)
+
+    assert [(slot['day'], slot['moment_of_day']) for slot in plan] == [
+        (slot['day'], slot['moment_of_day']) for slot in TEMPLATE]
+    assert plan[0]['recipe_name'] != plan[2]['recipe_name']
+    assert all(slot['recipe_id'] == f"carne-{('arrosto', 'brasato', 'polpette').index(slot['recipe_name'])}"
+               for slot in (plan[0], plan[2]))
+    assert plan[1] == {'day': 'Monday', 'moment_of_day': 'Dinner', 'recipe_id': 'pesce-0', 'recipe_name': 'orata'}
+    assert plan[3] == {'day': 'Tuesday', 'moment_of_day': 'Dinner', 'recipe_id': None,
+                       'recipe_name': 'Recipe Not Found'}
+
+
+def test_pools_are_counted_and_reloaded_after_the_ttl():
+    clock = Clock()
+    searcher, backend = cached_searcher(clock)
+    searcher.get_meal_plan(TEMPLATE)
+    assert (searcher.hits, searcher.misses) == (0, 3)
+
+    clock.now += 59.9
+    searcher.get_meal_plan(TEMPLATE)
+    assert (searcher.hits, searcher.misses) == (3, 3)
+    assert backend.loads == {'carne': 1, 'pesce': 1, 'dolci': 1}
+
+    clock.now += 0.1
+    searcher.get_meal_plan(TEMPLATE)
+    assert (searcher.hits, searcher.misses) == (3, 6)
+    assert backend.loads == {'carne': 2, 'pesce': 2, 'dolci': 2}
+
+
+def test_invalidate_drops_the_pools():
+    searcher, backend = cached_searcher(Clock())
+    searcher.pool('carne')
+    searcher.invalidate()
+    searcher.pool('Carne')
+
+    assert backend.loads == {'carne': 2}
+    assert searcher.stats() == {'hits': 0, 'misses': 2, 'evictions': 0, 'invalidations': 1,
+                                'pools': {'carne': 3}}
+
+
+def test_index_version_change_invalidates_the_pools_once_checked():
+    clock = Clock()
+    searcher, backend = cached_searcher(clock, ttl=3600, version_check_interval=300)
+    searcher.pool('carne')
+    backend.version = 'v2'
+
+    clock.now += 299
+    searcher.pool('carne')
+    assert (backend.loads['carne'], searcher.invalidations) == (1, 0)
+    clock.now += 1
+    searcher.pool('carne')
+    assert (backend.loads['carne'], searcher.invalidations) == (2, 1)
+
+
+def test_least_recently_used_pool_is_evicted():
+    searcher, backend = cached_searcher(Clock(), max_categories=2)
+    searcher.pool('carne')
+    searcher.pool('pesce')
+    searcher.pool('carne')
+    searcher.pool('dolci')
+
+    assert searcher.evictions == 1 and list(searcher.stats()['pools']) == ['carne', 'dolci']
+    searcher.pool('pesce')
+    assert backend.loads == {'carne': 1, 'pesce': 2, 'dolci': 1}
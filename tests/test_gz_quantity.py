@@ -0,0 +1,57 @@
+import pytest
+
+from src.models.recipe import Ingredient, Quantity, Recipe, Time
+from src.transformer.gz_quantity import normalize_quantity, normalize_recipes, parse_quantity
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('320 g', ('320', 'g', None)),
+    ('1.5 KG', ('1.5', 'kg', None)),
+    ('0.5 l', ('0.5', 'l', None)),
+    ('1 pizzico', ('1', None, 'pizzico')),
+    ('(cucchiai)2', ('2', None, 'cucchiai')),
+    # A bare number has an empty descriptor, as the scraped recipes always had
+    ('6', ('6', None, '')),
+    # The last number of a range wins
+    ('2-3 uova', ('3', None, 'uova')),
+    ('q.b.', (None, None, None)),
+    ('', (None, None, None)),
+])
+def test_parse_quantity(text, expected):
+    quantity = parse_quantity(text)
+    assert (quantity['amount'], quantity['standard_unit'], quantity['descriptor']) == expected
+
+
+@pytest.mark.parametrize('text, amount, unit', [
+    ('1.5 kg', 1500.0, 'g'),
+    ('2 tbsp', 2 * 14.78676478125, 'ml'),
+    ('0.5 l', 500.0, 'ml'),
+    ('30 cm', 30.0, 'cm'),
+    ('6 (medie)', 6.0, 'pcs'),
+    ('q.b.', None, None),
+])
+def test_normalize_quantity_converts_to_the_base_unit(text, amount, unit):
+    normalized = normalize_quantity(parse_quantity(text))
+    assert normalized['amount'] == (None if amount is None else pytest.approx(amount))
+    assert normalized['unit'] == unit
+
+
+def test_normalize_recipes_keeps_the_parsed_quantities():
+    ingredient = {'name': 'farina', 'quantity': parse_quantity('1 kg')}
+    recipe, = normalize_recipes([{'recipe': 'pane', 'ingredients': [ingredient]}])
+    assert recipe['ingredients'] == [{**ingredient, 'normalized_quantity': {'amount': 1000.0, 'unit': 'g',
+                                                                           'descriptor': None}}]
+
+
+def test_normalize_recipes_accepts_recipe_objects():
+    recipe = Recipe(recipe='pane', ingredients=[Ingredient('farina', Quantity(**parse_quantity('1 kg'))),
+                                                Ingredient('sale', Quantity(**parse_quantity('q.b.')))],
+                    category=['Lievitati'], difficulty=None, dosage_for=None, price=None,
+                    time=Time(preparation=None, cooking=None), steps={1: 'Impastare'}, link='https://example.it/pane')
+    normalized, = normalize_recipes([recipe])
+
+    assert normalized == {**recipe.to_dict(), 'ingredients': normalized['ingredients']}
+    assert [ingredient['normalized_quantity'] for ingredient in normalized['ingredients']] == [
+        {'amount': 1000.0, 'unit': 'g', 'descriptor': None},
+        {'amount': None, 'unit': None, 'descriptor': None},
+    ]
@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from benchmarks.gz_bench import RECIPE_URL, read_fixture
+from src.scraper.gz_scrapers import GZCategoriesScraper, GZRecipeScraper
+
+# The expected outputs were produced by the parse_data of the scrapers before they used a
+# SoupStrainer, with the quantities normalized by parse_quantity
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def expected(filename):
+    with open(os.path.join(FIXTURES_DIR, filename), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def without_optional_blocks(html):
+    soup = BeautifulSoup(html, 'lxml')
+    tags = (soup.find_all('div', {'class': 'gz-list-featured-data-other'})
+            + soup.find_all('span', {'class': 'gz-name-featured-data'})
+            + soup.find_all('div', {'class': 'gz-content-recipe-step'}))
+    for tag in tags:
+        tag.decompose()
+    return str(soup)
+
+
+def parse_recipe(html):
+    scraper = GZRecipeScraper(session=object())
+    scraper.url = RECIPE_URL
+    # Steps are keyed by number, JSON keys are strings
+    recipe = json.loads(json.dumps(scraper.parse_data(html).to_dict(), ensure_ascii=False))
+    # Categories come out of a set, their order changes between runs
+    return {**recipe, 'category': sorted(recipe['category'])}
+
+
+@pytest.mark.parametrize('html, expected_file', [
+    (read_fixture('recipe.html'), 'recipe.expected.json'),
+    (without_optional_blocks(read_fixture('recipe.html')), 'recipe_minimal.expected.json'),
+])
+def test_recipe_parse_matches_the_unstrained_parser(html, expected_file):
+    recipe = expected(expected_file)
+    assert parse_recipe(html) == {**recipe, 'category': sorted(recipe['category'])}
+
+
+def test_page_without_optional_blocks_keeps_the_defaults():
+    recipe = parse_recipe(without_optional_blocks(read_fixture('recipe.html')))
+    assert recipe['steps'] == {}
+    assert recipe['difficulty'] is None and recipe['time'] == {'preparation': None, 'cooking': None}
+    assert recipe['ingredients']
+
+
+def test_category_parse_matches_the_unstrained_parser():
+    scraper = GZCategoriesScraper(session=object())
+    assert scraper.parse_data(read_fixture('category.html')) == expected('category.expected.json')
@@ -0,0 +1,105 @@
+import logging
+
+import pytest
+import requests
+
+from benchmarks.gz_bench import read_fixture
+from src.interface.instrumentation import ScrapeHooks
+from src.pipelines.gz_manifest import URLManifest
+from src.pipelines.gz_scraping import discover_recipes_urls, extract_recipes_info_pipelined, open_recipe_store
+
+
+class Response:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = dict()
+
+
+class CategorySession:
+    """
+    Serves category pages listing the given recipes, and fails the other pages.
+    """
+
+    def __init__(self, recipes_by_page):
+        self.recipes_by_page = recipes_by_page
+        self.requested = list()
+
+    def get(self, url, conditional=False, return_not_modified=False):
+        self.requested.append(url)
+        page = len(self.requested)
+        if page not in self.recipes_by_page:
+            raise requests.HTTPError(response=Response(503))
+        return Response(200, ''.join(f'<h2 class="gz-title"><a href="{link}">{link}</a></h2>'
+                                     for link in self.recipes_by_page[page]))
+
+
+def test_failed_category_pages_end_the_discovery(tmp_path):
+    session = CategorySession(dict())
+    assert discover_recipes_urls(str(tmp_path), 0, n_pages=50, stop_after=3, session=session) == []
+    assert len(session.requested) == 3
+
+
+def test_new_recipes_reset_the_failed_pages_streak(tmp_path):
+    session = CategorySession({2: ['https://ricette.giallozafferano.it/Nuova.html']})
+    urls = discover_recipes_urls(str(tmp_path), 0, n_pages=50, stop_after=2, session=session)
+    assert urls == ['https://ricette.giallozafferano.it/Nuova.html']
+    assert len(session.requested) == 4
+
+
+RECIPE_URLS = [f"https://ricette.giallozafferano.it/Ricetta-{i}.html" for i in range(3)]
+
+
+class RecipeSession:
+    """
+    Serves the recipe fixture for the first URL, answers 304 Not Modified for the second and
+    fails the third.
+    """
+
+    def __init__(self):
+        self.saved = 0
+
+    def get(self, url, conditional=False, return_not_modified=False):
+        if url == RECIPE_URLS[0]:
+            return Response(200, read_fixture('recipe.html'))
+        if url == RECIPE_URLS[1]:
+            return Response(304)
+        raise requests.HTTPError(response=Response(404))
+
+    def save_validators(self):
+        self.saved += 1
+
+
+class FailingHooks(ScrapeHooks):
+    def on_fetch(self, url, seconds, size=None, status=None, error=None):
+        raise RuntimeError('metrics backend down')
+
+
+def test_pipelined_scrape_stores_fetched_pages_and_records_every_outcome(tmp_path, caplog):
+    caplog.set_level(logging.INFO, logger='src.pipelines.gz_scraping')
+    manifest = URLManifest(str(tmp_path / 'manifest.sqlite'))
+    session = RecipeSession()
+    store = open_recipe_store(str(tmp_path), session, manifest)
+    fetch, parse, write = extract_recipes_info_pipelined(RECIPE_URLS, str(tmp_path), store=store, n_fetchers=2,
+                                                         n_parsers=1, session=session, refresh=True,
+                                                         manifest=manifest)
+
+    assert [record['link'] for record in store.iter_records()] == RECIPE_URLS[:1]
+    assert (fetch.items, fetch.errors, parse.items, parse.errors, write.items) == (3, 1, 1, 0, 1)
+    assert manifest.pending_urls(RECIPE_URLS) == RECIPE_URLS[2:]
+    assert manifest.failed_urls() == RECIPE_URLS[2:]
+    assert session.saved >= 1
+    manifest.close()
+    # The failure and the stage reports are logged, not printed
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1 and warnings[0].startswith(f"An error occurred while scraping {RECIPE_URLS[2]}")
+    reports = [record.getMessage() for record in caplog.records if record.levelno == logging.INFO]
+    assert [report.split(':')[0] for report in reports] == [fetch.name, parse.name, write.name]
+
+
+def test_pipelined_scrape_raises_the_unexpected_errors_of_the_fetchers(tmp_path):
+    session = RecipeSession()
+    with pytest.raises(RuntimeError, match='metrics backend down'):
+        extract_recipes_info_pipelined(RECIPE_URLS, str(tmp_path), n_fetchers=2, n_parsers=1, session=session,
+                                       hooks=FailingHooks())
@@ -0,0 +1,148 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.transformer.gz_transformer import (ClassificationCache, OpenAIClassifier, StaticClassifier, classify_corpus,
+                                            make_batches)
+
+MAPPING = {'farina': 'Altri ingredienti', 'uova': 'Uova', 'burro': 'Burri, salse e olii',
+           'zucchero': 'Dolcificanti'}
+
+
+def recipe(*names):
+    return {'recipe': 'torta', 'ingredients': [{'name': name} for name in names]}
+
+
+class FlakyClassifier(StaticClassifier):
+    """
+    Fails the first calls, then answers from the mapping.
+    """
+
+    def __init__(self, mapping, failures):
+        super().__init__(mapping)
+        self.failures = failures
+
+    def classify(self, names):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('rate limited')
+        return super().classify(names)
+
+
+class FakeCompletions:
+    """
+    Records the user messages and answers with the given items.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.messages = list()
+
+    def create(self, model, temperature, messages, response_format):
+        self.messages.append(messages[-1]['content'])
+        content = json.dumps({'ingredients': self.items})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ClassificationCache(str(tmp_path / 'classifications.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_static_classifier_leaves_unknown_names_unclassified():
+    assert StaticClassifier(MAPPING).classify(['farina', 'lievito']) == {'farina': 'Altri ingredienti'}
+    assert StaticClassifier(MAPPING, default='Verdure').classify(['lievito']) == {'lievito': 'Verdure'}
+
+
+def test_openai_classifier_sends_the_names_as_a_json_array():
+    completions = FakeCompletions([{'name': 'Burri, salse e olii misti', 'category': 'Burri, salse e olii'},
+                                   {'name': 'CAFFÈ', 'category': 'Bevande'},
+                                   {'name': 'uova', 'category': 'Non una categoria'},
+                                   {'name': 'pane', 'category': 'Altri ingredienti'}])
+    classifier = OpenAIClassifier(client=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    names = ['Burri, salse e olii misti', 'caffè', 'uova']
+
+    assert classifier.classify(names) == {'Burri, salse e olii misti': 'Burri, salse e olii', 'caffè': 'Bevande'}
+    assert completions.messages == ['["Burri, salse e olii misti", "caffè", "uova"]']
+    assert json.loads(completions.messages[0]) == names
+
+
+def test_cache_round_trip_and_persistence(tmp_path):
+    db_path = str(tmp_path / 'classifications.sqlite')
+    cache = ClassificationCache(db_path)
+    cache.put_many({'farina': 'Verdure', 'uova': 'Uova'}, source='StaticClassifier')
+    cache.put_many({'farina': 'Altri ingredienti'})
+    cache.close()
+
+    cache = ClassificationCache(db_path)
+    assert len(cache) == 2
+    assert cache.get_many(['farina', 'burro']) == {'farina': 'Altri ingredienti'}
+    assert sorted(cache.items()) == [('farina', 'Altri ingredienti'), ('uova', 'Uova')]
+    cache.close()
+
+
+def test_cache_keeps_the_unclassified_names_apart(cache):
+    cache.put_many({'farina': 'Altri ingredienti', 'lievito': None}, source='StaticClassifier')
+
+    assert len(cache) == 2
+    assert cache.get_many(['farina', 'lievito', 'burro']) == {'farina': 'Altri ingredienti'}
+    assert cache.get_many(['farina', 'lievito', 'burro'], with_unclassified=True) == {
+        'farina': 'Altri ingredienti', 'lievito': None}
+    assert cache.items() == [('farina', 'Altri ingredienti')]
+
+
+def test_cache_get_many_looks_up_more_names_than_the_parameter_limit(cache):
+    cache.put_many({f"ingrediente {i}": 'Verdure' for i in range(1200)})
+    assert len(cache.get_many(f"ingrediente {i}" for i in range(0, 2400, 2))) == 600
+
+
+def test_make_batches_bounds_items_and_chars():
+    names = ['a' * 8] * 7
+    assert [len(batch) for batch in make_batches(names, max_items=3)] == [3, 3, 1]
+    # Every name costs its quoted length plus the separator
+    assert [len(batch) for batch in make_batches(names, max_chars=25)] == [2, 2, 2, 1]
+    assert [len(batch) for batch in make_batches(names, max_chars=23)] == [1] * 7
+    # A name longer than the limit still gets its own batch
+    assert make_batches(['a' * 30, 'b'], max_chars=10) == [['a' * 30], ['b']]
+    assert make_batches([]) == []
+
+
+def test_classify_corpus_asks_the_backend_only_for_the_uncached_names(cache):
+    cache.put_many({'farina': 'Altri ingredienti'}, source='OpenAIClassifier')
+    backend = StaticClassifier(MAPPING)
+    recipes = [recipe('Farina', ' uova '), recipe('burro', 'zucchero', 'lievito')]
+
+    classified = classify_corpus(recipes, backend, cache, max_workers=2, max_items=2)
+
+    assert classified == {name: MAPPING[name] for name in MAPPING}
+    assert backend.calls == 2
+    assert len(cache) == 5 and cache.get_many(['lievito'], with_unclassified=True) == {'lievito': None}
+    # A second run is answered by the cache, the unclassified name is only sent again on request
+    assert classify_corpus(recipes, backend, cache, max_items=2) == classified
+    assert backend.calls == 2
+    assert classify_corpus(recipes, backend, cache, max_items=2, retry_unclassified=True) == classified
+    assert backend.calls == 3
+
+
+def test_classify_corpus_does_not_cache_the_local_answers(cache):
+    backend = StaticClassifier(MAPPING)
+    local = StaticClassifier({'farina': 'Altri ingredienti', 'uova': 'Uova'})
+
+    classified = classify_corpus([recipe('farina', 'uova', 'burro')], backend, cache, local=local)
+
+    assert classified == {'farina': 'Altri ingredienti', 'uova': 'Uova', 'burro': 'Burri, salse e olii'}
+    assert cache.items() == [('burro', 'Burri, salse e olii')]
+
+
+def test_classify_corpus_retries_failed_batches(cache):
+    backend = FlakyClassifier(MAPPING, failures=2)
+    classified = classify_corpus([recipe('farina')], backend, cache, max_retries=2, initial_backoff=0.001)
+    assert classified == {'farina': 'Altri ingredienti'}
+
+    backend = FlakyClassifier(MAPPING, failures=2)
+    assert classify_corpus([recipe('uova')], backend, cache, max_retries=1, initial_backoff=0.001) == dict()
+    # A failed batch is not cached as unclassified
+    assert cache.get_many(['uova'], with_unclassified=True) == dict()
@@ -0,0 +1,67 @@
+import os
+
+from src.pipelines.gz_scraping import merge_worker_validators, open_work_queue, run_queue_worker
+from src.pipelines.gz_work_queue import STATE_DONE, STATE_FAILED, STATE_PENDING
+from src.utilis import load_from_json, save_to_json
+
+URLS = [f"https://ricette.giallozafferano.it/Ricetta-{i}.html" for i in range(3)]
+
+
+class NotModifiedResponse:
+    status_code = 304
+    content = b''
+
+
+class NotModifiedSession:
+    """
+    Answers every conditional GET with 304 Not Modified.
+    """
+
+    def __init__(self):
+        self.conditional = list()
+
+    def get(self, url, conditional=False, return_not_modified=False):
+        self.conditional.append(conditional)
+        return NotModifiedResponse() if return_not_modified else None
+
+    def save_validators(self):
+        pass
+
+
+def test_enqueue_with_reset_queues_done_and_failed_urls_again(tmp_path):
+    work_queue = open_work_queue(str(tmp_path), max_retries=1)
+    assert work_queue.enqueue(URLS[:2]) == 2
+    leased = work_queue.lease('w0', n=2)
+    work_queue.ack(leased[:1])
+    work_queue.fail('w0', leased[1], 'HTTP 500')
+
+    assert work_queue.enqueue(URLS) == 1
+    assert work_queue.counts()[STATE_DONE] == 1 and work_queue.counts()[STATE_FAILED] == 1
+    assert work_queue.enqueue(URLS, reset=True) == 2
+    assert work_queue.counts()[STATE_PENDING] == 3
+    # The failed attempts are forgotten
+    work_queue.fail('w0', work_queue.lease('w0', n=3)[0], 'HTTP 500')
+    assert work_queue.counts()[STATE_FAILED] == 1
+    work_queue.close()
+
+
+def test_refresh_worker_revalidates_the_queued_urls(tmp_path):
+    work_queue = open_work_queue(str(tmp_path))
+    work_queue.enqueue(URLS)
+    session = NotModifiedSession()
+    fetched = run_queue_worker(str(tmp_path), 'w0', requests_per_second=1000, session=session, refresh=True)
+
+    assert fetched == 3 and session.conditional == [True] * 3
+    assert work_queue.counts()[STATE_DONE] == 3
+    work_queue.close()
+
+
+def test_worker_validators_are_merged_into_the_output_directory(tmp_path):
+    save_to_json({URLS[0]: {'etag': 'a', 'last_modified': None}}, f"{tmp_path}/http_validators.json")
+    save_to_json({URLS[0]: {'etag': 'b', 'last_modified': None}}, f"{tmp_path}/http_validators_w0.json")
+    save_to_json({URLS[1]: {'etag': 'c', 'last_modified': None}}, f"{tmp_path}/http_validators_w1.json")
+    merge_worker_validators(str(tmp_path), ['w0', 'w1'])
+
+    validators = load_from_json(f"{tmp_path}/http_validators.json")
+    assert {url: validator['etag'] for url, validator in validators.items()} == {URLS[0]: 'b', URLS[1]: 'c'}
+    assert not os.path.exists(f"{tmp_path}/http_validators_w0.json")
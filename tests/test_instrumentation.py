@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+import requests
+
+from src.interface.instrumentation import ScrapeHooks
+from src.scraper.gz_scrapers import GZCategoriesScraper
+
+PAGE = '<h2 class="gz-title"><a href="https://ricette.giallozafferano.it/Caffè.html">Caffè</a></h2>'
+
+
+class Response:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+
+
+class Session:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, conditional=False, return_not_modified=False):
+        if self.response.status_code == 304 and not return_not_modified:
+            return None
+        if self.response.status_code >= 400:
+            raise requests.HTTPError(response=self.response)
+        return self.response
+
+
+class RecordingHooks(ScrapeHooks):
+    def __init__(self):
+        self.fetches = list()
+
+    def on_fetch(self, url, seconds, size=None, status=None, error=None):
+        self.fetches.append((size, status, error is not None))
+
+
+def scraper_for(response):
+    scraper = GZCategoriesScraper(session=Session(response))
+    scraper.hooks = RecordingHooks()
+    return scraper
+
+
+@pytest.mark.parametrize('scrape', [
+    lambda scraper, url: scraper.scrape(url),
+    lambda scraper, url: asyncio.run(scraper.scrape_async(url)),
+])
+def test_fetch_hooks_receive_the_bytes_and_status_of_the_response(scrape):
+    scraper = scraper_for(Response(200, PAGE))
+    assert scrape(scraper, 'https://www.giallozafferano.it/ricette-cat/') == [
+        'https://ricette.giallozafferano.it/Caffè.html']
+    # The page holds non-ASCII characters, its size in bytes differs from its length
+    assert scraper.hooks.fetches == [(len(PAGE.encode('utf-8')), 200, False)]
+    assert len(PAGE.encode('utf-8')) != len(PAGE)
+
+    scraper = scraper_for(Response(304))
+    assert scrape(scraper, 'https://www.giallozafferano.it/ricette-cat/') is None
+    assert scraper.hooks.fetches == [(0, 304, False)]
+
+
+def test_failed_fetch_reports_the_status_of_the_error():
+    scraper = scraper_for(Response(503))
+    with pytest.raises(requests.HTTPError):
+        scraper.scrape('https://www.giallozafferano.it/ricette-cat/')
+    assert scraper.hooks.fetches == [(None, 503, True)]
@@ -0,0 +1,67 @@
+from urllib.parse import urlsplit, urlunsplit
+
+import pytest
+
+from src.models import recipe as recipe_module
+from src.models.recipe import Ingredient, Quantity, Recipe, Time, canonical_link, dumps, encode_recipe, loads
+
+RECIPE = Recipe(
+    recipe='Tiramisù',
+    ingredients=[Ingredient('Mascarpone', Quantity('500', 'g', None)),
+                 Ingredient('Cacao amaro in polvere', Quantity(None, None, 'q.b.'))],
+    category=['Dolci'],
+    difficulty='Facile',
+    dosage_for=None,
+    price=None,
+    time=Time('40 min', None),
+    steps={1: 'Separate i tuorli dagli albumi.', 2: 'Spolverizzate con il cacao.'},
+    link='https://ricette.giallozafferano.it/Tiramisu.html'
+)
+
+
+@pytest.mark.parametrize('link', [
+    'https://Ricette.GialloZafferano.it/Spaghetti-alla-Carbonara.html?utm_source=feed#commenti',
+    ' https://ricette.giallozafferano.it/Spaghetti-alla-Carbonara.html/ ',
+    'HTTPS://RICETTE.GIALLOZAFFERANO.IT',
+    'https://ricette.giallozafferano.it?page=2',
+    'https://ricette.giallozafferano.it/ricette#a?b',
+    'https://ricette.giallozafferano.it/Pasta\n.html',
+    'https://[::1]:8080/Pasta.html',
+    '/Spaghetti-alla-Carbonara.html?v=1',
+])
+def test_canonical_link_matches_urlsplit(link):
+    parts = urlsplit(link.strip())
+    assert canonical_link(link) == urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'),
+                                               '', ''))
+
+
+def test_recipe_dict_round_trip():
+    data = RECIPE.to_dict()
+    assert data['ingredients'][1]['quantity'] == {'amount': None, 'standard_unit': None, 'descriptor': 'q.b.'}
+    assert data['time'] == {'preparation': '40 min', 'cooking': None}
+    assert Recipe.from_dict(data) == RECIPE
+
+
+@pytest.mark.parametrize('with_orjson', [True, False])
+def test_recipe_json_bytes_round_trip(monkeypatch, with_orjson):
+    if not with_orjson:
+        monkeypatch.setattr(recipe_module, 'orjson', None)
+    elif recipe_module.orjson is None:
+        pytest.skip('orjson is not installed')
+
+    encoded = encode_recipe(RECIPE)
+    assert isinstance(encoded, bytes)
+    # The step numbers become JSON keys, from_dict turns them back to integers
+    decoded = loads(encoded)
+    assert decoded['steps'] == {'1': RECIPE.steps[1], '2': RECIPE.steps[2]}
+    assert Recipe.from_dict(decoded) == RECIPE
+    assert dumps(RECIPE) == dumps(RECIPE.to_dict()) == encoded
+    assert loads(encoded.decode('utf-8')) == decoded
+
+
+def test_recipe_json_bytes_match_across_backends(monkeypatch):
+    if recipe_module.orjson is None:
+        pytest.skip('orjson is not installed')
+    encoded = dumps(RECIPE)
+    monkeypatch.setattr(recipe_module, 'orjson', None)
+    assert dumps(RECIPE) == encoded
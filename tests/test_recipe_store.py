@@ -0,0 +1,123 @@
+import glob
+import os
+
+from src.indexer.memory.gz_memory_index import iter_corpus
+from src.pipelines.gz_scraping import iter_links_by_segment
+from src.store.recipe_store import RecipeStore
+from src.utilis import save_to_json
+
+
+def recipe(number, name):
+    return {'recipe': name, 'link': f"https://ricette.giallozafferano.it/Ricetta-{number}.html"}
+
+
+def age(segments, start=1_000_000):
+    for offset, segment in enumerate(segments):
+        os.utime(segment, (start + offset, start + offset))
+
+
+def segment_names(store):
+    return [os.path.basename(segment) for segment in store.segments()]
+
+
+def test_refreshed_recipes_replace_their_older_versions(tmp_path):
+    directory = str(tmp_path / 'recipes')
+    worker = RecipeStore(directory, segment_size=2, prefix='recipes_w1')
+    worker.append(recipe(1, 'old one'))
+    worker.append(recipe(2, 'two'))
+    worker.close()
+
+    # The refresh is numbered after the segment of the crawler worker, and a copy that did not
+    # keep the modification times makes it look older
+    store = RecipeStore(directory, segment_size=2)
+    store.append(recipe(1, 'new one'))
+    store.close()
+    age([os.path.join(directory, 'recipes_000002.jsonl.gz'), os.path.join(directory, 'recipes_w1_000001.jsonl.gz')])
+
+    assert sorted(item['recipe'] for item in iter_corpus(str(tmp_path))) == ['new one', 'two']
+    assert [(os.path.basename(segment), links) for segment, links in iter_links_by_segment(directory)] == [
+        ('recipes_w1_000001.jsonl.gz', [recipe(2, '')['link']]),
+        ('recipes_000002.jsonl.gz', [recipe(1, '')['link']]),
+    ]
+
+
+def test_segments_are_numbered_after_the_highest_existing_one(tmp_path):
+    directory = str(tmp_path)
+    store = RecipeStore(directory, segment_size=1, compression=None)
+    for number in range(3):
+        store.append(recipe(number, f"recipe {number}"))
+    os.remove(os.path.join(directory, 'recipes_000002.jsonl'))
+    for number in range(7, 10):
+        store.append(recipe(number, f"recipe {number}"))
+
+    # Counting the segments would overwrite the last one
+    store = RecipeStore(directory, segment_size=1, compression=None)
+    store.append(recipe(3, 'recipe 3'))
+    assert segment_names(store) == ['recipes_000001.jsonl', 'recipes_000003.jsonl', 'recipes_000004.jsonl',
+                                    'recipes_000005.jsonl', 'recipes_000006.jsonl', 'recipes_000007.jsonl']
+    assert [item['recipe'] for item in store.iter_records()] == ['recipe 0', 'recipe 2', 'recipe 7', 'recipe 8',
+                                                                 'recipe 9', 'recipe 3']
+
+
+def test_iter_records_keeps_the_last_version_of_a_link(tmp_path):
+    store = RecipeStore(str(tmp_path), segment_size=1)
+    store.append(recipe(1, 'first'))
+    store.append({**recipe(1, 'second'), 'link': recipe(1, '')['link'] + '?utm_source=feed'})
+    store.append(recipe(2, 'other'))
+    store.close()
+
+    assert [item['recipe'] for item in store.iter_records()] == ['second', 'other']
+
+
+def test_json_chunks_are_read_in_chunk_order(tmp_path):
+    chunks_dir = tmp_path / 'recipes_json'
+    chunks_dir.mkdir()
+    save_to_json([recipe(1, 'old one')], str(chunks_dir / 'all_recipes_2.json'))
+    save_to_json([recipe(1, 'new one')], str(chunks_dir / 'all_recipes_10.json'))
+    age([str(chunks_dir / 'all_recipes_10.json'), str(chunks_dir / 'all_recipes_2.json')])
+
+    assert [item['recipe'] for item in iter_corpus(str(tmp_path))] == ['new one']
+
+
+def crashed_store(directory, n_records, **kwargs):
+    # The open segment is flushed after every record but never committed, as after a crash
+    store = RecipeStore(directory, segment_size=10, **kwargs)
+    for number in range(n_records):
+        store.append(recipe(number, f"recipe {number}"))
+    tmp_filename, = glob.glob(os.path.join(directory, '.*.tmp'))
+    with open(tmp_filename, 'rb') as f:
+        return tmp_filename, f.read()
+
+
+def test_recover_keeps_the_complete_records_of_a_torn_segment(tmp_path):
+    tmp_filename, data = crashed_store(str(tmp_path / 'crashed'), 3, compression=None)
+    directory = tmp_path / 'recipes'
+    directory.mkdir()
+    # The last record is cut in the middle of its line
+    (directory / os.path.basename(tmp_filename)).write_bytes(data[:-10])
+
+    store = RecipeStore(str(directory), segment_size=10, compression=None)
+    assert [item['recipe'] for item in store.iter_records()] == ['recipe 0', 'recipe 1']
+    assert sorted(os.listdir(directory)) == ['recipes_000001.jsonl']
+
+
+def test_recover_a_truncated_compressed_segment(tmp_path):
+    tmp_filename, data = crashed_store(str(tmp_path / 'crashed'), 3)
+    directory = tmp_path / 'recipes'
+    directory.mkdir()
+    (directory / os.path.basename(tmp_filename)).write_bytes(data[:-20])
+
+    store = RecipeStore(str(directory), segment_size=10)
+    records = [item['recipe'] for item in store.iter_records()]
+    assert records and records == ['recipe 0', 'recipe 1', 'recipe 2'][:len(records)] and len(records) < 3
+    # New records go to the next segment
+    store.append(recipe(9, 'recipe 9'))
+    store.close()
+    assert segment_names(store) == ['recipes_000001.jsonl.gz', 'recipes_000002.jsonl.gz']
+
+
+def test_recover_leaves_the_segments_of_other_stores(tmp_path):
+    directory = str(tmp_path)
+    tmp_filename, _ = crashed_store(directory, 2, prefix='recipes_w1')
+    store = RecipeStore(directory, segment_size=10)
+    assert list(store.iter_records()) == [] and os.path.exists(tmp_filename)
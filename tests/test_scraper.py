@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import requests
+
+from src.scraper.gz_scrapers import GZCategoriesScraper
+from src.scraper.throttle import RetryPolicy
+
+HOSTS = ['https://www.giallozafferano.it', 'https://blog.giallozafferano.it']
+
+
+class Response:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = dict()
+
+
+class RecordingSession:
+    """
+    Serves a category page listing one recipe for every URL, recording when every request went
+    out and how many were in flight; the URLs in errors fail with their status, once or for good.
+    """
+
+    def __init__(self, seconds=0.0, errors=None):
+        self.seconds = seconds
+        self.errors = dict(errors or ())
+        self.requested = list()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, conditional=False, return_not_modified=False):
+        with self._lock:
+            self.requested.append((url, time.monotonic()))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.seconds)
+            status, once = self.errors.get(url, (None, False))
+            if status is not None:
+                if once:
+                    del self.errors[url]
+                raise requests.HTTPError(response=Response(status))
+            return Response(200, f'<h2 class="gz-title"><a href="{url}/ricetta">ricetta</a></h2>')
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def scrape_many(session, urls, **kwargs):
+    results = dict()
+
+    def on_result(url, data, error):
+        results[url] = (data, error)
+
+    scraper = GZCategoriesScraper(session=session)
+    asyncio.run(scraper.scrape_many(urls, on_result, **kwargs))
+    return results
+
+
+def test_scrape_many_caps_the_requests_in_flight():
+    session = RecordingSession(seconds=0.02)
+    urls = [f"{HOSTS[0]}/ricette-cat/page{i}" for i in range(12)]
+    results = scrape_many(session, urls, concurrency=3)
+
+    assert session.max_in_flight == 3
+    assert results == {url: ([f"{url}/ricetta"], None) for url in urls}
+
+
+def test_scrape_many_spaces_the_requests_of_every_host():
+    session = RecordingSession()
+    urls = [f"{host}/ricette-cat/page{i}" for i in range(4) for host in HOSTS]
+    scrape_many(session, urls, concurrency=8, requests_per_second=20)
+
+    starts = {host: [at for url, at in session.requested if url.startswith(host)] for host in HOSTS}
+    for times in starts.values():
+        assert len(times) == 4
+        assert all(later - earlier >= 0.035 for earlier, later in zip(times, times[1:]))
+    # The hosts have separate budgets, the second one does not wait for the first
+    assert abs(starts[HOSTS[0]][0] - starts[HOSTS[1]][0]) < 0.04
+
+
+def test_scrape_many_passes_the_errors_to_the_callback():
+    urls = [f"{HOSTS[0]}/ricette-cat/page{i}" for i in range(4)]
+    session = RecordingSession(errors={urls[1]: (404, False), urls[2]: (503, True), urls[3]: (503, False)})
+    results = scrape_many(session, urls, retry_policy=RetryPolicy(max_attempts=2, initial_backoff=0.0))
+
+    assert results[urls[0]] == ([f"{urls[0]}/ricetta"], None)
+    # The transient 503 is retried, the 404 and the lasting 503 are reported
+    assert results[urls[2]] == ([f"{urls[2]}/ricetta"], None)
+    for url, status in [(urls[1], 404), (urls[3], 503)]:
+        data, error = results[url]
+        assert data is None and error.response.status_code == status
+    assert [url for url, _ in session.requested].count(urls[1]) == 1
+    assert [url for url, _ in session.requested].count(urls[3]) == 3
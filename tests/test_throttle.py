@@ -0,0 +1,147 @@
+import random
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from src.scraper import throttle
+from src.scraper.throttle import AdaptiveRateLimiter, RetryPolicy, RetryQueue, retry_after_seconds
+
+URL = 'https://ricette.giallozafferano.it/Spaghetti-alla-Carbonara.html'
+OTHER_HOST_URL = 'https://www.giallozafferano.it/ricette-cat/'
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or dict()
+
+
+def http_error(status_code, **headers):
+    return requests.HTTPError(response=Response(status_code, headers))
+
+
+def adaptive_limiter(clock, **kwargs):
+    limiter = AdaptiveRateLimiter(**{'initial_rate': 4.0, 'cooldown': 5.0, **kwargs})
+    limiter._now = clock
+    return limiter
+
+
+def test_healthy_fetches_raise_the_rate_additively():
+    limiter = adaptive_limiter(Clock(), additive_increase=2.0, max_rate=5.5)
+    limiter.on_fetch(URL, 0.1, status=200)
+    assert limiter.rate(URL) == pytest.approx(4.5)
+    limiter.on_fetch(URL, 0.1, status=200)
+    assert limiter.rate(URL) == pytest.approx(4.5 + 2.0 / 4.5)
+    for _ in range(10):
+        limiter.on_fetch(URL, 0.1, status=200)
+    assert limiter.rate(URL) == 5.5
+    assert limiter.rate(OTHER_HOST_URL) == 4.0
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_overload_cuts_the_rate_once_per_cooldown(status):
+    clock = Clock()
+    limiter = adaptive_limiter(clock, min_rate=0.75)
+    limiter.on_fetch(URL, 0.1, status=status, error=http_error(status))
+    assert limiter.rate(URL) == 2.0
+    clock.now += 4.9
+    limiter.on_fetch(URL, 0.1, status=status, error=http_error(status))
+    assert limiter.rate(URL) == 2.0
+    clock.now += 0.1
+    limiter.on_fetch(URL, 0.1, status=status, error=http_error(status))
+    assert limiter.rate(URL) == 1.0
+    clock.now += 5.0
+    limiter.on_fetch(URL, 0.1, status=status, error=http_error(status))
+    assert limiter.rate(URL) == 0.75
+
+
+def test_client_errors_leave_the_rate_alone():
+    limiter = adaptive_limiter(Clock())
+    limiter.on_fetch(URL, 0.1, status=404, error=http_error(404))
+    limiter.on_fetch(URL, 0.1, error=ValueError('unparsable page'))
+    assert limiter.rate(URL) == 4.0
+
+
+def test_slow_responses_cut_the_rate():
+    limiter = adaptive_limiter(Clock(), latency_factor=2.0, recent_smoothing=0.5, usual_smoothing=0.0)
+    limiter.on_fetch(URL, 0.1, status=200)
+    limiter.on_fetch(URL, 0.5, status=200)
+    assert limiter.rate(URL) < 4.0
+
+
+def test_retry_after_holds_back_the_host():
+    clock = Clock()
+    limiter = adaptive_limiter(clock)
+    limiter.on_fetch(URL, 0.1, status=429, error=http_error(429, **{'Retry-After': '30'}))
+
+    assert limiter.rate(URL) == 2.0
+    assert limiter._reserve(URL, clock.now) == clock.now + 30
+    # The next requests are spaced at the decreased rate, other hosts do not wait
+    assert limiter._reserve(URL, clock.now) == clock.now + 30.5
+    assert limiter._reserve(OTHER_HOST_URL, clock.now) == clock.now
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(http_error(503, **{'Retry-After': '12'})) == 12.0
+    assert retry_after_seconds(http_error(503, **{'Retry-After': '-3'})) == 0.0
+    assert retry_after_seconds(http_error(503, **{'Retry-After': 'soon'})) is None
+    assert retry_after_seconds(http_error(503)) is None
+    assert retry_after_seconds(ValueError()) is None
+    in_two_minutes = formatdate(throttle.time.time() + 120, usegmt=True)
+    assert retry_after_seconds(http_error(503, **{'Retry-After': in_two_minutes})) == pytest.approx(120, abs=2)
+
+
+@pytest.mark.parametrize('error, retried', [
+    (http_error(429), True),
+    (http_error(500), True),
+    (http_error(503), True),
+    (http_error(403), False),
+    (http_error(404), False),
+    (requests.ConnectionError('reset'), True),
+    (requests.Timeout('read timeout'), True),
+    (ValueError('unparsable page'), False),
+])
+def test_retry_policy_retries_overload_and_connection_errors(error, retried):
+    policy = RetryPolicy(max_attempts=2)
+    assert policy.should_retry(error, 0) is retried
+    assert policy.should_retry(error, 2) is False
+
+
+def test_retry_policy_backoff_is_jittered_and_bounded(monkeypatch):
+    policy = RetryPolicy(initial_backoff=2.0, max_backoff=10.0)
+    random.seed(0)
+    for attempt, bound in enumerate([2.0, 4.0, 8.0, 10.0, 10.0]):
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= bound for delay in delays)
+        assert max(delays) > bound / 2 and min(delays) < bound / 2
+
+    monkeypatch.setattr(throttle.random, 'uniform', lambda low, high: high)
+    # A longer Retry-After wins over the backoff, a shorter one does not
+    assert policy.delay(0, http_error(429, **{'Retry-After': '30'})) == 30.0
+    assert policy.delay(1, http_error(429, **{'Retry-After': '1'})) == 4.0
+
+
+def test_retry_queue_releases_the_items_when_due():
+    clock = Clock()
+    retries = RetryQueue()
+    retries._now = clock
+    retries.push('late', 5.0)
+    retries.push('early', 1.0)
+    retries.push('early too', 1.0)
+
+    assert len(retries) == 3 and retries.pop(block=False) is None
+    clock.now += 1.0
+    assert [retries.pop(block=False), retries.pop(block=False), retries.pop(block=False)] == [
+        'early', 'early too', None]
+    clock.now += 4.0
+    assert retries.pop() == 'late'
+    assert retries.pop() is None and len(retries) == 0
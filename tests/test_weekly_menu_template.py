@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from src.template.weekly_menu_template import FISH, FREE, MEAT, VEGAN, VEGETARIAN, MealPlanner
+
+
+@pytest.mark.parametrize('meat_meals, fish_meals, free_day', [
+    (0, 0, None),
+    (3, 2, 'Sunday'),
+    (7, 7, None),
+    (6, 6, 'Wednesday'),
+])
+def test_generate_plans_respects_the_constraints(meat_meals, fish_meals, free_day):
+    planner = MealPlanner(meat_meals=meat_meals, fish_meals=fish_meals, free_day=free_day)
+    plans = planner.generate_plans(200, weeks=3, seed=0)
+
+    assert plans.shape == (200, 21, 2) and plans.dtype == np.int8
+    weeks = plans.reshape(200 * 3, 7, 2)
+    # Meat and fish meals fall on distinct days, at most one of each per day
+    assert ((weeks == MEAT).sum(axis=2) <= 1).all() and ((weeks == FISH).sum(axis=2) <= 1).all()
+    assert ((weeks == MEAT).sum(axis=(1, 2)) == meat_meals).all()
+    assert ((weeks == FISH).sum(axis=(1, 2)) == fish_meals).all()
+
+    free = planner.days_of_week.index(free_day) if free_day else None
+    for day in range(7):
+        if day == free:
+            assert (weeks[:, day] == FREE).all()
+        else:
+            assert (weeks[:, day] != FREE).all()
+    others = ~np.isin(weeks, [MEAT, FISH, FREE])
+    assert np.isin(weeks[others], [VEGETARIAN, VEGAN]).all()
+
+
+@pytest.mark.parametrize('meat_meals, fish_meals, free_day', [
+    (8, 0, None),
+    (0, 7, 'Monday'),
+])
+def test_generate_plans_rejects_infeasible_profiles(meat_meals, fish_meals, free_day):
+    planner = MealPlanner(meat_meals=meat_meals, fish_meals=fish_meals, free_day=free_day)
+    with pytest.raises(ValueError):
+        planner.generate_plans(1)
+
+
+def test_generate_plans_is_reproducible_with_a_seed():
+    planner = MealPlanner(meat_meals=2, fish_meals=2, free_day='Friday')
+    assert np.array_equal(planner.generate_plans(50, weeks=2, seed=7), planner.generate_plans(50, weeks=2, seed=7))
+    assert not np.array_equal(planner.generate_plans(50, weeks=2, seed=7), planner.generate_plans(50, weeks=2, seed=8))
+
+
+def test_to_template_labels_every_slot():
+    planner = MealPlanner(meat_meals=1, fish_meals=1, free_day='Sunday')
+    template = planner.to_template(planner.generate_plans(1, weeks=2, seed=0)[0])
+
+    assert len(template) == 28
+    assert template[-1] == {'week': 1, 'day': 'Sunday', 'moment_of_day': 'Dinner', 'category': 'Free'}
+    assert sum(slot['category'] == 'carne' for slot in template) == 2
+    assert sum(slot['category'] == 'pesce' for slot in template) == 2